@@ -1,25 +1,41 @@
 import argparse
 import logging
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Tuple
 
 import coloredlogs
 
 from . import get_template_path
-from .config_generator import ConfigGenerator
 from .core import (
+    Daemon,
     create_database_manager,
-    create_nginx_manager,
-    create_ssl_manager,
+    DiscoveryManifest,
+    Precompressor,
+    SiteReconciler,
     discover_sites,
-    get_ca_password,
     validate_paths,
 )
+from .database import TUNING_VARIABLES, backup_databases, resolve_tuning
+from .docker import reset_opcache
+from .nginx import purge_site_cache
+from .ssl_certificate_manager import CertificateInventory
+from .utils.instrumentation import RunReport, profiled
 
 logging.basicConfig(level=logging.INFO)
 coloredlogs.install(level=logging.INFO)
 logger = logging.getLogger("site-builder")
 
 
+def parse_tuning_override(value: str) -> Tuple[str, str]:
+    """Parse a --db-tune OPTION=VALUE argument into its DB_* template variable and value."""
+    option, separator, setting = value.partition("=")
+    variables = {option: variable for variable, option in TUNING_VARIABLES.items()}
+    if not separator or option.strip() not in variables:
+        raise argparse.ArgumentTypeError(f"expected OPTION=VALUE with OPTION one of: {', '.join(sorted(variables))}")
+    return variables[option.strip()], setting.strip()
+
+
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description="Generate Nginx and Docker configurations for web services")
@@ -62,6 +78,12 @@ def parse_arguments():
         default=Path("/etc/site-builder/docker/docker-compose.yml"),
         help="Docker compose file path (default: /etc/site-builder/docker/docker-compose.yml)",
     )
+    parser.add_argument(
+        "--state-path",
+        type=Path,
+        default=Path("/etc/site-builder/state"),
+        help="Path for persistent state such as the discovery manifest (default: /etc/site-builder/state)",
+    )
     parser.add_argument(
         "--template-path",
         type=Path,
@@ -69,18 +91,49 @@ def parse_arguments():
         help=f"Path to Jinja2 templates (default: {get_template_path()})",
     )
 
+    parser.add_argument(
+        "--proxy-cache-path",
+        type=Path,
+        default=Path("/var/cache/nginx/site-builder"),
+        help="Directory of the proxy cache shared by the sites (default: /var/cache/nginx/site-builder)",
+    )
+    parser.add_argument(
+        "--proxy-cache-size",
+        type=str,
+        default="1g",
+        help="Maximum size of the proxy cache (default: 1g)",
+    )
+    parser.add_argument(
+        "--dependency-cache-path",
+        type=Path,
+        default=Path("/var/cache/site-builder"),
+        help="Directory of the pip and npm caches shared by the site containers (default: /var/cache/site-builder)",
+    )
+
     # Network configuration
     parser.add_argument(
         "--ip-prefix",
         type=str,
         default="192.168.100",
-        help="IP prefix for containers (default: 192.168.100)",
+        help="IP prefix of the /24 container network used when --network is not given (default: 192.168.100)",
+    )
+    parser.add_argument(
+        "--network",
+        type=str,
+        metavar="CIDR",
+        help="Container network, e.g. 10.20.0.0/16 for more than 250 sites (default: <ip-prefix>.0/24)",
     )
     parser.add_argument(
         "--ip-start",
         type=int,
         default=2,
-        help="Starting IP suffix for containers (default: 2)",
+        help="Offset of the first site container address in the network (default: 2)",
+    )
+    parser.add_argument(
+        "--address-grace-days",
+        type=int,
+        default=7,
+        help="Days the address of a removed site stays reserved before it is reused (default: 7)",
     )
 
     # SSL Certificate renewal flags
@@ -154,6 +207,58 @@ def parse_arguments():
         type=str,
         help="Database root password (generated if not provided)",
     )
+    parser.add_argument(
+        "--db-tune",
+        type=parse_tuning_override,
+        action="append",
+        default=[],
+        metavar="OPTION=VALUE",
+        help="Override a computed my.cnf setting, e.g. innodb_buffer_pool_size=2G (repeatable)",
+    )
+    parser.add_argument(
+        "--provision-databases",
+        action="store_true",
+        help="Create a database and user for every site that has none yet",
+    )
+
+    # Discovery options
+    parser.add_argument(
+        "--full-rescan",
+        action="store_true",
+        help="Ignore the discovery manifest and rescan every site directory",
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of parallel workers for I/O bound phases (default: 8)",
+    )
+
+    # Site container options
+    parser.add_argument(
+        "--build-workers",
+        type=int,
+        default=4,
+        help="Maximum number of site containers built and started in parallel (default: 4)",
+    )
+    parser.add_argument(
+        "--skip-containers",
+        action="store_true",
+        help="Do not build or start site containers",
+    )
+
+    # Instrumentation options
+    parser.add_argument(
+        "--report-path",
+        type=Path,
+        help="JSON run report with phase, site and subprocess timings (default: <state-path>/run-report.json)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the run with cProfile and dump the stats next to the run report",
+    )
 
     # Output options
     parser.add_argument(
@@ -163,115 +268,240 @@ def parse_arguments():
         help="Enable verbose output",
     )
 
-    return parser.parse_args()
+    # Subcommands (without one, a full configuration run is performed)
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    certs_parser = subparsers.add_parser("certs", help="Inspect SSL certificates")
+    certs_subparsers = certs_parser.add_subparsers(dest="certs_command", metavar="ACTION", required=True)
+    certs_list_parser = certs_subparsers.add_parser("list", help="List certificates from the certificate inventory")
+    certs_list_parser.add_argument(
+        "--expiring-within",
+        type=int,
+        metavar="DAYS",
+        help="Only list certificates expiring within DAYS days",
+    )
 
+    cache_parser = subparsers.add_parser("cache", help="Manage the proxy cache")
+    cache_subparsers = cache_parser.add_subparsers(dest="cache_command", metavar="ACTION", required=True)
+    cache_purge_parser = cache_subparsers.add_parser("purge", help="Remove the cached responses of a site")
+    cache_purge_parser.add_argument("site", metavar="SITE", help="Site name, e.g. www.example.com")
 
-def main():
-    """Main function."""
-    args = parse_arguments()
-    validate_paths(args)
-
-    # Get CA password
-    ca_password = get_ca_password(args)
-
-    # Initialize SSL certificate manager
-    ssl_manager = create_ssl_manager(args, ca_password)
-
-    # Initialize configuration generator
-    config_generator = ConfigGenerator(args.template_path)
-
-    # Template variables
-    root_ca_crt = args.root_ca_path / "perseus_ca.crt"
-    template_vars = {
-        "IP_PREFIX": args.ip_prefix,
-        "PROXY_SSL_PATH": args.root_ca_path.resolve().as_posix(),
-        "ROOT_CA_CRT": root_ca_crt.resolve().as_posix(),
-        "DB_MODE": args.database_mode,
-        "DB_ROOT_PASSWORD": args.database_root_password or "generated_password_placeholder",
-        "ENABLE_PROXY": True if args.nginx_mode == "docker" else False,
-        "ENABLE_DATABASE": True if args.database_mode == "docker" else False,
-    }
-
-    # Initialize managers using factory functions
-    nginx_manager = create_nginx_manager(args, template_vars)
-    database_manager = create_database_manager(args, template_vars)
+    opcache_parser = subparsers.add_parser("opcache", help="Manage the OPcache of PHP sites")
+    opcache_subparsers = opcache_parser.add_subparsers(dest="opcache_command", metavar="ACTION", required=True)
+    opcache_reset_parser = opcache_subparsers.add_parser(
+        "reset", help="Reset the OPcache of a site after a deployment, without restarting its containers"
+    )
+    opcache_reset_parser.add_argument("site", metavar="SITE", help="Site name, e.g. www.example.com")
 
-    # Setup services (install if needed)
-    nginx_manager.setup()
-    if database_manager:
-        database_manager.setup()
-        # Update template vars with actual database password
-        template_vars["DB_ROOT_PASSWORD"] = database_manager.root_password
+    precompress_parser = subparsers.add_parser(
+        "precompress", help="Write .gz (and .br) siblings of static assets for gzip_static"
+    )
+    precompress_parser.add_argument(
+        "--min-size",
+        type=int,
+        default=1024,
+        help="Smallest asset size in bytes worth compressing (default: 1024)",
+    )
+    precompress_parser.add_argument(
+        "--no-brotli",
+        action="store_true",
+        help="Do not write .br siblings even if the brotli module is installed",
+    )
 
-    # Clean up existing nginx enabled sites
-    nginx_manager.cleanup_sites()
+    daemon_parser = subparsers.add_parser("daemon", help="Keep the sites reconciled by watching the web path")
+    daemon_parser.add_argument(
+        "--socket-path",
+        type=Path,
+        default=Path("/run/site-builder/status.sock"),
+        help="Unix socket serving the daemon status as JSON (default: /run/site-builder/status.sock)",
+    )
+    daemon_parser.add_argument(
+        "--debounce",
+        type=float,
+        default=2.0,
+        help="Seconds without further changes before reconciling (default: 2)",
+    )
+    daemon_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between scans when inotify is not available (default: 10)",
+    )
+    daemon_parser.add_argument(
+        "--resync-interval",
+        type=float,
+        default=3600.0,
+        help="Seconds between full reconciliations, e.g. for certificate renewals; 0 disables them (default: 3600)",
+    )
+    daemon_parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="Poll the web path even if inotify is available",
+    )
 
-    # Discover sites
-    sites = discover_sites(args.web_path, args.verbose)
+    db_parser = subparsers.add_parser("db", help="Back up and restore site databases")
+    db_subparsers = db_parser.add_subparsers(dest="db_command", metavar="ACTION", required=True)
+    db_backup_parser = db_subparsers.add_parser("backup", help="Back up databases concurrently with compression")
+    db_backup_parser.add_argument(
+        "databases",
+        nargs="*",
+        metavar="DATABASE",
+        help="Databases to back up (default: all user databases)",
+    )
+    db_backup_parser.add_argument(
+        "--backup-path",
+        type=Path,
+        default=Path("/var/backups/site-builder"),
+        help="Directory receiving a timestamped backup directory (default: /var/backups/site-builder)",
+    )
+    db_backup_parser.add_argument(
+        "--compression",
+        type=str,
+        choices=["zstd", "gzip", "none"],
+        help="Dump compression (default: zstd when installed, gzip otherwise)",
+    )
+    db_subparsers.add_parser("tuning", help="Show the my.cnf settings computed for this host")
+    db_restore_parser = db_subparsers.add_parser("restore", help="Restore a database from a backup file")
+    db_restore_parser.add_argument("database", metavar="DATABASE", help="Database to restore into")
+    db_restore_parser.add_argument(
+        "backup_file",
+        type=Path,
+        metavar="FILE",
+        help="Backup file (.sql.zst, .sql.gz or .sql)",
+    )
 
-    if not sites:
-        logger.warning("No sites found to configure")
-        return
+    return parser.parse_args()
 
-    # Generate SSL certificates for each site
-    for site in sites:
-        ssl_manager.generate_certificates(
-            domain=site["domain"],
-            subdomain=site["name"],
-            renew_keys=args.renew_keys,
-            renew_csrs=args.renew_csrs,
-            renew_crts=args.renew_crts,
-            auto_renew_days=args.auto_renew_days,
-        )
 
-    # Generate site configurations
-    for site in sites:
-        logger.info("Configuring site: %s (TLS: %s)", site["name"], site["use_ssl"])
-        nginx_manager.generate_site_config(site, config_generator)
-        nginx_manager.enable_site(site["name"])
-
-        if args.verbose:
-            logger.info("Generated nginx config for %s", site["name"])
-
-    # Generate docker-compose.yaml
-    docker_compose_config = config_generator.render_docker_compose(sites, template_vars)
-    try:
-        args.docker_compose_path.parent.mkdir(parents=True, exist_ok=True)
-    except Exception as e:
-        logger.error(f"Failed to create directory for docker-compose file: {e}")
-        return
+def list_certificates(args) -> None:
+    """List certificates from the inventory without parsing any certificate file."""
+    inventory = CertificateInventory(args.root_ca_path / "inventory.json")
+    now = datetime.now(timezone.utc)
+    for entry in inventory.certificates(expiring_within=args.expiring_within):
+        not_after = datetime.fromisoformat(entry["not_after"])
+        days_left = (not_after - now).days
+        print(f"{not_after:%Y-%m-%d %H:%M}  {days_left:>5}d  {entry['path']}  {', '.join(entry['sans'])}")
+
+
+def precompress_assets(args) -> None:
+    """Pre-compress the static assets of all discovered sites."""
+    manifest = DiscoveryManifest(args.state_path / "discovery.json")
+    sites = discover_sites(args.web_path, args.verbose, manifest=manifest, workers=args.workers)
+    precompressor = Precompressor(
+        args.state_path / "precompress.json",
+        min_size=args.min_size,
+        use_brotli=not args.no_brotli,
+        workers=args.workers,
+    )
+    summary = precompressor.precompress_sites(sites)
+    logger.info(
+        "Static assets: %d compressed, %d unchanged, %d failed, %d stale siblings removed",
+        summary["compressed"],
+        summary["unchanged"],
+        summary["failed"],
+        summary["removed"],
+    )
+
 
-    try:
-        with args.docker_compose_path.open("w") as fp:
-            fp.write(docker_compose_config)
-        logger.info("Updated docker-compose.yml with nginx service")
-    except Exception as e:
-        logger.error(f"Failed to write docker-compose file: {e}")
+def reset_site_opcache(args) -> None:
+    """Reset the OPcache in every container of a PHP site."""
+    manifest = DiscoveryManifest(args.state_path / "discovery.json")
+    sites = discover_sites(args.web_path, args.verbose, manifest=manifest, workers=args.workers)
+    site = next((site for site in sites if site["name"] == args.site), None)
+    if site is None:
+        logger.error("Site not found: %s", args.site)
+        return
+    if "php" not in site["runtime"]["name"]:
+        logger.error("Site %s does not use a PHP runtime", args.site)
         return
 
-    # Generate main configuration (docker-compose for docker mode)
-    nginx_manager.generate_main_config(sites, config_generator)
+    reset = sum(reset_opcache(replica["container_name"]) for replica in site["replicas"])
+    logger.info("OPcache reset in %d of %d containers of %s", reset, len(site["replicas"]), args.site)
 
-    # Generate database configuration
-    if database_manager:
-        database_manager.generate_config(config_generator)
 
-    # Start services and reload configuration
-    if database_manager and not database_manager.is_running():
-        database_manager.start()
+def run_database_command(args) -> None:
+    """Back up or restore databases with the configured database manager."""
+    template_vars = {"DB_MODE": args.database_mode, **dict(args.db_tune)}
+    database_manager = create_database_manager(args, template_vars)
+    if database_manager is None:
+        logger.error("No database is managed with --database-mode none")
+        return
 
-    if not nginx_manager.is_running():
-        nginx_manager.start()
+    if args.db_command == "tuning":
+        manifest = DiscoveryManifest(args.state_path / "discovery.json")
+        template_vars["SITE_COUNT"] = len(discover_sites(args.web_path, manifest=manifest, workers=args.workers))
+        for variable, (value, source) in resolve_tuning(template_vars, database_manager.data_path).items():
+            print(f"{TUNING_VARIABLES[variable]:<24} = {value:<8} ({source})")
+    elif args.db_command == "backup":
+        backup_dir = args.backup_path / datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        manifest = backup_databases(
+            database_manager,
+            backup_dir,
+            databases=args.databases or None,
+            workers=args.workers,
+            compression=args.compression,
+        )
+        failed = [name for name, entry in manifest["databases"].items() if "error" in entry]
+        logger.info(
+            "Backed up %d databases to %s (%d failed)",
+            len(manifest["databases"]) - len(failed),
+            backup_dir,
+            len(failed),
+        )
     else:
-        nginx_manager.reload()
+        database_manager.restore_database(args.database, args.backup_file)
 
-    # Log configuration summary
-    logger.info(
-        "Successfully configured %d sites using nginx:%s database:%s",
-        len(sites),
-        args.nginx_mode,
-        args.database_mode,
-    )
+
+def main():
+    """Main function."""
+    args = parse_arguments()
+
+    if args.command == "certs":
+        list_certificates(args)
+        return
+    if args.command == "cache":
+        purge_site_cache(args.proxy_cache_path, args.site)
+        return
+    if args.command == "opcache":
+        reset_site_opcache(args)
+        return
+    if args.command == "precompress":
+        precompress_assets(args)
+        return
+    if args.command == "db":
+        run_database_command(args)
+        return
+
+    report = RunReport()
+    report_path = args.report_path or args.state_path / "run-report.json"
+    with report.active(), profiled(report_path.with_suffix(".pstats") if args.profile else None):
+        with report.phase("validate"):
+            validate_paths(args)
+
+        try:
+            with report.phase("setup"):
+                reconciler = SiteReconciler(args)
+        except ValueError as e:
+            logger.error("Invalid container network: %s", e)
+            return
+
+        if args.command == "daemon":
+            Daemon(
+                reconciler,
+                args.web_path,
+                socket_path=args.socket_path,
+                debounce=args.debounce,
+                poll_interval=args.poll_interval,
+                resync_interval=args.resync_interval,
+                polling=args.polling,
+                report_path=report_path,
+            ).run()
+            return
+
+        reconciler.reconcile()
+
+    report.write(report_path)
+    logger.info("Run report written to %s", report_path)
 
 
 if __name__ == "__main__":
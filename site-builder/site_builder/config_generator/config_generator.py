@@ -1,5 +1,6 @@
 """Configuration generator using Jinja2 templates."""
 
+import re
 from pathlib import Path
 from typing import Any, Dict, List
 
@@ -11,17 +12,30 @@ class ConfigGenerator:
 
     def __init__(self, template_path: Path):
         self.env = Environment(loader=FileSystemLoader(template_path))
+        self.env.filters["regex_escape"] = re.escape
 
     def render_nginx_config(self, site: Dict[str, Any], template_vars: Dict[str, Any]) -> str:
         """Render nginx configuration using Jinja2 template."""
         template = self.env.get_template("nginx.conf.tpl")
         return template.render(site=site, **template_vars)
 
+    def render_nginx_main_config(self, sites: List[Dict[str, Any]], template_vars: Dict[str, Any]) -> str:
+        """Render the shared nginx configuration using Jinja2 template."""
+        template = self.env.get_template("nginx-main.conf.tpl")
+        return template.render(sites=sites, **template_vars)
+
     def render_docker_compose(self, sites: List[Dict[str, Any]], template_vars: Dict[str, Any]) -> str:
         """Render docker-compose configuration using Jinja2 template."""
         template = self.env.get_template("docker-compose.yml.tpl")
         return template.render(sites=sites, **template_vars)
 
+    def render_compose_service(
+        self, site: Dict[str, Any], replica: Dict[str, Any], template_vars: Dict[str, Any]
+    ) -> str:
+        """Render the docker-compose service block of a single site replica using Jinja2 template."""
+        template = self.env.get_template("docker-compose-service.yml.tpl")
+        return template.render(site=site, replica=replica, **template_vars)
+
     def render_mariadb_config(self, template_vars: Dict[str, Any]) -> str:
         """Render MariaDB configuration using Jinja2 template."""
         template = self.env.get_template("my.cnf.tpl")
@@ -1,12 +1,25 @@
 """Core functionality for the site-builder package."""
 
+from .daemon import Daemon
+from .discovery_manifest import DiscoveryManifest
+from .ip_allocator import IPAllocator
+from .precompress import Precompressor
 from .manager_factory import create_database_manager, create_nginx_manager
 from .site_discovery import discover_sites
+from .site_reconciler import SiteReconciler
+from .site_settings import DEFAULT_SETTINGS, load_site_settings
 from .ssl_manager_factory import create_ssl_manager
 from .validation import get_ca_password, validate_paths
 
 __all__ = [
+    "DEFAULT_SETTINGS",
+    "Daemon",
+    "DiscoveryManifest",
+    "IPAllocator",
+    "Precompressor",
+    "SiteReconciler",
     "discover_sites",
+    "load_site_settings",
     "create_ssl_manager",
     "create_nginx_manager",
     "create_database_manager",
@@ -0,0 +1,193 @@
+"""Long-running reconcile loop driven by changes in the web path."""
+
+import json
+import logging
+import os
+import signal
+import socketserver
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from ..utils.instrumentation import RunReport
+from .file_watcher import create_watcher, wait_quiet
+from .site_reconciler import SiteReconciler
+
+logger = logging.getLogger("site-builder")
+
+
+class _StatusServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Daemon:
+    """Keeps the sites reconciled by watching the web path instead of running from cron.
+
+    Every change is debounced, so a burst of changes (a deployment copying a site, a
+    certificate renewal) leads to a single reconciliation, limited to the domains whose
+    directories changed. A full reconciliation runs at startup, every resync_interval
+    seconds, which catches certificates nearing expiry, and on SIGHUP. The status of the
+    daemon is served as JSON to every client connecting to a local unix socket.
+    """
+
+    def __init__(
+        self,
+        reconciler: SiteReconciler,
+        web_path: Path,
+        socket_path: Optional[Path] = None,
+        debounce: float = 2.0,
+        poll_interval: float = 10.0,
+        resync_interval: float = 3600.0,
+        polling: bool = False,
+        report_path: Optional[Path] = None,
+    ):
+        """
+        Initialize the daemon.
+
+        Args:
+            reconciler: Reconciler kept for the lifetime of the daemon
+            web_path: Web root directory to watch
+            socket_path: Path of the unix socket serving the status (no status endpoint if None)
+            debounce: Seconds without further changes before reconciling
+            poll_interval: Seconds between scans when inotify is not available
+            resync_interval: Seconds between full reconciliations without changes (0 disables them)
+            polling: Poll even if inotify is available
+            report_path: Path of the JSON run report rewritten after every reconciliation (none if None)
+        """
+        self.reconciler = reconciler
+        self.web_path = web_path
+        self.socket_path = socket_path
+        self.debounce = debounce
+        self.resync_interval = resync_interval
+        self.report_path = report_path
+        self.watcher = create_watcher(web_path, poll_interval=poll_interval, polling=polling)
+        self._stop = threading.Event()
+        self._resync = threading.Event()
+        self._lock = threading.Lock()
+        self._status: Dict[str, Any] = {
+            "pid": os.getpid(),
+            "started": datetime.now(timezone.utc).isoformat(),
+            "watcher": self.watcher.mode,
+            "state": "starting",
+            "runs": 0,
+            "last_run": None,
+        }
+
+    def status(self) -> Dict[str, Any]:
+        """Get a snapshot of the daemon status."""
+        with self._lock:
+            return json.loads(json.dumps(self._status))
+
+    def _update_status(self, **values: Any) -> None:
+        with self._lock:
+            self._status.update(values)
+
+    def _serve_status(self) -> Optional[_StatusServer]:
+        """Start answering status requests on the unix socket in a background thread."""
+        if self.socket_path is None:
+            return None
+        daemon = self
+
+        class StatusHandler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                self.wfile.write(json.dumps(daemon.status(), indent=2).encode() + b"\n")
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+        server = _StatusServer(str(self.socket_path), StatusHandler)
+        os.chmod(self.socket_path, 0o660)
+        threading.Thread(target=server.serve_forever, name="status-server", daemon=True).start()
+        logger.info("Serving daemon status on %s", self.socket_path)
+        return server
+
+    def _changed_domains(self, changed: Set[str]) -> Optional[Set[str]]:
+        """Get the names of the domains the changed directories belong to, or None if the web path itself changed."""
+        domains = set()
+        for directory in changed:
+            relative = os.path.relpath(directory, self.web_path)
+            if relative in (os.curdir, os.pardir) or relative.startswith(os.pardir + os.sep):
+                return None
+            domains.add(relative.split(os.sep, 1)[0])
+        return domains
+
+    def _reconcile(self, reason: str, changed: Set[str], domains: Optional[Set[str]] = None) -> None:
+        """Run one reconciliation, of the given domains only or of everything, recording its outcome in the status."""
+        self._update_status(state="reconciling")
+        if domains is None:
+            logger.info("Reconciling all sites (%s, %d changed directories)", reason, len(changed))
+        else:
+            logger.info("Reconciling the sites of %s (%s)", ", ".join(sorted(domains)), reason)
+        started = time.monotonic()
+        report = RunReport()
+        try:
+            with report.active():
+                result = self.reconciler.reconcile(domains=domains)
+        except Exception as e:
+            # A failed run must not stop the daemon, the next change or resync retries it
+            logger.exception("Reconciliation failed")
+            result = {"error": str(e)}
+        if self.report_path is not None:
+            try:
+                report.write(self.report_path)
+            except OSError as e:
+                logger.warning("Failed to write run report %s: %s", self.report_path, e)
+        with self._lock:
+            self._status["runs"] += 1
+            self._status["state"] = "watching"
+            self._status["last_run"] = {
+                "finished": datetime.now(timezone.utc).isoformat(),
+                "duration": round(time.monotonic() - started, 3),
+                "reason": reason,
+                "changed": sorted(changed),
+                "domains": None if domains is None else sorted(domains),
+                "result": result,
+            }
+
+    def stop(self, *_: Any) -> None:
+        """Ask the daemon to stop after the current wait or reconciliation."""
+        self._stop.set()
+
+    def resync(self, *_: Any) -> None:
+        """Ask the daemon for a full reconciliation."""
+        self._resync.set()
+
+    def run(self) -> None:
+        """Reconcile once, then reconcile again on every change until stopped by SIGTERM or SIGINT."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, self.resync)
+        server = self._serve_status()
+        logger.info("Watching %s for changes (%s)", self.web_path, self.watcher.mode)
+
+        try:
+            self._reconcile("startup", set())
+            next_resync = time.monotonic() + self.resync_interval
+            while not self._stop.is_set():
+                # Wake up regularly to notice stop and resync requests
+                changed = self.watcher.wait(1.0)
+                if changed:
+                    changed = wait_quiet(self.watcher, changed, self.debounce)
+                    self._reconcile("change", changed, self._changed_domains(changed))
+                elif self._resync.is_set():
+                    self._reconcile("signal", set())
+                elif self.resync_interval and time.monotonic() >= next_resync:
+                    self._reconcile("resync", set())
+                else:
+                    continue
+                self._resync.clear()
+                next_resync = time.monotonic() + self.resync_interval
+        finally:
+            self.watcher.close()
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+                try:
+                    self.socket_path.unlink()
+                except FileNotFoundError:
+                    pass
+            logger.info("Daemon stopped")
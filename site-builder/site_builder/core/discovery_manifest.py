@@ -0,0 +1,99 @@
+"""Persistent manifest used to make site discovery incremental."""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..utils import atomic_write
+
+logger = logging.getLogger("site-builder")
+
+
+def path_signature(path: Path) -> Optional[List[int]]:
+    """Get a cheap change signature (inode, mtime, size) for a path, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+
+
+class DiscoveryManifest:
+    """Stores the result of the previous discovery run keyed by directory path and signature.
+
+    The manifest is a JSON file with one entry per domain directory. Each entry holds the
+    domain signature (used to decide whether the subdomain listing can be reused) and the
+    discovered sites together with their own signatures (used to decide whether the site
+    has to be rescanned).
+    """
+
+    VERSION = 11
+
+    def __init__(self, manifest_path: Path, full_rescan: bool = False):
+        """
+        Initialize the discovery manifest.
+
+        Args:
+            manifest_path: Path to the JSON manifest file
+            full_rescan: Ignore the stored manifest and rescan everything
+        """
+        self.manifest_path = manifest_path
+        self.full_rescan = full_rescan
+        self._previous: Dict[str, Any] = {}
+        self._current: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if not full_rescan:
+            self._previous = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        """Load the stored domain entries, discarding unreadable or incompatible manifests."""
+        if not self.manifest_path.is_file():
+            return {}
+        try:
+            with self.manifest_path.open("r") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError) as err:
+            logger.warning("Ignoring unreadable discovery manifest %s: %s", self.manifest_path, err)
+            return {}
+        if data.get("version") != self.VERSION:
+            logger.info("Discovery manifest version changed, performing a full rescan")
+            return {}
+        return data.get("domains", {})
+
+    def get_domain(self, domain_path: str) -> Optional[Dict[str, Any]]:
+        """Get the stored entry for a domain directory."""
+        return self._previous.get(domain_path)
+
+    def get_site(self, domain_path: str, site_path: str, signature: List[Any]) -> Optional[Dict[str, Any]]:
+        """Get a stored site if its signature still matches, otherwise None."""
+        domain = self._previous.get(domain_path)
+        if domain:
+            entry = domain.get("sites", {}).get(site_path)
+            if entry and entry.get("signature") == signature:
+                with self._lock:
+                    self.hits += 1
+                return entry["site"]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set_domain(self, domain_path: str, signature: List[Any], sites: Dict[str, Dict[str, Any]]) -> None:
+        """Record the scan result for a domain directory in the manifest being built."""
+        self._current[domain_path] = {"signature": signature, "sites": sites}
+
+    def save(self) -> None:
+        """Write the manifest atomically, keeping only the domains seen in this run.
+
+        The saved entries become the baseline of the next discovery with this manifest, so a
+        long-running process rescans only what changed since its previous discovery.
+        """
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(self.manifest_path, json.dumps({"version": self.VERSION, "domains": self._current}))
+        logger.info("Discovery manifest saved (%d reused, %d rescanned)", self.hits, self.misses)
+        self._previous, self._current = self._current, {}
+        self.hits = self.misses = 0
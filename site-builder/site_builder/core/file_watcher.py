@@ -0,0 +1,242 @@
+"""Watching the web path for changes that affect the discovered sites."""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .discovery_manifest import path_signature
+from .site_discovery import DOMAIN_RE
+
+logger = logging.getLogger("site-builder")
+
+# inotify(7) flags
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+WATCH_MASK = (
+    IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def watched_directories(web_path: Path) -> Set[str]:
+    """List the directories whose content site discovery depends on.
+
+    These are the web path, every domain directory with its .cert directory, every site
+    directory and the whole .runtime tree of a site. Site content below the site
+    directory itself is not watched.
+    """
+
+    def subdirectories(path: str) -> List[str]:
+        try:
+            with os.scandir(path) as iterator:
+                return [entry.path for entry in iterator if entry.is_dir() and DOMAIN_RE.match(entry.name)]
+        except OSError:
+            return []
+
+    root = web_path.as_posix()
+    directories = {root}
+    for domain in subdirectories(root):
+        directories.add(domain)
+        directories.add(os.path.join(domain, ".cert"))
+        for site in subdirectories(domain):
+            directories.add(site)
+            for runtime_directory, _, _ in os.walk(os.path.join(site, ".runtime")):
+                directories.add(runtime_directory)
+    return {directory for directory in directories if os.path.isdir(directory)}
+
+
+class FileWatcher(ABC):
+    """Reports the watched directories in which something changed."""
+
+    mode = ""
+
+    def __init__(self, web_path: Path):
+        self.web_path = web_path
+
+    @abstractmethod
+    def wait(self, timeout: float) -> Set[str]:
+        """Wait up to timeout seconds for changes, returning the directories that changed (empty on timeout)."""
+        pass
+
+    def close(self) -> None:
+        """Release the resources held by the watcher."""
+        pass
+
+
+class InotifyWatcher(FileWatcher):
+    """Watches the web path with Linux inotify, called through ctypes."""
+
+    mode = "inotify"
+
+    def __init__(self, web_path: Path):
+        """
+        Initialize the inotify watcher.
+
+        Raises:
+            OSError: If inotify is not available
+        """
+        super().__init__(web_path)
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._watches: Dict[int, str] = {}
+        self._sync_watches()
+
+    def _sync_watches(self) -> None:
+        """Watch the directories discovery depends on, dropping the watches of directories no longer relevant."""
+        wanted = watched_directories(self.web_path)
+        watched = {path: wd for wd, path in self._watches.items()}
+        for path in wanted - set(watched):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    logger.warning("inotify watch limit reached, raise fs.inotify.max_user_watches to watch %s", path)
+                continue
+            self._watches[wd] = path
+        for path in set(watched) - wanted:
+            self._libc.inotify_rm_watch(self._fd, watched[path])
+            self._watches.pop(watched[path], None)
+
+    def _read_events(self) -> List[Tuple[int, int, str]]:
+        """Read the pending events as (watch descriptor, mask, name) tuples."""
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def wait(self, timeout: float) -> Set[str]:
+        readable, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        if not readable:
+            return set()
+
+        changed = set()
+        for wd, mask, name in self._read_events():
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, treat everything as changed
+                changed.add(self.web_path.as_posix())
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            path = self._watches.get(wd)
+            if path is not None:
+                changed.add(path)
+        if changed:
+            self._sync_watches()
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher(FileWatcher):
+    """Watches the web path by comparing the signatures of the watched directories and their files."""
+
+    mode = "polling"
+
+    def __init__(self, web_path: Path, interval: float = 10.0):
+        super().__init__(web_path)
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self) -> Dict[str, List]:
+        """Get the signature of every watched directory and of the files directly inside it."""
+        snapshot = {}
+        for directory in watched_directories(self.web_path):
+            signature = [path_signature(directory)]
+            try:
+                with os.scandir(directory) as iterator:
+                    for entry in sorted(iterator, key=lambda entry: entry.name):
+                        if entry.is_file():
+                            stat = entry.stat()
+                            signature.append([entry.name, stat.st_mtime_ns, stat.st_size])
+            except OSError:
+                pass
+            snapshot[directory] = signature
+        return snapshot
+
+    def wait(self, timeout: float) -> Set[str]:
+        delay = self._next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(max(0.0, timeout))
+            return set()
+        time.sleep(max(0.0, delay))
+        self._next_scan = time.monotonic() + self.interval
+
+        snapshot = self._scan()
+        changed = {
+            directory
+            for directory in set(snapshot) | set(self._snapshot)
+            if snapshot.get(directory) != self._snapshot.get(directory)
+        }
+        self._snapshot = snapshot
+        return changed
+
+
+def create_watcher(web_path: Path, poll_interval: float = 10.0, polling: bool = False) -> FileWatcher:
+    """Create an inotify watcher, falling back to polling where inotify is unavailable or not wanted."""
+    if not polling:
+        try:
+            return InotifyWatcher(web_path)
+        except (OSError, AttributeError) as e:
+            logger.warning("inotify is not available (%s), polling %s every %ss", e, web_path, poll_interval)
+    return PollingWatcher(web_path, interval=poll_interval)
+
+
+def wait_quiet(watcher: FileWatcher, changed: Set[str], debounce: float, max_delay: Optional[float] = None) -> Set[str]:
+    """Collect further changes until none arrive for debounce seconds, or max_delay has passed."""
+    deadline = time.monotonic() + (max_delay if max_delay is not None else debounce * 10)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return changed
+        more = watcher.wait(min(debounce, remaining))
+        if not more:
+            return changed
+        changed |= more
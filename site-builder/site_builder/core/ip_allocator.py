@@ -0,0 +1,162 @@
+"""Address allocation for site containers on the docker bridge network."""
+
+import ipaddress
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Union
+
+from ..utils import atomic_write
+
+logger = logging.getLogger("site-builder")
+
+
+class IPAllocator:
+    """Allocates container addresses from a configurable IPv4 network.
+
+    The first host address is the network gateway, the last one belongs to the MariaDB
+    container and the one before it to the nginx proxy container. Site replicas get the
+    remaining addresses starting at first_host, so a /16 network holds over 65000 sites.
+
+    When a state file is given, allocations are persisted per compose service: a service
+    keeps its address across runs, new services take the lowest free address, and the
+    address of a removed service is only reused once it has been gone for grace_days, so
+    adding or removing a site never renumbers the others.
+    """
+
+    def __init__(
+        self,
+        network: Union[str, ipaddress.IPv4Network],
+        first_host: int = 2,
+        state_file: Optional[Path] = None,
+        grace_days: int = 7,
+    ):
+        """
+        Initialize the IP allocator.
+
+        Args:
+            network: The container network in CIDR notation, e.g. 10.20.0.0/16
+            first_host: Offset of the first site address from the network address
+            state_file: Path to the JSON allocation table (not persisted if None)
+            grace_days: Days an address of a removed service stays reserved before reuse
+
+        Raises:
+            ValueError: If the network is invalid or too small
+        """
+        self.network = ipaddress.IPv4Network(network)
+        if self.network.num_addresses < 8:
+            raise ValueError(f"Container network {self.network} is too small")
+        self.gateway = self.network[1]
+        self.proxy = self.network[-3]
+        self.database = self.network[-2]
+        self.reserved = {self.gateway, self.proxy, self.database}
+        self.first_host = max(first_host, 1)
+        self.state_file = state_file
+        self.grace_period = timedelta(days=grace_days)
+
+    def template_vars(self) -> Dict[str, str]:
+        """Get the template variables describing the network and its reserved addresses."""
+        return {
+            "NETWORK_SUBNET": str(self.network),
+            "NETWORK_GATEWAY": str(self.gateway),
+            "PROXY_ADDRESS": str(self.proxy),
+            "DATABASE_ADDRESS": str(self.database),
+        }
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Load the allocation table, starting empty if it is missing or unreadable."""
+        if self.state_file is None or not self.state_file.is_file():
+            return {}
+        try:
+            with self.state_file.open("r") as fp:
+                return json.load(fp).get("allocations", {})
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable address allocations %s: %s", self.state_file, e)
+            return {}
+
+    def _save(self, allocations: Dict[str, Dict[str, Any]]) -> None:
+        """Write the allocation table atomically."""
+        if self.state_file is None:
+            return
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        data = {"network": str(self.network), "allocations": allocations}
+        atomic_write(self.state_file, json.dumps(data, indent=2, sort_keys=True))
+
+    def _usable(self, address: str) -> bool:
+        """Check whether an address may be given to a site replica."""
+        try:
+            ip = ipaddress.IPv4Address(address)
+        except ValueError:
+            return False
+        offset = int(ip) - int(self.network.network_address)
+        return (
+            ip in self.network
+            and ip not in self.reserved
+            and self.first_host <= offset < self.network.num_addresses - 1
+        )
+
+    def _free_addresses(self, used: Set[str]) -> Iterator[str]:
+        """Iterate over the addresses that may be given to new site replicas, lowest first."""
+        for offset in range(self.first_host, self.network.num_addresses - 1):
+            address = self.network[offset]
+            if address not in self.reserved and str(address) not in used:
+                yield str(address)
+
+    def allocate(self, sites: List[Dict[str, Any]]) -> None:
+        """Give every site replica its own address, setting replica["address"].
+
+        Raises:
+            ValueError: If the network runs out of addresses or two replicas would share one
+        """
+        now = datetime.now(timezone.utc)
+        previous = self._load()
+        allocations: Dict[str, Dict[str, Any]] = {}
+        assigned: Dict[str, str] = {}
+        services = [replica for site in sorted(sites, key=lambda site: site["name"]) for replica in site["replicas"]]
+        current = {replica["service"] for replica in services}
+
+        # Keep the addresses of removed services reserved until their grace period is over
+        for service, entry in previous.items():
+            if service in current or not self._usable(entry.get("address", "")):
+                continue
+            released = datetime.fromisoformat(entry["released"]) if entry.get("released") else now
+            if now - released < self.grace_period:
+                allocations[service] = {"address": entry["address"], "released": released.isoformat()}
+                assigned[entry["address"]] = service
+            else:
+                logger.info("Reclaimed address %s of removed service %s", entry["address"], service)
+
+        # Existing services keep their address
+        pending = []
+        for replica in services:
+            address = previous.get(replica["service"], {}).get("address", "")
+            if self._usable(address) and address not in assigned:
+                replica["address"] = address
+                assigned[address] = replica["service"]
+                allocations[replica["service"]] = {"address": address, "released": None}
+            else:
+                pending.append(replica)
+
+        # New services, or services whose address left the network, take the lowest free addresses
+        free = self._free_addresses(set(assigned))
+        for replica in pending:
+            try:
+                address = next(free)
+            except StopIteration:
+                raise ValueError(
+                    f"Container network {self.network} has no address left for {replica['service']}"
+                ) from None
+            self._check(address, replica["service"], assigned)
+            replica["address"] = address
+            assigned[address] = replica["service"]
+            allocations[replica["service"]] = {"address": address, "released": None}
+
+        self._save(allocations)
+
+    def _check(self, address: str, service: str, assigned: Dict[str, str]) -> None:
+        """Reject an address outside the network, reserved or already given to another service."""
+        if not self._usable(address):
+            raise ValueError(f"Address {address} of {service} is not available in {self.network}")
+        if address in assigned and assigned[address] != service:
+            raise ValueError(f"Address {address} of {service} is already used by {assigned[address]}")
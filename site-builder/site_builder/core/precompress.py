@@ -0,0 +1,227 @@
+"""Pre-compression of static assets so nginx can serve them with gzip_static."""
+
+import gzip
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..utils import atomic_write
+
+try:
+    import brotli
+except ImportError:  # Optional dependency, only .gz siblings are written without it
+    brotli = None
+
+logger = logging.getLogger("site-builder")
+
+# Text-like assets that compress well; images, fonts such as woff2 and media are already compressed
+COMPRESSIBLE_EXTENSIONS = {
+    ".css",
+    ".js",
+    ".mjs",
+    ".map",
+    ".json",
+    ".svg",
+    ".txt",
+    ".xml",
+    ".html",
+    ".htm",
+    ".ico",
+    ".wasm",
+    ".ttf",
+    ".otf",
+    ".eot",
+}
+
+# Directories never walked: dependencies and sources that are not served as static files
+SKIPPED_DIRECTORIES = {"node_modules", "__pycache__", "vendor"}
+
+# A compressed sibling is only kept if it saves at least this share of the original size
+MIN_SAVING = 0.1
+
+ENCODINGS = {"gzip": ".gz", "brotli": ".br"}
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "brotli":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _find_assets(web_root: str, min_size: int) -> List[Tuple[str, os.stat_result]]:
+    """Walk a web root for compressible assets of at least min_size bytes, skipping hidden entries."""
+    assets = []
+    for directory, directories, files in os.walk(web_root):
+        directories[:] = [name for name in directories if not name.startswith(".") and name not in SKIPPED_DIRECTORIES]
+        for name in files:
+            if name.startswith(".") or os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_size >= min_size:
+                assets.append((path, stat))
+    return assets
+
+
+class Precompressor:
+    """Writes compressed siblings (style.css.gz, style.css.br) next to the static assets of sites.
+
+    A manifest records the size and modification time of every asset together with the
+    siblings written for it, so reruns only touch assets that changed, and siblings that
+    would not save enough are not written at all. Siblings that already existed before
+    (shipped by a build tool, for example) are never overwritten or removed. Siblings
+    written for assets that are gone are removed.
+    """
+
+    def __init__(self, manifest_path: Path, min_size: int = 1024, use_brotli: bool = True, workers: int = 4):
+        """
+        Initialize the precompressor.
+
+        Args:
+            manifest_path: Path to the JSON manifest of compressed assets
+            min_size: Smallest asset size in bytes worth compressing
+            use_brotli: Also write .br siblings when the brotli module is installed
+            workers: Number of sites walked and assets compressed in parallel
+        """
+        self.manifest_path = manifest_path
+        self.min_size = min_size
+        self.encodings = ["gzip", "brotli"] if use_brotli and brotli is not None else ["gzip"]
+        self.workers = max(1, workers)
+        if use_brotli and brotli is None:
+            logger.info("The brotli module is not installed, writing .gz siblings only")
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Load the manifest, starting empty if it is missing or unreadable."""
+        if not self.manifest_path.is_file():
+            return {}
+        try:
+            with self.manifest_path.open("r") as fp:
+                return json.load(fp).get("files", {})
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable precompress manifest %s: %s", self.manifest_path, e)
+            return {}
+
+    def _is_current(self, path: str, stat: os.stat_result, entry: Optional[Dict[str, Any]]) -> bool:
+        """Check whether an asset is unchanged since the manifest entry and its siblings are still there."""
+        if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            return False
+        if set(entry["skipped"]) | set(entry["written"]) | set(entry.get("foreign", [])) != set(self.encodings):
+            return False
+        return all(os.path.exists(path + ENCODINGS[encoding]) for encoding in entry["written"])
+
+    def _process(self, path: str, stat: os.stat_result, entry: Optional[Dict[str, Any]]) -> Tuple[str, Dict]:
+        """Write the missing or outdated siblings of an asset, returning its status and manifest entry."""
+        if self._is_current(path, stat, entry):
+            return "unchanged", entry
+
+        data = None
+        written, skipped, foreign = [], [], []
+        status = "unchanged"
+        owned = set(entry["written"]) if entry else set()
+        for encoding in self.encodings:
+            sibling = path + ENCODINGS[encoding]
+            try:
+                sibling_stat = os.stat(sibling)
+            except FileNotFoundError:
+                sibling_stat = None
+            if sibling_stat is not None and encoding not in owned:
+                # Not written by us, so it is left alone even when outdated
+                if sibling_stat.st_mtime_ns < stat.st_mtime_ns:
+                    logger.warning("Leaving %s alone, it is older than its asset but was not written here", sibling)
+                foreign.append(encoding)
+                continue
+            if sibling_stat is not None and sibling_stat.st_mtime_ns == stat.st_mtime_ns:
+                written.append(encoding)
+                continue
+
+            if data is None:
+                with open(path, "rb") as fp:
+                    data = fp.read()
+            compressed = _compress(data, encoding)
+            if len(compressed) > len(data) * (1 - MIN_SAVING):
+                skipped.append(encoding)
+                if os.path.exists(sibling):
+                    os.unlink(sibling)
+                continue
+
+            atomic_write(Path(sibling), compressed, mode=stat.st_mode & 0o666)
+            # The sibling carries the asset's modification time so Last-Modified and ETag match either way
+            os.utime(sibling, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            written.append(encoding)
+            status = "compressed"
+
+        return status, {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "written": written,
+            "skipped": skipped,
+            "foreign": foreign,
+        }
+
+    def _remove_orphans(self, previous: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]]) -> int:
+        """Remove the siblings written for assets that no longer exist.
+
+        A sibling is only removed if it still carries the modification time it was written
+        with, so a file put in its place since then is kept.
+        """
+        removed = 0
+        for path, entry in previous.items():
+            if path in current:
+                continue
+            for encoding in entry["written"]:
+                sibling = path + ENCODINGS[encoding]
+                try:
+                    if os.stat(sibling).st_mtime_ns != entry["mtime_ns"]:
+                        continue
+                    os.unlink(sibling)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def precompress_sites(self, sites: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Pre-compress the static assets of every site.
+
+        Returns:
+            Number of assets compressed, unchanged and failed, and of orphaned siblings removed
+        """
+        previous = self._load()
+        summary = {"compressed": 0, "unchanged": 0, "failed": 0, "removed": 0}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            web_roots = sorted({site["web_root"] for site in sites})
+            assets = [
+                asset
+                for site_assets in executor.map(lambda web_root: _find_assets(web_root, self.min_size), web_roots)
+                for asset in site_assets
+            ]
+
+            def process(asset: Tuple[str, os.stat_result]) -> Tuple[str, Optional[Dict[str, Any]]]:
+                path, stat = asset
+                try:
+                    return self._process(path, stat, previous.get(path))
+                except OSError as e:
+                    logger.error("Failed to pre-compress %s: %s", path, e)
+                    return "failed", previous.get(path)
+
+            current = {}
+            for (path, _), (status, entry) in zip(assets, executor.map(process, assets)):
+                summary[status] += 1
+                if entry is not None:
+                    current[path] = entry
+
+        # Siblings are only removed inside the web roots of current sites; removed sites are forgotten
+        walked = tuple(os.path.join(web_root, "") for web_root in web_roots)
+        summary["removed"] = self._remove_orphans(
+            {path: entry for path, entry in previous.items() if path.startswith(walked)}, current
+        )
+
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(self.manifest_path, json.dumps({"files": current}, indent=2, sort_keys=True))
+        return summary
@@ -1,7 +1,7 @@
 import logging
 from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Set
 
 logger = logging.getLogger("site-builder")
 
@@ -21,6 +21,8 @@ def get_default_runtime(app_type: str = "php") -> Dict[str, Any]:
         "name": container_name,
         "version": "latest",
         "context": runtimes_path / container_name,
+        # Helpers shared by the bundled runtimes, copied in with COPY --from=shared
+        "build_contexts": {"shared": runtimes_path / "shared"},
     }
 
 
@@ -38,30 +40,51 @@ def get_runtime_version(runtime_path: Path) -> str:
     return "latest"
 
 
-def detect_default_runtime(subdomain_path: Path) -> Dict[str, Any]:
-    """Detect the default runtime environment based on common files."""
-    if (subdomain_path / "index.php").is_file():
+def _has_file(subdomain_path: Path, name: str, files: Optional[Set[str]]) -> bool:
+    """Check for a file, using an already known directory listing when available."""
+    if files is not None:
+        return name in files
+    return (subdomain_path / name).is_file()
+
+
+def detect_default_runtime(subdomain_path: Path, files: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """Detect the default runtime environment based on common files.
+
+    Args:
+        subdomain_path: Path to the subdomain directory
+        files: Names of the regular files in the subdomain directory, if already listed
+    """
+    if _has_file(subdomain_path, "index.php", files):
         return get_default_runtime("php")
-    elif (subdomain_path / "index.py").is_file():
+    elif _has_file(subdomain_path, "index.py", files):
         return get_default_runtime("python")
-    elif (subdomain_path / "index.ts").is_file():
+    elif _has_file(subdomain_path, "index.ts", files):
         return get_default_runtime("nodejs")
     else:
         logger.info(f"No specific runtime files found in {subdomain_path}, using PHP as default")
         return get_default_runtime("php")
 
 
-def detect_runtime(subdomain_path: Path) -> Dict[str, Any]:
-    """Detect the runtime environment for a given subdomain based on its files."""
+def detect_runtime(
+    subdomain_path: Path, files: Optional[Set[str]] = None, directories: Optional[Set[str]] = None
+) -> Dict[str, Any]:
+    """Detect the runtime environment for a given subdomain based on its files.
+
+    Args:
+        subdomain_path: Path to the subdomain directory
+        files: Names of the regular files in the subdomain directory, if already listed
+        directories: Names of the directories in the subdomain directory, if already listed
+    """
 
     runtime_path = subdomain_path / ".runtime"
-    if not runtime_path.is_dir():
+    has_runtime = ".runtime" in directories if directories is not None else runtime_path.is_dir()
+    if not has_runtime:
         logger.info(f"No .runtime directory found in {subdomain_path}, using default runtime")
-        return detect_default_runtime(subdomain_path)
+        return detect_default_runtime(subdomain_path, files)
 
     if not (runtime_path / "Dockerfile").is_file():
         logger.warning(f"No Dockerfile found in {runtime_path}, using default runtime")
-        return detect_default_runtime(subdomain_path)
+        return detect_default_runtime(subdomain_path, files)
 
     runtime = {
         "name": f"{subdomain_path.name}",
@@ -1,52 +1,226 @@
 """Site discovery utilities for site-builder."""
 
 import logging
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+from ..utils import instrumentation
+from .discovery_manifest import DiscoveryManifest, path_signature
 from .runtime_management import detect_runtime
+from .site_settings import SETTINGS_FILE, load_site_settings
 
 logger = logging.getLogger("site-builder")
 
+DOMAIN_RE = re.compile(r"^([a-z0-9-]+\.)+[a-z]{2,4}$")
 
-def discover_sites(web_path: Path, verbose: bool = False) -> List[Dict[str, Any]]:
-    """Discover sites from web directory structure."""
-    domain_re = re.compile(r"^([a-z0-9-]+\.)+[a-z]{2,4}$")
-    sites = []
-    ip_suffix = 2
 
-    for domain in web_path.glob("*"):
-        if not domain.is_dir() or not domain_re.match(domain.name):
-            continue
+def _list_directory(path: str) -> Tuple[List[os.DirEntry], Set[str], Set[str]]:
+    """List a directory once with scandir, returning its entries and the names of its files and directories.
+
+    The entry type comes from the directory listing itself, so no extra stat call is
+    made per entry except for symlinks.
+    """
+    entries = []
+    files = set()
+    directories = set()
+    try:
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                entries.append(entry)
+                if entry.is_dir():
+                    directories.add(entry.name)
+                elif entry.is_file():
+                    files.add(entry.name)
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return entries, files, directories
+
+
+def _site_signature(subdomain: str, cert_signature: Optional[List[int]]) -> List[Any]:
+    """Build the change signature of everything a site record is derived from."""
+    runtime_path = os.path.join(subdomain, ".runtime")
+    return [
+        path_signature(subdomain),
+        cert_signature,
+        path_signature(runtime_path),
+        path_signature(os.path.join(runtime_path, "Dockerfile")),
+        path_signature(os.path.join(subdomain, SETTINGS_FILE)),
+    ]
+
+
+def _scan_site(name: str, domain_name: str, subdomain: str, web_root: str, cert_files: Set[str]) -> Dict[str, Any]:
+    """Build the site record for a subdomain directory."""
+    _, files, directories = _list_directory(subdomain)
+    has_ssl = f"{name}.key" in cert_files and f"{name}.crt" in cert_files
+
+    return {
+        "name": name,
+        "domain": domain_name,
+        "slug": name.replace(".", "-"),
+        "web_root": web_root,
+        "use_ssl": has_ssl,
+        "runtime": detect_runtime(Path(subdomain), files=files, directories=directories),
+        "settings": load_site_settings(Path(subdomain), files=files),
+    }
+
 
-        # Check if SSL certificates exist in the web directory
-        ssl_cert_path = domain / ".cert"
-
-        for subdomain in domain.glob("*"):
-            if not subdomain.is_dir() or not domain_re.match(subdomain.name):
-                continue
-
-            has_ssl = (ssl_cert_path / f"{subdomain.name}.key").is_file() and (
-                ssl_cert_path / f"{subdomain.name}.crt"
-            ).is_file()
-
-            site = {
-                "name": subdomain.name,
-                "domain": domain.name,
-                "slug": subdomain.name.replace(".", "-"),
-                "web_root": subdomain.resolve().as_posix(),
-                "use_ssl": has_ssl,
-                "ip_suffix": ip_suffix,
-                "runtime": detect_runtime(subdomain),
+def _replicas(site: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Build the replica records of a site; their addresses are assigned by the IP allocator.
+
+    The first replica keeps the plain web-<slug> service name so that scaling a site up
+    or down leaves it in place.
+    """
+    count = site["settings"]["scaling"]["replicas"]
+    if count < 1:
+        logger.warning("Invalid replica count %d for %s, using 1", count, site["name"])
+        count = 1
+    replicas = []
+    for index in range(count):
+        suffix = f"-r{index + 1}" if index else ""
+        replicas.append(
+            {
+                "service": f"web-{site['slug']}{suffix}",
+                "container_name": f"site-{site['slug']}{suffix}",
             }
+        )
+    return replicas
+
+
+def _to_manifest(site: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a site record to its JSON serializable manifest form."""
+    stored = site.copy()
+    runtime = site["runtime"]
+    stored["runtime"] = dict(runtime, context=Path(runtime["context"]).as_posix())
+    if "build_contexts" in runtime:
+        stored["runtime"]["build_contexts"] = {
+            name: Path(path).as_posix() for name, path in runtime["build_contexts"].items()
+        }
+    return stored
+
+
+def _from_manifest(stored: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a manifest entry back to a site record."""
+    site = stored.copy()
+    runtime = stored["runtime"]
+    site["runtime"] = dict(runtime, context=Path(runtime["context"]))
+    if "build_contexts" in runtime:
+        site["runtime"]["build_contexts"] = {name: Path(path) for name, path in runtime["build_contexts"].items()}
+    return site
+
+
+def _discover_domain(
+    domain: str, domain_name: str, manifest: Optional[DiscoveryManifest]
+) -> Tuple[List[Dict[str, Any]], List[Any], Dict[str, Dict[str, Any]]]:
+    """Discover the sites of a single domain directory, reusing manifest entries when unchanged.
+
+    Returns:
+        The discovered sites, the domain signature and the manifest entries for the domain
+    """
+    domain_signature = [path_signature(domain)]
+    cert_path = os.path.join(domain, ".cert")
+    cert_signature = path_signature(cert_path)
+    cert_files: Optional[Set[str]] = None
+    real_domain = os.path.realpath(domain)
+
+    # The subdomain listing only changes when the domain directory itself changes
+    cached_domain = manifest.get_domain(domain) if manifest else None
+    if cached_domain and cached_domain["signature"] == domain_signature:
+        subdomains = [(os.path.basename(site_path), site_path, None) for site_path in cached_domain["sites"]]
+    else:
+        entries, _, _ = _list_directory(domain)
+        subdomains = sorted(
+            (entry.name, entry.path, entry.is_symlink())
+            for entry in entries
+            if entry.is_dir() and DOMAIN_RE.match(entry.name)
+        )
+
+    sites = []
+    stored_sites = {}
+    for name, subdomain, is_symlink in subdomains:
+        signature = _site_signature(subdomain, cert_signature)
+        if signature[0] is None:
+            # Removed since the domain listing was cached
+            continue
+        stored = manifest.get_site(domain, subdomain, signature) if manifest else None
+        if stored is not None:
+            site = _from_manifest(stored)
+        else:
+            if cert_files is None:
+                _, cert_files, _ = _list_directory(cert_path)
+            if is_symlink is None:
+                is_symlink = os.path.islink(subdomain)
+            web_root = os.path.realpath(subdomain) if is_symlink else os.path.join(real_domain, name)
+            with instrumentation.site_timer("discover", name):
+                site = _scan_site(name, domain_name, subdomain, web_root, cert_files)
+            stored = _to_manifest(site)
+        sites.append(site)
+        stored_sites[subdomain] = {"signature": signature, "site": stored}
+
+    return sites, domain_signature, stored_sites
+
+
+def _reuse_domain(cached: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Any], Dict[str, Dict[str, Any]]]:
+    """Take the sites of a domain from its manifest entry without checking its directories."""
+    stored_sites = cached["sites"]
+    sites = [_from_manifest(entry["site"]) for _, entry in sorted(stored_sites.items())]
+    return sites, cached["signature"], stored_sites
+
+
+def discover_sites(
+    web_path: Path,
+    verbose: bool = False,
+    manifest: Optional[DiscoveryManifest] = None,
+    workers: int = 1,
+    domains: Optional[Set[str]] = None,
+) -> List[Dict[str, Any]]:
+    """Discover sites from web directory structure.
+
+    Domains are scanned with os.scandir and, when workers is greater than one, fanned out
+    across a thread pool so that discovery on network mounted web roots is bound by I/O
+    concurrency rather than by round trips. Domains and subdomains are processed in name
+    order, so the result does not depend on the number of workers.
+
+    When a manifest is given, domains and sites whose directories did not change since the
+    previous run are taken from the manifest instead of being rescanned. The result is the
+    same as a full scan. When the names of the changed domains are known as well (from a
+    file watcher), the other domains are taken from the manifest without being checked.
+    """
+    entries, _, _ = _list_directory(web_path.as_posix())
+    domain_paths = sorted(
+        (entry.path, entry.name) for entry in entries if entry.is_dir() and DOMAIN_RE.match(entry.name)
+    )
+
+    def scan(domain: Tuple[str, str]) -> Tuple[List[Dict[str, Any]], List[Any], Dict[str, Dict[str, Any]]]:
+        cached = manifest.get_domain(domain[0]) if manifest and domains is not None else None
+        if cached and domain[1] not in domains:
+            return _reuse_domain(cached)
+        return _discover_domain(domain[0], domain[1], manifest)
+
+    if workers > 1 and len(domain_paths) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(scan, domain_paths))
+    else:
+        results = [scan(domain) for domain in domain_paths]
+
+    sites = []
+
+    for (domain, _), (domain_sites, domain_signature, stored_sites) in zip(domain_paths, results):
+        if manifest:
+            manifest.set_domain(domain, domain_signature, stored_sites)
+
+        for site in domain_sites:
+            site["replicas"] = _replicas(site)
             sites.append(site)
 
             if verbose:
-                ssl_status = "SSL" if has_ssl else "NoSSL"
-                logger.info("Found site: %s (%s) - %s", subdomain.name, domain.name, ssl_status)
+                ssl_status = "SSL" if site["use_ssl"] else "NoSSL"
+                logger.info("Found site: %s (%s) - %s", site["name"], site["domain"], ssl_status)
 
-            ip_suffix += 1
+    if manifest:
+        manifest.save()
 
     # Sort sites by name for consistent ordering
     sites.sort(key=lambda x: x["name"])
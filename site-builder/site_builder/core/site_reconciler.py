@@ -0,0 +1,305 @@
+"""Reconciliation of the nginx, database and container configuration with the discovered sites."""
+
+import json
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+
+from ..config_generator import ConfigGenerator
+from ..database import SQLExecutionError
+from ..docker import ContainerReconciler, DockerManager, ImageIndex
+from ..utils import instrumentation, write_if_changed
+from .discovery_manifest import DiscoveryManifest, path_signature
+from .ip_allocator import IPAllocator
+from .manager_factory import create_database_manager, create_nginx_manager
+from .site_discovery import discover_sites
+from .ssl_manager_factory import create_ssl_manager
+from .validation import get_ca_password
+
+logger = logging.getLogger("site-builder")
+
+
+class SiteReconciler:
+    """Brings the generated configuration and the running services in line with the sites on disk.
+
+    The managers, the discovery manifest, the address allocator and the image index are
+    created once and kept in memory, so repeated reconciliations (as done by the daemon)
+    only rescan the sites whose directories changed and only rewrite, reissue, rebuild or
+    restart what is affected. The certificate renewal flags only apply to the first run.
+    """
+
+    def __init__(self, args: Any):
+        """
+        Initialize the reconciler and set up the nginx and database services.
+
+        Args:
+            args: Parsed command line arguments
+
+        Raises:
+            ValueError: If the container network is invalid
+        """
+        self.args = args
+        self.runs = 0
+
+        # Container network, with the gateway, proxy and database addresses reserved
+        self.ip_allocator = IPAllocator(
+            args.network or f"{args.ip_prefix}.0/24",
+            first_host=args.ip_start,
+            state_file=args.state_path / "addresses.json",
+            grace_days=args.address_grace_days,
+        )
+
+        self.ssl_manager = create_ssl_manager(args, get_ca_password(args))
+        self.config_generator = ConfigGenerator(args.template_path)
+
+        # Template variables
+        root_ca_crt = args.root_ca_path / "perseus_ca.crt"
+        self.template_vars = {
+            "IP_PREFIX": args.ip_prefix,
+            "WEB_PATH": args.web_path.resolve().as_posix(),
+            "PROXY_SSL_PATH": args.root_ca_path.resolve().as_posix(),
+            "ROOT_CA_CRT": root_ca_crt.resolve().as_posix(),
+            "PROXY_CACHE_PATH": args.proxy_cache_path.as_posix(),
+            "PROXY_CACHE_KEYS_SIZE": "64m",
+            "PROXY_CACHE_MAX_SIZE": args.proxy_cache_size,
+            "DEPENDENCY_CACHE_PATH": args.dependency_cache_path.resolve().as_posix(),
+            "DB_MODE": args.database_mode,
+            "DB_ROOT_PASSWORD": args.database_root_password or "generated_password_placeholder",
+            "ENABLE_PROXY": True if args.nginx_mode == "docker" else False,
+            "ENABLE_DATABASE": True if args.database_mode == "docker" else False,
+            **self.ip_allocator.template_vars(),
+            # Operator overrides of the computed MariaDB tuning
+            **dict(args.db_tune),
+        }
+
+        # Initialize managers using factory functions
+        self.nginx_manager = create_nginx_manager(args, self.template_vars)
+        self.database_manager = create_database_manager(args, self.template_vars)
+
+        # Setup services (install if needed)
+        self.nginx_manager.setup()
+        if self.database_manager:
+            self.database_manager.setup()
+            # Update template vars with actual database password
+            self.template_vars["DB_ROOT_PASSWORD"] = self.database_manager.root_password
+
+        self.manifest = DiscoveryManifest(args.state_path / "discovery.json", full_rescan=args.full_rescan)
+        self.image_index = ImageIndex(args.state_path / "images.json")
+
+    def _save_certificate_signatures(self, sites: List[Dict[str, Any]]) -> str:
+        """Record the signatures of the public certificate files nginx serves for the sites.
+
+        Returns:
+            "added", "changed" or "unchanged", as reported by write_if_changed
+        """
+        signatures = {}
+        for site in sites:
+            if not site["use_ssl"]:
+                continue
+            cert_path = self.args.web_path / site["domain"] / ".cert"
+            signatures[site["name"]] = [
+                path_signature(cert_path / f"{site['name']}.crt"),
+                path_signature(cert_path / f"{site['name']}.key"),
+            ]
+        content = json.dumps(signatures, indent=2, sort_keys=True) + "\n"
+        self.args.state_path.mkdir(parents=True, exist_ok=True)
+        return write_if_changed(self.args.state_path / "certificates.json", content)
+
+    def _prune_certificates(self, sites: List[Dict[str, Any]]) -> None:
+        """Forget the inventoried certificates of sites that were removed."""
+        try:
+            self.ssl_manager.prune_certificates(sites)
+        except OSError as e:
+            logger.warning("Failed to prune the certificate inventory: %s", e)
+
+    def reconcile(self, domains: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """Discover the sites and bring every service in line with them.
+
+        Args:
+            domains: Names of the domains known to have changed. Only their sites are rescanned,
+                get their certificates checked and their nginx configuration rendered again; the
+                other sites are taken as they were. Everything is checked if None.
+
+        Returns:
+            The number of sites and the summary of each phase, or an "error" if the run was aborted
+        """
+        args = self.args
+        first_run = self.runs == 0
+        self.runs += 1
+        result: Dict[str, Any] = {}
+
+        # Discover sites
+        with instrumentation.phase("discover"):
+            sites = discover_sites(
+                args.web_path, args.verbose, manifest=self.manifest, workers=args.workers, domains=domains
+            )
+        result["sites"] = len(sites)
+        # Sites whose certificates and nginx configuration are checked in this run
+        affected = sites if domains is None else [site for site in sites if site["domain"] in domains]
+        if domains is not None:
+            result["affected_sites"] = len(affected)
+
+        self.template_vars["SITE_COUNT"] = len(sites)
+
+        with instrumentation.phase("allocate"):
+            try:
+                self.ip_allocator.allocate(sites)
+            except ValueError as e:
+                logger.error("Failed to allocate container addresses: %s", e)
+                result["error"] = f"Failed to allocate container addresses: {e}"
+                return result
+
+        if not sites:
+            logger.warning("No sites found to configure")
+            self._prune_certificates(sites)
+            # Stop serving the vhosts of the sites that were just deleted
+            if self.nginx_manager.cleanup_sites() > 0:
+                with instrumentation.phase("reload"):
+                    if not self.nginx_manager.is_running():
+                        self.nginx_manager.start()
+                    else:
+                        self.nginx_manager.reload()
+            return result
+
+        # Generate SSL certificates for all sites in parallel
+        with instrumentation.phase("certificates"):
+            certificate_results = self.ssl_manager.generate_certificates_bulk(
+                affected,
+                workers=args.workers,
+                renew_keys=args.renew_keys and first_run,
+                renew_csrs=args.renew_csrs and first_run,
+                renew_crts=args.renew_crts and first_run,
+                auto_renew_days=args.auto_renew_days,
+            )
+            self._prune_certificates(sites)
+        certificate_summary = Counter(certificate_results.values())
+        result["certificates"] = dict(certificate_summary)
+        logger.info(
+            "Certificates: %d issued, %d renewed, %d skipped, %d failed",
+            certificate_summary["issued"],
+            certificate_summary["renewed"],
+            certificate_summary["skipped"],
+            certificate_summary["failed"],
+        )
+        # Nginx only loads new certificate files on reload, whether issued here or replaced in a .cert directory
+        certificates_changed = bool(certificate_summary["issued"] or certificate_summary["renewed"])
+        try:
+            if self._save_certificate_signatures(sites) != "unchanged":
+                certificates_changed = True
+        except OSError as e:
+            logger.warning("Failed to record the site certificate signatures: %s", e)
+
+        # Generate site configurations, writing and enabling only what changed
+        if args.verbose:
+            for site in sites:
+                logger.info("Configuring site: %s (TLS: %s)", site["name"], site["use_ssl"])
+        with instrumentation.phase("nginx"):
+            nginx_summary = self.nginx_manager.sync_sites(
+                sites, self.config_generator, names=None if domains is None else {site["name"] for site in affected}
+            )
+            result["nginx"] = nginx_summary
+            logger.info(
+                "Nginx sites: %d added, %d changed, %d removed, %d unchanged",
+                nginx_summary["added"],
+                nginx_summary["changed"],
+                nginx_summary["removed"],
+                nginx_summary["unchanged"],
+            )
+            # Shared configuration such as the proxy cache zone, included before the sites
+            main_config_status = self.nginx_manager.generate_main_config(sites, self.config_generator)
+            nginx_changed = (
+                certificates_changed
+                or main_config_status != "unchanged"
+                or any(nginx_summary[key] for key in ("added", "changed", "removed"))
+            )
+
+        # Tag runtime images by the content of their build context
+        with instrumentation.phase("images"):
+            self.image_index.tag_sites(sites)
+
+        # Generate docker-compose.yaml
+        with instrumentation.phase("compose"):
+            docker_compose_config = self.config_generator.render_docker_compose(sites, self.template_vars)
+            try:
+                args.docker_compose_path.parent.mkdir(parents=True, exist_ok=True)
+                # Bind mount sources must exist before the containers start
+                args.proxy_cache_path.mkdir(parents=True, exist_ok=True)
+                for cache in ("pip", "npm"):
+                    (args.dependency_cache_path / cache).mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                logger.error(f"Failed to create directory for docker-compose file: {e}")
+                result["error"] = f"Failed to create directory for docker-compose file: {e}"
+                return result
+
+            try:
+                if write_if_changed(args.docker_compose_path, docker_compose_config) != "unchanged":
+                    logger.info("Updated docker-compose.yml with nginx service")
+            except Exception as e:
+                logger.error(f"Failed to write docker-compose file: {e}")
+                result["error"] = f"Failed to write docker-compose file: {e}"
+                return result
+
+        # Generate database configuration
+        with instrumentation.phase("database"):
+            database_manager = self.database_manager
+            if database_manager:
+                database_manager.generate_config(self.config_generator)
+
+            # Start services and reload configuration
+            if database_manager and not database_manager.is_running():
+                database_manager.start()
+
+            if database_manager and args.provision_databases:
+                try:
+                    provision_summary = Counter(database_manager.provision_sites(sites).values())
+                    result["databases"] = dict(provision_summary)
+                    logger.info(
+                        "Site databases: %d created, %d existing, %d failed",
+                        provision_summary["created"],
+                        provision_summary["existing"],
+                        provision_summary["failed"],
+                    )
+                except SQLExecutionError as e:
+                    logger.error("Failed to provision site databases: %s", e)
+
+        # Build and start only the site containers whose definition or build context changed
+        with instrumentation.phase("containers"):
+            if args.skip_containers:
+                logger.info("Skipping site containers")
+            elif not DockerManager()._has_docker_compose:
+                logger.warning("Docker Compose is not available, skipping site containers")
+            else:
+                reconciler = ContainerReconciler(
+                    args.docker_compose_path,
+                    args.state_path / "services.json",
+                    self.image_index,
+                    workers=args.build_workers,
+                )
+                container_results = reconciler.reconcile(sites, self.config_generator, self.template_vars)
+                container_summary = Counter(container_results.values())
+                result["containers"] = dict(container_summary)
+                logger.info(
+                    "Site containers: %d started, %d removed, %d unchanged, %d failed",
+                    container_summary["started"],
+                    container_summary["removed"],
+                    container_summary["unchanged"],
+                    container_summary["failed"],
+                )
+            self.image_index.save()
+
+        with instrumentation.phase("reload"):
+            if not self.nginx_manager.is_running():
+                self.nginx_manager.start()
+            elif nginx_changed:
+                self.nginx_manager.reload()
+            else:
+                logger.info("Nginx configuration unchanged, skipping reload")
+
+        # Log configuration summary
+        logger.info(
+            "Successfully configured %d sites using nginx:%s database:%s",
+            len(sites),
+            args.nginx_mode,
+            args.database_mode,
+        )
+        return result
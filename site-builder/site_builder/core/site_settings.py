@@ -0,0 +1,156 @@
+"""Per-site settings read from an optional .site.ini file in the site directory."""
+
+import configparser
+import copy
+import logging
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger("site-builder")
+
+SETTINGS_FILE = ".site.ini"
+
+# Every known section and option with its default value; values are converted to the type of their default
+DEFAULT_SETTINGS: Dict[str, Dict[str, Any]] = {
+    "upstream": {
+        # Idle keepalive connections kept open from the proxy to the site container (0 disables them)
+        "keepalive": 16,
+        "keepalive_requests": 1000,
+        "keepalive_timeout": "60s",
+        # Passive health checks: a replica is skipped for fail_timeout after max_fails failed requests
+        "max_fails": 3,
+        "fail_timeout": "10s",
+    },
+    "scaling": {
+        # Number of containers serving the site, balanced with least_conn
+        "replicas": 1,
+        # CPU and memory limits of each container, e.g. 1.5 and 512m (empty for none); PHP runtimes size
+        # their worker pool to these limits
+        "cpus": "",
+        "memory": "",
+    },
+    "app": {
+        # Reach the app server inside the container over a unix socket in a shared tmpfs instead of
+        # loopback TCP; Node.js apps opt in by listening on NODE_SOCKET
+        "socket": True,
+        # Python and Node.js worker processes (0 for one per CPU of the container's quota), recycled
+        # gracefully after max_requests requests or past max_memory MiB of resident memory (0 for never)
+        "workers": 0,
+        "max_requests": 0,
+        "max_memory": 0,
+    },
+    "cache": {
+        # Micro-cache responses in the proxy for valid, serving cached pages to anonymous visitors
+        "enabled": False,
+        "valid": "1m",
+        # Let a single request per key refresh the cache while the others wait or get the stale copy
+        "lock": True,
+        "lock_timeout": "5s",
+        "use_stale": True,
+        # Requests with an Authorization header always bypass the cache, and with a Cookie header unless disabled
+        "bypass_cookies": True,
+    },
+    "php": {
+        # PHP-FPM process manager: static, dynamic or ondemand
+        "pm": "dynamic",
+        # Expected memory of one worker in MiB, used to fit the pool into the container memory
+        "memory_per_worker": 64,
+        # Fixed number of workers (0 sizes the pool from the container CPU and memory limits)
+        "max_children": 0,
+        # Pool status and ping endpoints, reachable from the proxy only
+        "status_path": "/fpm-status",
+        "ping_path": "/fpm-ping",
+        # production checks cached scripts for changes every revalidate_freq seconds, development on every request
+        "mode": "production",
+        # Seconds between checks in production, or -1 to never check (reset with "site-builder opcache reset")
+        "revalidate_freq": 2,
+        # OPcache memory in MiB and number of cached scripts
+        "opcache_memory": 128,
+        "opcache_max_files": 20000,
+        # JIT mode: off, tracing or function
+        "jit": "off",
+        # Script run when PHP-FPM starts to preload classes, relative to the web root (empty for none)
+        "preload": "",
+    },
+    "static": {
+        # Serve static files straight from the web root in the proxy: on, off, or auto (on for PHP runtimes,
+        # whose web root holds only public files)
+        "enabled": "auto",
+        "extensions": "css js mjs map txt xml ico png jpg jpeg gif svg webp avif woff woff2 ttf otf eot mp4 webm pdf",
+        # Directory below the web root served entirely from disk, e.g. assets (empty for none)
+        "directory": "",
+        "expires": "30d",
+    },
+}
+
+# An nginx time such as 500ms, 30s or 1h30m
+NGINX_TIME = r"(\d+(ms|s|m|h|d|w|M|y)?)+"
+
+# Patterns a string option must fully match, as it is rendered as is into the shared proxy configuration
+OPTION_PATTERNS: Dict[Tuple[str, str], str] = {
+    ("upstream", "keepalive_timeout"): NGINX_TIME,
+    ("upstream", "fail_timeout"): NGINX_TIME,
+    ("cache", "valid"): NGINX_TIME,
+    ("cache", "lock_timeout"): NGINX_TIME,
+    ("static", "expires"): rf"-?{NGINX_TIME}|off|epoch|max",
+    ("php", "status_path"): r"/[\w./-]+",
+    ("php", "ping_path"): r"/[\w./-]+",
+    ("static", "extensions"): r"\w+(\s+\w+)*",
+    ("static", "directory"): r"/?([\w.-]+(/[\w.-]+)*/?)?",
+}
+
+
+def _convert(parser: configparser.ConfigParser, section: str, option: str, default: Any) -> Any:
+    """Read an option converted to the type of its default value, checking strings against their pattern."""
+    if isinstance(default, bool):
+        return parser.getboolean(section, option)
+    if isinstance(default, int):
+        return parser.getint(section, option)
+    if isinstance(default, float):
+        return parser.getfloat(section, option)
+    value = parser.get(section, option).strip()
+    pattern = OPTION_PATTERNS.get((section, option))
+    if pattern and not re.fullmatch(pattern, value):
+        raise ValueError(f"{value!r} does not match {pattern}")
+    return value
+
+
+def load_site_settings(subdomain_path: Path, files: Optional[Set[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Load the settings of a site, filling in defaults for everything the file does not set.
+
+    Unknown sections and options, values that cannot be converted and strings that do not
+    match the pattern of their option are ignored with a warning, so that a typo never breaks
+    the configuration of the other sites.
+
+    Args:
+        subdomain_path: Path to the subdomain directory
+        files: Names of the regular files in the subdomain directory, if already listed
+    """
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    settings_path = subdomain_path / SETTINGS_FILE
+    if files is not None and SETTINGS_FILE not in files:
+        return settings
+
+    parser = configparser.ConfigParser()
+    try:
+        if not parser.read(settings_path):
+            return settings
+    except configparser.Error as e:
+        logger.warning("Ignoring unreadable settings file %s: %s", settings_path, e)
+        return settings
+
+    for section in parser.sections():
+        if section not in settings:
+            logger.warning("Ignoring unknown section [%s] in %s", section, settings_path)
+            continue
+        for option in parser.options(section):
+            if option not in settings[section]:
+                logger.warning("Ignoring unknown option %s in [%s] of %s", option, section, settings_path)
+                continue
+            try:
+                settings[section][option] = _convert(parser, section, option, DEFAULT_SETTINGS[section][option])
+            except ValueError as e:
+                logger.warning("Ignoring invalid %s in [%s] of %s: %s", option, section, settings_path, e)
+
+    return settings
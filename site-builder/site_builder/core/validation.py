@@ -24,6 +24,13 @@ def validate_paths(args: Any) -> None:
             logger.error("Failed to create Web path: %s", err)
             sys.exit(1)
 
+    if not args.state_path.exists():
+        try:
+            args.state_path.mkdir(parents=True, exist_ok=True)
+        except Exception as err:
+            logger.error("Failed to create State path: %s", err)
+            sys.exit(1)
+
     if not args.template_path.exists():
         try:
             args.template_path.mkdir(parents=True, exist_ok=True)
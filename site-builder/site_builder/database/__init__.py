@@ -1,7 +1,23 @@
 """Database service management modules."""
 
+from .backup import backup_databases, stream_dump, stream_restore
 from .database_manager import DatabaseManager
 from .mariadb_docker import MariaDBDockerManager
 from .mariadb_native import MariaDBNativeManager
+from .mariadb_tuning import TUNING_VARIABLES, resolve_tuning, tuned_template_vars
+from .sql_executor import SQLExecutionError, SQLExecutor, create_sql_executor
 
-__all__ = ["DatabaseManager", "MariaDBDockerManager", "MariaDBNativeManager"]
+__all__ = [
+    "DatabaseManager",
+    "MariaDBDockerManager",
+    "MariaDBNativeManager",
+    "SQLExecutionError",
+    "SQLExecutor",
+    "TUNING_VARIABLES",
+    "backup_databases",
+    "create_sql_executor",
+    "resolve_tuning",
+    "stream_dump",
+    "stream_restore",
+    "tuned_template_vars",
+]
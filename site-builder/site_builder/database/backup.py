@@ -0,0 +1,223 @@
+"""Streaming compressed database backups and restores."""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional
+
+from ..utils import atomic_write, instrumentation
+from .database_manager import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 20
+
+# Databases that belong to the server itself and are never backed up by default
+SYSTEM_DATABASES = {"information_schema", "mysql", "performance_schema", "sys"}
+
+COMPRESSION_SUFFIXES = {"zstd": ".sql.zst", "gzip": ".sql.gz", "none": ".sql"}
+
+DUMP_OPTIONS = ["--single-transaction", "--quick", "--routines", "--triggers"]
+
+
+def default_compression() -> str:
+    """Get the best available compression: zstd when its binary is installed, gzip otherwise."""
+    return "zstd" if shutil.which("zstd") else "gzip"
+
+
+def compression_for(backup_path: Path) -> str:
+    """Get the compression of a backup file from its suffix."""
+    if backup_path.suffix == ".zst":
+        return "zstd"
+    if backup_path.suffix == ".gz":
+        return "gzip"
+    return "none"
+
+
+class _HashingWriter:
+    """File wrapper that tracks the size and SHA-256 digest of everything written to it."""
+
+    def __init__(self, fp: IO[bytes]):
+        self.fp = fp
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.digest.update(data)
+        self.size += len(data)
+        return self.fp.write(data)
+
+    def flush(self) -> None:
+        self.fp.flush()
+
+
+def _check(process: subprocess.Popen, stderr: IO[bytes]) -> None:
+    """Wait for a pipeline process and raise CalledProcessError if it failed."""
+    returncode = process.wait()
+    if returncode != 0:
+        stderr.seek(0)
+        raise subprocess.CalledProcessError(returncode, process.args, stderr=stderr.read().decode(errors="replace"))
+
+
+def stream_dump(manager: DatabaseManager, database_name: str, backup_path: Path) -> Dict[str, Any]:
+    """Stream a mysqldump of a database into a file, compressing it on the fly.
+
+    The dump is never held in memory: mysqldump output goes through zstd (as a pipe
+    between the two processes) or gzip (in chunks) straight into a temporary file that
+    replaces the backup file once complete. The compression follows the file suffix.
+
+    Returns:
+        The backup file name, compressed size, SHA-256 checksum and duration in seconds
+
+    Raises:
+        subprocess.CalledProcessError: If mysqldump or the compressor fails
+    """
+    compression = compression_for(backup_path)
+    backup_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = backup_path.with_name(f".{backup_path.name}.tmp")
+    cmd = manager._client_command("mysqldump") + DUMP_OPTIONS + [database_name]
+    started = time.monotonic()
+
+    try:
+        with tempfile.TemporaryFile() as dump_stderr, tmp_path.open("wb") as fp:
+            writer = _HashingWriter(fp)
+            dump = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=dump_stderr)
+            if compression == "zstd":
+                compressor = subprocess.Popen(
+                    ["zstd", "-q", "-c", "-T0"], stdin=dump.stdout, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+                )
+                dump.stdout.close()
+                for chunk in iter(lambda: compressor.stdout.read(CHUNK_SIZE), b""):
+                    writer.write(chunk)
+                if compressor.wait() != 0:
+                    dump.kill()
+                    raise subprocess.CalledProcessError(compressor.returncode, compressor.args)
+            elif compression == "gzip":
+                with gzip.GzipFile(fileobj=writer, mode="wb", compresslevel=6) as gz:
+                    shutil.copyfileobj(dump.stdout, gz, CHUNK_SIZE)
+                dump.stdout.close()
+            else:
+                shutil.copyfileobj(dump.stdout, writer, CHUNK_SIZE)
+                dump.stdout.close()
+            _check(dump, dump_stderr)
+        os.replace(tmp_path, backup_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    duration = time.monotonic() - started
+    logger.info("Backed up database %s to %s (%d bytes, %.1fs)", database_name, backup_path, writer.size, duration)
+    return {
+        "file": backup_path.name,
+        "compression": compression,
+        "size": writer.size,
+        "sha256": writer.digest.hexdigest(),
+        "duration": round(duration, 3),
+    }
+
+
+def stream_restore(manager: DatabaseManager, database_name: str, backup_path: Path) -> None:
+    """Stream a backup file, decompressing it on the fly, into the mysql client.
+
+    Raises:
+        FileNotFoundError: If the backup file does not exist
+        subprocess.CalledProcessError: If mysql or the decompressor fails
+    """
+    if not backup_path.exists():
+        raise FileNotFoundError(f"Backup file not found: {backup_path}")
+
+    compression = compression_for(backup_path)
+    cmd = manager._client_command("mysql") + [database_name]
+
+    with tempfile.TemporaryFile() as restore_stderr:
+        if compression == "zstd":
+            decompressor = subprocess.Popen(
+                ["zstd", "-q", "-d", "-c", str(backup_path)], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+            restore = subprocess.Popen(cmd, stdin=decompressor.stdout, stderr=restore_stderr)
+            decompressor.stdout.close()
+            if decompressor.wait() != 0:
+                restore.kill()
+                raise subprocess.CalledProcessError(decompressor.returncode, decompressor.args)
+        elif compression == "gzip":
+            restore = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=restore_stderr)
+            try:
+                with gzip.open(backup_path, "rb") as gz:
+                    shutil.copyfileobj(gz, restore.stdin, CHUNK_SIZE)
+            finally:
+                restore.stdin.close()
+        else:
+            with backup_path.open("rb") as fp:
+                restore = subprocess.Popen(cmd, stdin=fp, stderr=restore_stderr)
+                restore.wait()
+        _check(restore, restore_stderr)
+
+    logger.info("Restored database %s from %s", database_name, backup_path)
+
+
+def list_databases(manager: DatabaseManager) -> List[str]:
+    """List the user databases of the server, leaving out the system schemas."""
+    result = instrumentation.run(
+        manager._client_command("mysql") + ["-N", "-B", "-e", "SHOW DATABASES"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return sorted(name for name in result.stdout.split() if name not in SYSTEM_DATABASES)
+
+
+def backup_databases(
+    manager: DatabaseManager,
+    backup_dir: Path,
+    databases: Optional[List[str]] = None,
+    workers: int = 4,
+    compression: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Back up several databases concurrently and write a manifest.json next to the dumps.
+
+    Args:
+        manager: Database manager providing the client commands
+        backup_dir: Directory receiving the dumps and the manifest
+        databases: Databases to back up (default: all user databases)
+        workers: Number of databases dumped in parallel
+        compression: "zstd", "gzip" or "none" (default: zstd when available, gzip otherwise)
+
+    Returns:
+        The manifest, with one entry per database; failed dumps carry an "error" instead of a checksum
+    """
+    compression = compression or default_compression()
+    if databases is None:
+        databases = list_databases(manager)
+
+    def backup(database_name: str) -> Dict[str, Any]:
+        backup_path = backup_dir / f"{database_name}{COMPRESSION_SUFFIXES[compression]}"
+        try:
+            return stream_dump(manager, database_name, backup_path)
+        except (subprocess.CalledProcessError, OSError) as e:
+            message = str(getattr(e, "stderr", None) or e).strip()
+            logger.error("Failed to backup database %s: %s", database_name, message)
+            return {"file": backup_path.name, "compression": compression, "error": message}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        entries = dict(zip(databases, executor.map(backup, databases)))
+
+    manifest = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "compression": compression,
+        "databases": entries,
+    }
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write(backup_dir / "manifest.json", json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
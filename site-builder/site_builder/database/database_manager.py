@@ -1,16 +1,31 @@
 """Abstract base class for database management."""
 
+import json
 import logging
+import re
 from abc import ABC, abstractmethod
+from functools import cached_property
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+
+from ..utils import atomic_write, content_hash
+from .sql_executor import SQLExecutionError, SQLExecutor, create_sql_executor, quote_identifier, quote_string
 
 logger = logging.getLogger(__name__)
 
+# MariaDB limits database names to 64 characters and user names to 80
+MAX_NAME_LENGTH = 64
+
+# Length of the slug hash suffix keeping truncated database names unique
+NAME_HASH_LENGTH = 8
+
 
 class DatabaseManager(ABC):
     """Abstract base class for database service management."""
 
+    # Host part of the accounts created for sites
+    user_host = "localhost"
+
     def __init__(self, config_path: Path, template_vars: Dict[str, Any]):
         """
         Initialize Database manager.
@@ -23,6 +38,115 @@ class DatabaseManager(ABC):
         self.template_vars = template_vars
         self.config_path.mkdir(parents=True, exist_ok=True)
 
+    @cached_property
+    def sql_executor(self) -> SQLExecutor:
+        """Executor used for DDL and account statements, reused for the lifetime of the manager."""
+        return create_sql_executor(self.get_connection_info(), self._client_command("mysql"))
+
+    @abstractmethod
+    def _client_command(self, program: str) -> List[str]:
+        """Get the command line running a MariaDB client program (mysql, mysqldump, ...) as root."""
+        pass
+
+    def _create_database_sql(self, database_name: str) -> str:
+        return (
+            f"CREATE DATABASE IF NOT EXISTS {quote_identifier(database_name)} "
+            f"CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+        )
+
+    def _create_user_sql(self, username: str, password: str) -> List[str]:
+        # CREATE USER IF NOT EXISTS keeps the password of an existing account, so it is always set afterwards
+        account = f"{quote_string(username)}@{quote_string(self.user_host)}"
+        return [
+            f"CREATE USER IF NOT EXISTS {account}",
+            f"ALTER USER {account} IDENTIFIED BY {quote_string(password)}",
+        ]
+
+    def _grant_sql(self, username: str, database_name: str, privileges: str = "ALL") -> str:
+        return (
+            f"GRANT {privileges} PRIVILEGES ON {quote_identifier(database_name)}.* "
+            f"TO {quote_string(username)}@{quote_string(self.user_host)}"
+        )
+
+    @staticmethod
+    def site_database_name(site: Dict[str, Any]) -> str:
+        """Get the database (and user) name of a site.
+
+        Names too long for MariaDB are truncated and end with a hash of the slug, so two
+        sites sharing a long prefix still get distinct databases.
+        """
+        name = re.sub(r"[^a-z0-9_]", "_", site["slug"].lower())
+        if len(name) <= MAX_NAME_LENGTH:
+            return name
+        return f"{name[:MAX_NAME_LENGTH - NAME_HASH_LENGTH - 1]}_{content_hash(site['slug'])[:NAME_HASH_LENGTH]}"
+
+    def _save_credentials(self, credentials_file: Path, credentials: Dict[str, Dict[str, Any]]) -> None:
+        """Write the site credentials atomically, readable by the owner only."""
+        atomic_write(credentials_file, json.dumps(credentials, indent=2, sort_keys=True), mode=0o600)
+
+    def provision_sites(self, sites: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Create a database and a user with full access to it for every site that has none yet.
+
+        Generated credentials are stored in site_credentials.json in the configuration path,
+        readable by the owner only, before any statement runs: DDL commits implicitly, so a
+        failure must not lose passwords already set on the server. Each site is provisioned
+        in its own batch and marked as provisioned once it succeeded; a site that failed is
+        retried with its stored password on the next run.
+
+        Returns:
+            A mapping of site name to "created", "existing" or "failed"
+        """
+        credentials_file = self.config_path / "site_credentials.json"
+        credentials: Dict[str, Dict[str, Any]] = {}
+        if credentials_file.is_file():
+            with credentials_file.open("r") as fp:
+                credentials = json.load(fp)
+
+        results = {}
+        pending = []
+        for site in sites:
+            entry = credentials.get(site["name"])
+            if entry is not None and entry.get("provisioned", True):
+                results[site["name"]] = "existing"
+                continue
+            if entry is None:
+                name = self.site_database_name(site)
+                entry = {"database": name, "username": name, "password": self._generate_password()}
+                credentials[site["name"]] = entry
+            entry["provisioned"] = False
+            pending.append(site["name"])
+
+        if not pending:
+            return results
+        self._save_credentials(credentials_file, credentials)
+
+        for site_name in pending:
+            entry = credentials[site_name]
+            try:
+                self.sql_executor.execute(
+                    [
+                        self._create_database_sql(entry["database"]),
+                        *self._create_user_sql(entry["username"], entry["password"]),
+                        self._grant_sql(entry["username"], entry["database"]),
+                    ]
+                )
+            except SQLExecutionError as e:
+                logger.error("Failed to provision the database of %s: %s", site_name, e)
+                results[site_name] = "failed"
+                continue
+            entry["provisioned"] = True
+            results[site_name] = "created"
+
+        self._save_credentials(credentials_file, credentials)
+        created = sum(1 for site_name in pending if results[site_name] == "created")
+        logger.info("Provisioned databases for %d of %d sites", created, len(pending))
+        return results
+
+    @abstractmethod
+    def _generate_password(self, length: int = 16) -> str:
+        """Generate a secure random password."""
+        pass
+
     @abstractmethod
     def setup(self) -> None:
         """Set up database service (install if needed, configure directories, etc.)."""
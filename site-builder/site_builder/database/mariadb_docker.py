@@ -4,12 +4,17 @@ import logging
 import secrets
 import string
 import subprocess
+from functools import cached_property
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from ..config_generator import ConfigGenerator
-from ..docker import DockerManager
+from ..docker import DockerClient, DockerManager, compose_project_name, get_docker_client
+from ..utils import instrumentation, write_if_changed
+from .backup import stream_dump, stream_restore
 from .database_manager import DatabaseManager
+from .mariadb_tuning import tuned_template_vars
+from .sql_executor import SQLExecutionError
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +22,9 @@ logger = logging.getLogger(__name__)
 class MariaDBDockerManager(DatabaseManager):
     """MariaDB service management using Docker containers."""
 
+    # Site containers connect from the docker network
+    user_host = "%"
+
     def __init__(
         self,
         config_path: Path,
@@ -35,7 +43,7 @@ class MariaDBDockerManager(DatabaseManager):
         """
         super().__init__(config_path, template_vars)
         self.docker_compose_path = docker_compose_path
-        self.root_password = root_password or self._generate_password()
+        self.root_password = root_password or self._load_root_password() or self._generate_password()
         self.config_file = config_path / "my.cnf"
         self.data_path = config_path / "data"
         self.logs_path = config_path / "logs"
@@ -52,6 +60,13 @@ class MariaDBDockerManager(DatabaseManager):
         alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
         return "".join(secrets.choice(alphabet) for _ in range(length))
 
+    def _load_root_password(self) -> Optional[str]:
+        """Load the root password stored by a previous run, if any."""
+        password_file = self.config_path / "root_password.txt"
+        if password_file.is_file():
+            return password_file.read_text().strip() or None
+        return None
+
     def _store_root_password(self) -> None:
         """Store the root password in a secure file."""
         password_file = self.config_path / "root_password.txt"
@@ -60,6 +75,28 @@ class MariaDBDockerManager(DatabaseManager):
                 f.write(self.root_password)
             password_file.chmod(0o600)  # Read/write for owner only
 
+    @cached_property
+    def docker_client(self) -> DockerClient:
+        """Docker Engine API client shared with the other managers."""
+        return get_docker_client()
+
+    def _container_id(self) -> Optional[str]:
+        """Get the ID of the running MariaDB container through the Docker API."""
+        return self.docker_client.find_compose_container(compose_project_name(self.docker_compose_path), "mariadb")
+
+    def _client_command(self, program: str) -> List[str]:
+        """Get the command line running a MariaDB client program as root inside the MariaDB container.
+
+        The container is addressed directly with docker exec when it can be found through the
+        Docker API, which avoids the docker compose start-up cost.
+        """
+        container_id = self._container_id() if self.docker_client.available else None
+        if container_id is None:
+            exec_cmd = ["docker", "compose", "-f", str(self.docker_compose_path), "exec", "-T", "mariadb"]
+        else:
+            exec_cmd = ["docker", "exec", "-i", container_id]
+        return exec_cmd + [program, "-uroot", f"-p{self.root_password}"]
+
     def _is_docker_installed(self) -> bool:
         """Check if Docker is installed on the system."""
         docker_manager = DockerManager()
@@ -81,7 +118,7 @@ class MariaDBDockerManager(DatabaseManager):
     def start(self) -> None:
         """Start the MariaDB Docker service."""
         try:
-            subprocess.run(
+            instrumentation.run(
                 ["docker", "compose", "-f", str(self.docker_compose_path), "up", "-d", "mariadb"],
                 check=True,
                 cwd=self.docker_compose_path.parent,
@@ -94,7 +131,7 @@ class MariaDBDockerManager(DatabaseManager):
     def stop(self) -> None:
         """Stop the MariaDB Docker service."""
         try:
-            subprocess.run(
+            instrumentation.run(
                 ["docker", "compose", "-f", str(self.docker_compose_path), "stop", "mariadb"],
                 check=True,
                 cwd=self.docker_compose_path.parent,
@@ -107,7 +144,7 @@ class MariaDBDockerManager(DatabaseManager):
     def restart(self) -> None:
         """Restart the MariaDB Docker service."""
         try:
-            subprocess.run(
+            instrumentation.run(
                 ["docker", "compose", "-f", str(self.docker_compose_path), "restart", "mariadb"],
                 check=True,
                 cwd=self.docker_compose_path.parent,
@@ -119,8 +156,11 @@ class MariaDBDockerManager(DatabaseManager):
 
     def is_running(self) -> bool:
         """Check if MariaDB Docker service is running."""
+        if self.docker_client.available:
+            return self._container_id() is not None
+
         try:
-            result = subprocess.run(
+            result = instrumentation.run(
                 ["docker", "compose", "-f", str(self.docker_compose_path), "ps", "-q", "mariadb"],
                 capture_output=True,
                 text=True,
@@ -134,110 +174,47 @@ class MariaDBDockerManager(DatabaseManager):
     def create_database(self, database_name: str) -> None:
         """Create a new database."""
         try:
-            cmd = [
-                "docker",
-                "compose",
-                "-f",
-                str(self.docker_compose_path),
-                "exec",
-                "-T",
-                "mariadb",
-                "mysql",
-                "-uroot",
-                f"-p{self.root_password}",
-                "-e",
-                f"CREATE DATABASE IF NOT EXISTS `{database_name}` "
-                f"CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;",
-            ]
-            subprocess.run(cmd, check=True, cwd=self.docker_compose_path.parent)
+            self.sql_executor.execute([self._create_database_sql(database_name)])
             logger.info("Created database: %s", database_name)
-        except subprocess.CalledProcessError as e:
+        except SQLExecutionError as e:
             logger.error("Failed to create database %s: %s", database_name, e)
             raise
 
     def create_user(self, username: str, password: str, database_name: Optional[str] = None) -> None:
         """Create a new database user with optional database access."""
         try:
-            # Create user
-            cmd = [
-                "docker",
-                "compose",
-                "-f",
-                str(self.docker_compose_path),
-                "exec",
-                "-T",
-                "mariadb",
-                "mysql",
-                "-uroot",
-                f"-p{self.root_password}",
-                "-e",
-                f"CREATE USER IF NOT EXISTS '{username}'@'%' IDENTIFIED BY '{password}';",
-            ]
-            subprocess.run(cmd, check=True, cwd=self.docker_compose_path.parent)
-
-            # Grant privileges if database specified
+            statements = self._create_user_sql(username, password)
+            # Grant privileges in the same batch if database specified
             if database_name:
-                self.grant_privileges(username, database_name)
-
+                statements.append(self._grant_sql(username, database_name))
+            self.sql_executor.execute(statements)
             logger.info("Created user: %s", username)
-        except subprocess.CalledProcessError as e:
+        except SQLExecutionError as e:
             logger.error("Failed to create user %s: %s", username, e)
             raise
 
     def grant_privileges(self, username: str, database_name: str, privileges: str = "ALL") -> None:
-        """Grant privileges to a user on a database."""
+        """Grant privileges to a user on a database.
+
+        GRANT updates the in-memory privilege tables, so no FLUSH PRIVILEGES is needed.
+        """
         try:
-            cmd = [
-                "docker",
-                "compose",
-                "-f",
-                str(self.docker_compose_path),
-                "exec",
-                "-T",
-                "mariadb",
-                "mysql",
-                "-uroot",
-                f"-p{self.root_password}",
-                "-e",
-                f"GRANT {privileges} PRIVILEGES ON `{database_name}`.* TO '{username}'@'%'; FLUSH PRIVILEGES;",
-            ]
-            subprocess.run(cmd, check=True, cwd=self.docker_compose_path.parent)
+            self.sql_executor.execute([self._grant_sql(username, database_name, privileges)])
             logger.info("Granted %s privileges on %s to %s", privileges, database_name, username)
-        except subprocess.CalledProcessError as e:
+        except SQLExecutionError as e:
             logger.error("Failed to grant privileges: %s", e)
             raise
 
     def backup_database(self, database_name: str, backup_path: Path) -> None:
-        """Backup a database to a file."""
+        """Backup a database to a file, compressed according to its suffix (.zst, .gz or plain)."""
         try:
-            backup_path.parent.mkdir(parents=True, exist_ok=True)
-            cmd = [
-                "docker",
-                "compose",
-                "-f",
-                str(self.docker_compose_path),
-                "exec",
-                "-T",
-                "mariadb",
-                "mysqldump",
-                "-uroot",
-                f"-p{self.root_password}",
-                "--single-transaction",
-                "--routines",
-                "--triggers",
-                database_name,
-            ]
-
-            with backup_path.open("w") as f:
-                subprocess.run(cmd, stdout=f, check=True, cwd=self.docker_compose_path.parent)
-
-            logger.info("Backed up database %s to %s", database_name, backup_path)
+            stream_dump(self, database_name, backup_path)
         except subprocess.CalledProcessError as e:
-            logger.error("Failed to backup database %s: %s", database_name, e)
+            logger.error("Failed to backup database %s: %s", database_name, e.stderr or e)
             raise
 
     def restore_database(self, database_name: str, backup_path: Path) -> None:
-        """Restore a database from a backup file."""
+        """Restore a database from a backup file, decompressing it according to its suffix."""
         try:
             if not backup_path.exists():
                 raise FileNotFoundError(f"Backup file not found: {backup_path}")
@@ -245,34 +222,16 @@ class MariaDBDockerManager(DatabaseManager):
             # Create database if it doesn't exist
             self.create_database(database_name)
 
-            cmd = [
-                "docker",
-                "compose",
-                "-f",
-                str(self.docker_compose_path),
-                "exec",
-                "-T",
-                "mariadb",
-                "mysql",
-                "-uroot",
-                f"-p{self.root_password}",
-                database_name,
-            ]
-
-            with backup_path.open("r") as f:
-                subprocess.run(cmd, stdin=f, check=True, cwd=self.docker_compose_path.parent)
-
-            logger.info("Restored database %s from %s", database_name, backup_path)
+            stream_restore(self, database_name, backup_path)
         except subprocess.CalledProcessError as e:
-            logger.error("Failed to restore database %s: %s", database_name, e)
+            logger.error("Failed to restore database %s: %s", database_name, e.stderr or e)
             raise
 
     def generate_config(self, config_generator: ConfigGenerator) -> None:
-        """Generate MariaDB configuration files."""
-        config_content = config_generator.render_mariadb_config(self.template_vars)
-        with self.config_file.open("w") as fp:
-            fp.write(config_content)
-        logger.info("Generated MariaDB configuration at %s", self.config_file)
+        """Generate MariaDB configuration files, tuned for the host unless overridden by DB_* variables."""
+        config_content = config_generator.render_mariadb_config(tuned_template_vars(self.template_vars, self.data_path))
+        if write_if_changed(self.config_file, config_content) != "unchanged":
+            logger.info("Generated MariaDB configuration at %s", self.config_file)
 
     def get_connection_info(self) -> Dict[str, Any]:
         """Get database connection information."""
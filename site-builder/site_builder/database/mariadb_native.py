@@ -6,11 +6,15 @@ import shutil
 import string
 import subprocess
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from ..config_generator import ConfigGenerator
 from ..pkgs import PKGsManager
+from ..utils import instrumentation, write_if_changed
+from .backup import stream_dump, stream_restore
 from .database_manager import DatabaseManager
+from .mariadb_tuning import tuned_template_vars
+from .sql_executor import SQLExecutionError
 
 logger = logging.getLogger(__name__)
 
@@ -36,9 +40,10 @@ class MariaDBNativeManager(DatabaseManager):
         """
         super().__init__(config_path, template_vars)
         self.mysql_config_path = mysql_config_path
-        self.root_password = root_password or self._generate_password()
+        self.root_password = root_password or self._load_root_password() or self._generate_password()
         self.config_file = mysql_config_path / "my.cnf"
         self.debian_config = mysql_config_path / "debian.cnf"
+        self.data_path = Path("/var/lib/mysql")
 
         # Create mysql configuration directory
         self.mysql_config_path.mkdir(parents=True, exist_ok=True)
@@ -51,6 +56,13 @@ class MariaDBNativeManager(DatabaseManager):
         alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
         return "".join(secrets.choice(alphabet) for _ in range(length))
 
+    def _load_root_password(self) -> Optional[str]:
+        """Load the root password stored by a previous run, if any."""
+        password_file = self.config_path / "db_root_password.txt"
+        if password_file.is_file():
+            return password_file.read_text().strip() or None
+        return None
+
     def _store_root_password(self) -> None:
         """Store the root password in a secure file."""
         password_file = self.config_path / "db_root_password.txt"
@@ -71,8 +83,8 @@ class MariaDBNativeManager(DatabaseManager):
 
         # Enable and start service
         try:
-            subprocess.run(["systemctl", "enable", "mariadb"], check=True)
-            subprocess.run(["systemctl", "start", "mariadb"], check=True)
+            instrumentation.run(["systemctl", "enable", "mariadb"], check=True)
+            instrumentation.run(["systemctl", "start", "mariadb"], check=True)
         except subprocess.CalledProcessError:
             logger.warning("Could not enable MariaDB service via systemctl")
 
@@ -95,7 +107,7 @@ class MariaDBNativeManager(DatabaseManager):
             ]
 
             for command in commands:
-                subprocess.run(["mysql", "-e", command], check=True)
+                instrumentation.run(["mysql", "-e", command], check=True)
 
             logger.info("MariaDB secured successfully")
         except subprocess.CalledProcessError as e:
@@ -116,12 +128,12 @@ class MariaDBNativeManager(DatabaseManager):
         """Start the native MariaDB service."""
         try:
             # Try systemctl first
-            subprocess.run(["systemctl", "start", "mariadb"], check=True)
+            instrumentation.run(["systemctl", "start", "mariadb"], check=True)
             logger.info("MariaDB service started via systemctl")
         except subprocess.CalledProcessError:
             try:
                 # Fallback to service command
-                subprocess.run(["service", "mysql", "start"], check=True)
+                instrumentation.run(["service", "mysql", "start"], check=True)
                 logger.info("MariaDB service started via service command")
             except subprocess.CalledProcessError as e:
                 logger.error("Failed to start MariaDB service: %s", e)
@@ -131,12 +143,12 @@ class MariaDBNativeManager(DatabaseManager):
         """Stop the native MariaDB service."""
         try:
             # Try systemctl first
-            subprocess.run(["systemctl", "stop", "mariadb"], check=True)
+            instrumentation.run(["systemctl", "stop", "mariadb"], check=True)
             logger.info("MariaDB service stopped via systemctl")
         except subprocess.CalledProcessError:
             try:
                 # Fallback to service command
-                subprocess.run(["service", "mysql", "stop"], check=True)
+                instrumentation.run(["service", "mysql", "stop"], check=True)
                 logger.info("MariaDB service stopped via service command")
             except subprocess.CalledProcessError as e:
                 logger.error("Failed to stop MariaDB service: %s", e)
@@ -146,12 +158,12 @@ class MariaDBNativeManager(DatabaseManager):
         """Restart the native MariaDB service."""
         try:
             # Try systemctl first
-            subprocess.run(["systemctl", "restart", "mariadb"], check=True)
+            instrumentation.run(["systemctl", "restart", "mariadb"], check=True)
             logger.info("MariaDB service restarted via systemctl")
         except subprocess.CalledProcessError:
             try:
                 # Fallback to service command
-                subprocess.run(["service", "mysql", "restart"], check=True)
+                instrumentation.run(["service", "mysql", "restart"], check=True)
                 logger.info("MariaDB service restarted via service command")
             except subprocess.CalledProcessError as e:
                 logger.error("Failed to restart MariaDB service: %s", e)
@@ -161,7 +173,7 @@ class MariaDBNativeManager(DatabaseManager):
         """Check if native MariaDB service is running."""
         try:
             # Try systemctl first
-            result = subprocess.run(["systemctl", "is-active", "mariadb"], capture_output=True, text=True)
+            result = instrumentation.run(["systemctl", "is-active", "mariadb"], capture_output=True, text=True)
             if result.returncode == 0 and result.stdout.strip() == "active":
                 return True
         except subprocess.CalledProcessError:
@@ -169,93 +181,61 @@ class MariaDBNativeManager(DatabaseManager):
 
         # Fallback to checking mysql process
         try:
-            result = subprocess.run(
+            result = instrumentation.run(
                 ["mysqladmin", "-uroot", f"-p{self.root_password}", "ping"], capture_output=True, text=True
             )
             return result.returncode == 0
         except subprocess.CalledProcessError:
             return False
 
+    def _client_command(self, program: str) -> List[str]:
+        """Get the command line running a MariaDB client program as root."""
+        return [program, "-uroot", f"-p{self.root_password}"]
+
     def create_database(self, database_name: str) -> None:
         """Create a new database."""
         try:
-            cmd = [
-                "mysql",
-                "-uroot",
-                f"-p{self.root_password}",
-                "-e",
-                f"CREATE DATABASE IF NOT EXISTS `{database_name}` "
-                f"CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;",
-            ]
-            subprocess.run(cmd, check=True)
+            self.sql_executor.execute([self._create_database_sql(database_name)])
             logger.info("Created database: %s", database_name)
-        except subprocess.CalledProcessError as e:
+        except SQLExecutionError as e:
             logger.error("Failed to create database %s: %s", database_name, e)
             raise
 
     def create_user(self, username: str, password: str, database_name: Optional[str] = None) -> None:
         """Create a new database user with optional database access."""
         try:
-            # Create user
-            cmd = [
-                "mysql",
-                "-uroot",
-                f"-p{self.root_password}",
-                "-e",
-                f"CREATE USER IF NOT EXISTS '{username}'@'localhost' IDENTIFIED BY '{password}';",
-            ]
-            subprocess.run(cmd, check=True)
-
-            # Grant privileges if database specified
+            statements = self._create_user_sql(username, password)
+            # Grant privileges in the same batch if database specified
             if database_name:
-                self.grant_privileges(username, database_name)
-
+                statements.append(self._grant_sql(username, database_name))
+            self.sql_executor.execute(statements)
             logger.info("Created user: %s", username)
-        except subprocess.CalledProcessError as e:
+        except SQLExecutionError as e:
             logger.error("Failed to create user %s: %s", username, e)
             raise
 
     def grant_privileges(self, username: str, database_name: str, privileges: str = "ALL") -> None:
-        """Grant privileges to a user on a database."""
+        """Grant privileges to a user on a database.
+
+        GRANT updates the in-memory privilege tables, so no FLUSH PRIVILEGES is needed.
+        """
         try:
-            cmd = [
-                "mysql",
-                "-uroot",
-                f"-p{self.root_password}",
-                "-e",
-                f"GRANT {privileges} PRIVILEGES ON `{database_name}`.* TO '{username}'@'localhost'; "
-                f"FLUSH PRIVILEGES;",
-            ]
-            subprocess.run(cmd, check=True)
+            self.sql_executor.execute([self._grant_sql(username, database_name, privileges)])
             logger.info("Granted %s privileges on %s to %s", privileges, database_name, username)
-        except subprocess.CalledProcessError as e:
+        except SQLExecutionError as e:
             logger.error("Failed to grant privileges: %s", e)
             raise
 
     def backup_database(self, database_name: str, backup_path: Path) -> None:
-        """Backup a database to a file."""
+        """Backup a database to a file, compressed according to its suffix (.zst, .gz or plain)."""
         try:
-            backup_path.parent.mkdir(parents=True, exist_ok=True)
-            cmd = [
-                "mysqldump",
-                "-uroot",
-                f"-p{self.root_password}",
-                "--single-transaction",
-                "--routines",
-                "--triggers",
-                database_name,
-            ]
-
-            with backup_path.open("w") as f:
-                subprocess.run(cmd, stdout=f, check=True)
-
-            logger.info("Backed up database %s to %s", database_name, backup_path)
+            stream_dump(self, database_name, backup_path)
         except subprocess.CalledProcessError as e:
-            logger.error("Failed to backup database %s: %s", database_name, e)
+            logger.error("Failed to backup database %s: %s", database_name, e.stderr or e)
             raise
 
     def restore_database(self, database_name: str, backup_path: Path) -> None:
-        """Restore a database from a backup file."""
+        """Restore a database from a backup file, decompressing it according to its suffix."""
         try:
             if not backup_path.exists():
                 raise FileNotFoundError(f"Backup file not found: {backup_path}")
@@ -263,22 +243,16 @@ class MariaDBNativeManager(DatabaseManager):
             # Create database if it doesn't exist
             self.create_database(database_name)
 
-            cmd = ["mysql", "-uroot", f"-p{self.root_password}", database_name]
-
-            with backup_path.open("r") as f:
-                subprocess.run(cmd, stdin=f, check=True)
-
-            logger.info("Restored database %s from %s", database_name, backup_path)
+            stream_restore(self, database_name, backup_path)
         except subprocess.CalledProcessError as e:
-            logger.error("Failed to restore database %s: %s", database_name, e)
+            logger.error("Failed to restore database %s: %s", database_name, e.stderr or e)
             raise
 
     def generate_config(self, config_generator: ConfigGenerator) -> None:
-        """Generate MariaDB configuration files."""
-        config_content = config_generator.render_mariadb_config(self.template_vars)
-        with self.config_file.open("w") as fp:
-            fp.write(config_content)
-        logger.info("Generated MariaDB configuration at %s", self.config_file)
+        """Generate MariaDB configuration files, tuned for the host unless overridden by DB_* variables."""
+        config_content = config_generator.render_mariadb_config(tuned_template_vars(self.template_vars, self.data_path))
+        if write_if_changed(self.config_file, config_content) != "unchanged":
+            logger.info("Generated MariaDB configuration at %s", self.config_file)
 
     def get_connection_info(self) -> Dict[str, Any]:
         """Get database connection information."""
@@ -0,0 +1,148 @@
+"""Host-aware MariaDB tuning used to fill the DB_* variables of my.cnf.tpl."""
+
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MIB = 1024 * 1024
+
+# Share of the host memory given to the InnoDB buffer pool; the host also runs nginx and the site containers
+BUFFER_POOL_MEMORY_SHARE = 0.25
+
+# my.cnf settings that are computed, as template variable name -> my.cnf option
+TUNING_VARIABLES = {
+    "DB_INNODB_BUFFER_POOL_SIZE": "innodb_buffer_pool_size",
+    "DB_INNODB_LOG_FILE_SIZE": "innodb_log_file_size",
+    "DB_INNODB_IO_CAPACITY": "innodb_io_capacity",
+    "DB_INNODB_IO_CAPACITY_MAX": "innodb_io_capacity_max",
+    "DB_MAX_CONNECTIONS": "max_connections",
+    "DB_THREAD_CACHE_SIZE": "thread_cache_size",
+    "DB_TABLE_OPEN_CACHE": "table_open_cache",
+    "DB_QUERY_CACHE_TYPE": "query_cache_type",
+    "DB_QUERY_CACHE_SIZE": "query_cache_size",
+    "DB_GENERAL_LOG": "general_log",
+    "DB_SLOW_QUERY_LOG": "slow_query_log",
+    "DB_LONG_QUERY_TIME": "long_query_time",
+}
+
+
+def _clamp(value: int, lower: int, upper: int) -> int:
+    return max(lower, min(value, upper))
+
+
+def _format_size(size: int) -> str:
+    """Format a byte size as a whole number of MiB for my.cnf."""
+    return f"{size // MIB}M"
+
+
+def read_memory() -> int:
+    """Get the total memory of the host in bytes."""
+    memory = 1024 * MIB
+    try:
+        with open("/proc/meminfo", "r") as fp:
+            for line in fp:
+                if line.startswith("MemTotal:"):
+                    memory = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        logger.warning("Could not read /proc/meminfo, assuming %s of memory", _format_size(memory))
+    return memory
+
+
+def read_cpu_count() -> int:
+    """Get the number of CPUs the process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def is_rotational(path: Path) -> bool:
+    """Check whether the block device holding a path is a rotational disk.
+
+    The device is looked up in /sys/dev/block, falling back to the parent device for
+    partitions. Unknown devices (network or overlay filesystems) are treated as SSDs.
+    """
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    try:
+        device = os.stat(path).st_dev
+    except OSError:
+        return False
+
+    block_path = Path(f"/sys/dev/block/{os.major(device)}:{os.minor(device)}")
+    for queue_path in (block_path / "queue" / "rotational", block_path.resolve().parent / "queue" / "rotational"):
+        try:
+            return queue_path.read_text().strip() == "1"
+        except OSError:
+            continue
+    return False
+
+
+def compute_tuning(memory: int, cpu_count: int, rotational: bool, site_count: int) -> Dict[str, str]:
+    """Compute my.cnf settings from the host resources and the number of sites.
+
+    Args:
+        memory: Host memory in bytes
+        cpu_count: Number of usable CPUs
+        rotational: Whether the data directory is on a rotational disk
+        site_count: Number of discovered sites, each expected to own a database
+
+    Returns:
+        The DB_* template variables
+    """
+    # Buffer pool in 128M chunks so it matches innodb_buffer_pool_chunk_size
+    chunk = 128 * MIB
+    buffer_pool = max(chunk, int(memory * BUFFER_POOL_MEMORY_SHARE) // chunk * chunk)
+    log_file = _clamp(buffer_pool // 4, 48 * MIB, 2048 * MIB)
+
+    max_connections = _clamp(50 + 10 * site_count, 100, 2000)
+    thread_cache = _clamp(max_connections // 4, 16, 256)
+    table_open_cache = _clamp(64 * site_count, 2000, 16384)
+
+    io_capacity = 200 if rotational else 1000 * min(cpu_count, 4)
+
+    return {
+        "DB_INNODB_BUFFER_POOL_SIZE": _format_size(buffer_pool),
+        "DB_INNODB_LOG_FILE_SIZE": _format_size(log_file),
+        "DB_INNODB_IO_CAPACITY": str(io_capacity),
+        "DB_INNODB_IO_CAPACITY_MAX": str(io_capacity * 2),
+        "DB_MAX_CONNECTIONS": str(max_connections),
+        "DB_THREAD_CACHE_SIZE": str(thread_cache),
+        "DB_TABLE_OPEN_CACHE": str(table_open_cache),
+        "DB_QUERY_CACHE_TYPE": "0",
+        "DB_QUERY_CACHE_SIZE": "0",
+        "DB_GENERAL_LOG": "0",
+        "DB_SLOW_QUERY_LOG": "1",
+        "DB_LONG_QUERY_TIME": "2",
+    }
+
+
+def resolve_tuning(template_vars: Dict[str, Any], data_path: Path) -> Dict[str, Tuple[str, str]]:
+    """Get every tuning setting together with where its value comes from.
+
+    Values already present in the template variables (set with --db-tune) take precedence
+    over the computed ones. The number of sites is read from SITE_COUNT.
+
+    Returns:
+        A mapping of DB_* template variable to (value, "override" or "computed")
+    """
+    computed = compute_tuning(
+        read_memory(),
+        read_cpu_count(),
+        is_rotational(data_path),
+        int(template_vars.get("SITE_COUNT", 0)),
+    )
+    return {
+        name: (str(template_vars[name]), "override") if name in template_vars else (value, "computed")
+        for name, value in computed.items()
+    }
+
+
+def tuned_template_vars(template_vars: Dict[str, Any], data_path: Optional[Path] = None) -> Dict[str, Any]:
+    """Get a copy of the template variables completed with the computed tuning settings."""
+    tuning = resolve_tuning(template_vars, data_path or Path("/var/lib/mysql"))
+    return dict(template_vars, **{name: value for name, (value, _) in tuning.items()})
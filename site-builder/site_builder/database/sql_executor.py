@@ -0,0 +1,171 @@
+"""Executors that run batches of SQL statements against the MariaDB server."""
+
+import logging
+import os
+import queue
+import subprocess
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from ..utils import instrumentation
+
+try:
+    import pymysql
+except ImportError:  # Optional dependency, the mysql client fallback is used without it
+    pymysql = None
+
+logger = logging.getLogger(__name__)
+
+
+class SQLExecutionError(Exception):
+    """Raised when a batch of SQL statements fails."""
+
+
+def quote_string(value: str) -> str:
+    """Quote a value as a SQL string literal."""
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a name as a SQL identifier."""
+    return "`" + name.replace("`", "``") + "`"
+
+
+class SQLExecutor(ABC):
+    """Runs batches of SQL statements."""
+
+    @abstractmethod
+    def execute(self, statements: List[str]) -> None:
+        """Run statements in order as one batch, stopping at the first error.
+
+        Raises:
+            SQLExecutionError: If a statement fails
+        """
+        pass
+
+    def close(self) -> None:
+        """Release any resources held by the executor."""
+        pass
+
+
+class PyMySQLExecutor(SQLExecutor):
+    """Runs statements over pooled PyMySQL connections, speaking the MySQL protocol directly.
+
+    Connections are opened on demand, returned to the pool after each batch and reused by
+    later batches, so a whole provisioning run needs a single connection. Each batch runs
+    inside one transaction; note that DDL and account statements commit implicitly in MariaDB.
+    """
+
+    def __init__(self, connection_kwargs: Dict[str, Any], pool_size: int = 4):
+        """
+        Initialize the PyMySQL executor.
+
+        Args:
+            connection_kwargs: Keyword arguments for pymysql.connect
+            pool_size: Maximum number of idle connections kept open
+        """
+        self.connection_kwargs = connection_kwargs
+        self._pool: "queue.LifoQueue[Any]" = queue.LifoQueue(maxsize=pool_size)
+
+    def _acquire(self):
+        """Get an idle pooled connection, or open a new one."""
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            return pymysql.connect(**self.connection_kwargs)
+        connection.ping(reconnect=True)
+        return connection
+
+    def _release(self, connection) -> None:
+        """Return a connection to the pool, closing it if the pool is full."""
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def execute(self, statements: List[str]) -> None:
+        try:
+            connection = self._acquire()
+        except pymysql.MySQLError as e:
+            raise SQLExecutionError(str(e)) from e
+        try:
+            connection.begin()
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+            connection.commit()
+        except pymysql.MySQLError as e:
+            try:
+                connection.rollback()
+            except pymysql.MySQLError:
+                pass
+            connection.close()
+            raise SQLExecutionError(str(e)) from e
+        self._release(connection)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class MySQLClientExecutor(SQLExecutor):
+    """Runs each batch in a single mysql client session, feeding the statements through stdin."""
+
+    def __init__(self, command: List[str]):
+        """
+        Initialize the mysql client executor.
+
+        Args:
+            command: The mysql client command line, without any statement
+        """
+        self.command = command
+
+    def execute(self, statements: List[str]) -> None:
+        if not statements:
+            return
+        script = "".join(f"{statement.rstrip(';')};\n" for statement in statements)
+        try:
+            instrumentation.run(self.command, input=script, check=True, capture_output=True, text=True)
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            message = getattr(e, "stderr", None) or str(e)
+            raise SQLExecutionError(message.strip()) from e
+
+
+def create_sql_executor(connection_info: Dict[str, Any], client_command: List[str]) -> SQLExecutor:
+    """Create the best available SQL executor for a database server.
+
+    PyMySQL is used when it is installed and a connection can be made, over the server
+    socket when it exists and over TCP otherwise. Without it, statements are batched into
+    mysql client sessions.
+
+    Args:
+        connection_info: Connection information as returned by DatabaseManager.get_connection_info
+        client_command: The mysql client command line used by the fallback executor
+    """
+    if pymysql is not None:
+        connection_kwargs: Dict[str, Any] = {
+            "user": connection_info["username"],
+            "password": connection_info["password"],
+            "charset": "utf8mb4",
+            "autocommit": False,
+        }
+        socket_path: Optional[str] = connection_info.get("socket")
+        if socket_path and os.path.exists(socket_path):
+            connection_kwargs["unix_socket"] = socket_path
+        else:
+            connection_kwargs["host"] = connection_info["host"]
+            connection_kwargs["port"] = connection_info["port"]
+
+        executor = PyMySQLExecutor(connection_kwargs)
+        try:
+            executor._release(executor._acquire())
+            return executor
+        except pymysql.MySQLError as e:
+            logger.warning("Could not connect with PyMySQL, falling back to the mysql client: %s", e)
+    else:
+        logger.debug("PyMySQL is not installed, using the mysql client")
+
+    return MySQLClientExecutor(client_command)
@@ -1,3 +1,16 @@
+from .container_reconciler import ContainerReconciler
+from .docker_client import DockerAPIError, DockerClient, compose_project_name, get_docker_client
 from .docker_manager import DockerManager
+from .image_index import ImageIndex
+from .php_opcache import reset_opcache
 
-__all__ = ["DockerManager"]
+__all__ = [
+    "ContainerReconciler",
+    "DockerAPIError",
+    "DockerClient",
+    "DockerManager",
+    "ImageIndex",
+    "compose_project_name",
+    "get_docker_client",
+    "reset_opcache",
+]
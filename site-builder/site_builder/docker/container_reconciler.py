@@ -0,0 +1,260 @@
+"""Reconcile site containers so only services whose definition changed are rebuilt and restarted."""
+
+import json
+import logging
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from ..config_generator import ConfigGenerator
+from ..utils import atomic_write, content_hash, instrumentation
+from .docker_client import DockerAPIError, DockerClient, compose_project_name, get_docker_client
+from .image_index import ImageIndex
+
+
+class ContainerReconciler:
+    """Build and start the web-<slug> compose services (one per site replica) whose fingerprint changed.
+
+    A service fingerprint is the hash of its rendered compose block, which references the
+    content-addressed tag of its runtime image (see ImageIndex). Fingerprints of the services that were brought
+    up successfully are kept in a JSON state file, so unchanged services are neither
+    rebuilt nor recreated, and services that failed are retried on the next run.
+    """
+
+    def __init__(self, docker_compose_path: Path, state_file: Path, image_index: ImageIndex, workers: int = 4):
+        """
+        Initialize the container reconciler.
+
+        Args:
+            docker_compose_path: Path to the docker-compose.yml file
+            state_file: Path to the JSON file holding the service fingerprints
+            image_index: Index of the runtime images already built
+            workers: Maximum number of services built and started in parallel
+        """
+        self.docker_compose_path = docker_compose_path
+        self.state_file = state_file
+        self.image_index = image_index
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+
+    @cached_property
+    def logger(self) -> logging.Logger:
+        logger = logging.getLogger(__name__)
+        return logger
+
+    @cached_property
+    def docker_client(self) -> DockerClient:
+        """Docker Engine API client shared with the other managers."""
+        return get_docker_client()
+
+    @cached_property
+    def project_name(self) -> str:
+        return compose_project_name(self.docker_compose_path)
+
+    def _load(self) -> Dict[str, str]:
+        """Load the stored service fingerprints, starting empty if the file is missing or unreadable."""
+        if not self.state_file.is_file():
+            return {}
+        try:
+            with self.state_file.open("r") as fp:
+                return json.load(fp).get("services", {})
+        except (OSError, ValueError) as e:
+            self.logger.warning("Ignoring unreadable service state %s: %s", self.state_file, e)
+            return {}
+
+    def _save(self, fingerprints: Dict[str, str]) -> None:
+        """Write the service fingerprints atomically."""
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(self.state_file, json.dumps({"services": fingerprints}, indent=2, sort_keys=True))
+
+    def fingerprint(self, service_config: str) -> str:
+        """Get the fingerprint of a site service from its rendered compose block.
+
+        The block references the content-addressed image tag, so it also changes whenever
+        the build context changes.
+        """
+        return content_hash(service_config)
+
+    def _existing_services(self) -> Optional[Set[str]]:
+        """Get the services of the compose project that have a container, or None if the API is unavailable."""
+        if not self.docker_client.available:
+            return None
+        try:
+            containers = self.docker_client.list_containers({"com.docker.compose.project": self.project_name}, all=True)
+        except (OSError, DockerAPIError) as e:
+            self.logger.debug("Could not list containers of %s: %s", self.project_name, e)
+            return None
+        return {container["Labels"].get("com.docker.compose.service") for container in containers}
+
+    def _compose(self, *args: str) -> None:
+        """Run a docker compose command against the compose file."""
+        instrumentation.run(
+            ["docker", "compose", "-f", str(self.docker_compose_path), *args],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+
+    def _image_exists(self, image: str) -> bool:
+        """Check whether an image is present in the local image store."""
+        if self.docker_client.available:
+            return self.docker_client.image_exists(image)
+        result = instrumentation.run(["docker", "image", "inspect", image], capture_output=True)
+        return result.returncode == 0
+
+    def _ensure_image(self, image: str, context: Path, build_contexts: Optional[Dict[str, Path]] = None) -> bool:
+        """Build a runtime image unless an image with the same content-addressed tag already exists.
+
+        Args:
+            image: Content-addressed image reference
+            context: Build context directory
+            build_contexts: Named build contexts the Dockerfile copies from (COPY --from=NAME)
+
+        Returns:
+            True if the image is available, False if the build failed
+        """
+        # The tag is content-addressed, so an indexed image needs no lookup in the image store
+        if self.image_index.is_built(image):
+            return True
+
+        try:
+            if self._image_exists(image):
+                self.image_index.record(image, context)
+                return True
+
+            self.logger.info("Building image %s", image)
+            named_contexts = [
+                f"--build-context={name}={Path(path)}" for name, path in sorted((build_contexts or {}).items())
+            ]
+            instrumentation.run(
+                ["docker", "build", "-t", image, *named_contexts, str(context)],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+        except subprocess.CalledProcessError as e:
+            self.logger.error("Failed to build %s: %s", image, (e.stderr or "").strip() or e)
+            return False
+        except (OSError, DockerAPIError) as e:
+            self.logger.error("Failed to build %s: %s", image, e)
+            return False
+
+        self.image_index.record(image, context)
+        return True
+
+    def _timed_ensure_image(self, image: str, runtime: Dict[str, Any]) -> bool:
+        """Ensure the image of a runtime exists, timing it per image in the run report."""
+        with instrumentation.site_timer("images", image):
+            return self._ensure_image(image, Path(runtime["context"]), runtime.get("build_contexts"))
+
+    def _up(self, service: str) -> None:
+        """Recreate the container of a service from its prebuilt image, leaving its dependencies alone."""
+        self._compose("up", "-d", "--no-build", "--no-deps", service)
+
+    def _remove(self, service: str) -> None:
+        """Stop and remove the containers of a service that is no longer defined."""
+        if self.docker_client.available:
+            for container in self.docker_client.list_containers(
+                {"com.docker.compose.project": self.project_name, "com.docker.compose.service": service}, all=True
+            ):
+                self.docker_client.remove_container(container["Id"], force=True)
+            return
+
+        result = instrumentation.run(
+            [
+                "docker",
+                "ps",
+                "-aq",
+                "--filter",
+                f"label=com.docker.compose.project={self.project_name}",
+                "--filter",
+                f"label=com.docker.compose.service={service}",
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        container_ids = result.stdout.split()
+        if container_ids:
+            instrumentation.run(["docker", "rm", "-f", *container_ids], check=True, capture_output=True)
+
+    def reconcile(
+        self, sites: List[Dict[str, Any]], config_generator: ConfigGenerator, template_vars: Dict[str, Any]
+    ) -> Dict[str, str]:
+        """Bring the site services in line with the current compose definition.
+
+        Services whose fingerprint changed, or whose container is gone, are started in
+        parallel with at most `workers` concurrent compose invocations, after building the
+        distinct runtime images they need that are not present yet. Services no longer
+        present are removed.
+
+        Returns:
+            A mapping of service name to "started", "unchanged", "removed" or "failed"
+        """
+        previous = self._load()
+        current: Dict[str, str] = {}
+        fingerprints: Dict[str, str] = {}
+        results: Dict[str, str] = {}
+        pending: List[str] = []
+        existing = self._existing_services()
+
+        images: Dict[str, str] = {}
+        runtimes: Dict[str, Dict[str, Any]] = {}
+
+        for site in sites:
+            for replica in site["replicas"]:
+                service = replica["service"]
+                fingerprint = self.fingerprint(config_generator.render_compose_service(site, replica, template_vars))
+                fingerprints[service] = fingerprint
+                if previous.get(service) == fingerprint and (existing is None or service in existing):
+                    current[service] = fingerprint
+                    results[service] = "unchanged"
+                else:
+                    pending.append(service)
+                    images[service] = ImageIndex.image_name(site["runtime"])
+                    runtimes[images[service]] = site["runtime"]
+
+        # Sites sharing a runtime share its image, so every distinct image is built at most once
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            available = dict(zip(runtimes, executor.map(self._timed_ensure_image, runtimes, runtimes.values())))
+
+        def start(service: str) -> str:
+            if not available[images[service]]:
+                return "failed"
+            try:
+                with instrumentation.site_timer("containers", service):
+                    self._up(service)
+            except subprocess.CalledProcessError as e:
+                self.logger.error("Failed to start %s: %s", service, (e.stderr or "").strip() or e)
+                # The image may have been removed behind the index's back, check the image store next time
+                self.image_index.forget(images[service])
+                return "failed"
+            except (OSError, DockerAPIError) as e:
+                self.logger.error("Failed to start %s: %s", service, e)
+                return "failed"
+            with self._lock:
+                current[service] = fingerprints[service]
+            self.logger.info("Started %s", service)
+            return "started"
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for service, status in zip(pending, executor.map(start, pending)):
+                results[service] = status
+
+        for service in sorted(set(previous) - set(fingerprints)):
+            try:
+                self._remove(service)
+                results[service] = "removed"
+                self.logger.info("Removed %s", service)
+            except (subprocess.CalledProcessError, OSError, DockerAPIError) as e:
+                # Keep the fingerprint so removal is retried on the next run
+                current[service] = previous[service]
+                results[service] = "failed"
+                self.logger.error("Failed to remove %s: %s", service, e)
+
+        self._save(current)
+        self.image_index.save()
+        return results
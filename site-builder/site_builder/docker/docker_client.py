@@ -0,0 +1,257 @@
+"""Minimal Docker Engine API client talking HTTP over the docker unix socket."""
+
+import http.client
+import json
+import logging
+import os
+import re
+import socket
+import struct
+import threading
+import time
+from functools import cached_property, lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+DEFAULT_SOCKET_PATH = "/var/run/docker.sock"
+
+
+class DockerAPIError(Exception):
+    """Raised when the Docker Engine API returns an error response."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API error {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a unix domain socket."""
+
+    def __init__(self, socket_path: str, timeout: float = 60):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def compose_project_name(docker_compose_path: Path) -> str:
+    """Get the default compose project name for a compose file (its normalized directory name)."""
+    name = re.sub(r"[^a-z0-9_-]", "", docker_compose_path.resolve().parent.name.lower())
+    return name.lstrip("_-")
+
+
+class DockerClient:
+    """Docker Engine API client for container inspect, exec, signal and status.
+
+    All requests share one persistent HTTP connection to the docker socket, guarded by a
+    lock, so checks and actions do not pay the docker CLI start-up cost. Callers should
+    check available and fall back to the docker CLI when the socket cannot be used.
+    """
+
+    API_VERSION = "v1.41"
+    # Seconds the outcome of the availability check is reused; a failed request checks again right away
+    AVAILABILITY_TTL = 60
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 60):
+        """
+        Initialize the Docker client.
+
+        Args:
+            socket_path: Path to the Docker Engine unix socket
+            timeout: Socket timeout in seconds
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._connection: Optional[UnixHTTPConnection] = None
+        self._lock = threading.Lock()
+        self._available: Optional[bool] = None
+        self._available_until = 0.0
+
+    @cached_property
+    def logger(self) -> logging.Logger:
+        return logging.getLogger(__name__)
+
+    @property
+    def available(self) -> bool:
+        """Check whether the Docker Engine API can be reached over the socket.
+
+        The outcome is cached for AVAILABILITY_TTL seconds, so a long-running process picks up a
+        daemon that was started, or went away, after it made its first check.
+        """
+        now = time.monotonic()
+        if self._available is None or now >= self._available_until:
+            self._available = self._check_available()
+            self._available_until = now + self.AVAILABILITY_TTL
+        return self._available
+
+    def _check_available(self) -> bool:
+        """Ping the Docker Engine API over the socket."""
+        if not os.path.exists(self.socket_path):
+            return False
+        try:
+            return self.ping()
+        except (OSError, http.client.HTTPException, DockerAPIError) as e:
+            self.logger.debug("Docker API not available on %s: %s", self.socket_path, e)
+            return False
+
+    def _request(
+        self, method: str, path: str, params: Optional[Dict[str, Any]] = None, body: Optional[Dict[str, Any]] = None
+    ) -> Tuple[int, bytes]:
+        """Send a request over the pooled connection, reconnecting once if it went stale."""
+        url = f"/{self.API_VERSION}{path}"
+        if params:
+            url += "?" + urlencode(params)
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+
+        with self._lock:
+            try:
+                try:
+                    return self._send(method, url, payload, headers)
+                except (ConnectionError, http.client.RemoteDisconnected, http.client.CannotSendRequest):
+                    # The daemon closed the idle pooled connection, retry once on a fresh one
+                    self._reset()
+                    return self._send(method, url, payload, headers)
+            except (OSError, http.client.HTTPException):
+                # The daemon may be gone, check the socket again before the next API call
+                self._available_until = 0.0
+                raise
+
+    def _send(self, method: str, url: str, payload: Optional[bytes], headers: Dict[str, str]) -> Tuple[int, bytes]:
+        """Send a request on the pooled connection, opening it if needed. Must hold the lock."""
+        if self._connection is None:
+            self._connection = UnixHTTPConnection(self.socket_path, self.timeout)
+        try:
+            self._connection.request(method, url, body=payload, headers=headers)
+            response = self._connection.getresponse()
+            data = response.read()
+        except BaseException:
+            self._reset()
+            raise
+        if response.will_close:
+            self._reset()
+        return response.status, data
+
+    def _reset(self) -> None:
+        """Drop the pooled connection. Must hold the lock."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _json(
+        self, method: str, path: str, params: Optional[Dict[str, Any]] = None, body: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """Send a request and decode its JSON response, raising DockerAPIError on error statuses."""
+        status, data = self._request(method, path, params, body)
+        if status >= 400:
+            try:
+                message = json.loads(data).get("message", "")
+            except ValueError:
+                message = data.decode(errors="replace")
+            raise DockerAPIError(status, message)
+        return json.loads(data) if data else None
+
+    def ping(self) -> bool:
+        """Check that the Docker daemon answers."""
+        status, data = self._request("GET", "/_ping")
+        return status == 200 and data.strip() == b"OK"
+
+    def list_containers(self, labels: Optional[Dict[str, str]] = None, all: bool = False) -> List[Dict[str, Any]]:
+        """List containers, optionally filtered by labels."""
+        params: Dict[str, Any] = {"all": "1" if all else "0"}
+        if labels:
+            params["filters"] = json.dumps({"label": [f"{key}={value}" for key, value in labels.items()]})
+        return self._json("GET", "/containers/json", params)
+
+    def find_compose_container(self, project: str, service: str, all: bool = False) -> Optional[str]:
+        """Get the ID of the container running a compose service, or None if there is none."""
+        containers = self.list_containers(
+            {"com.docker.compose.project": project, "com.docker.compose.service": service}, all=all
+        )
+        return containers[0]["Id"] if containers else None
+
+    def inspect_container(self, container_id: str) -> Dict[str, Any]:
+        """Get the low-level information of a container."""
+        return self._json("GET", f"/containers/{quote(container_id)}/json")
+
+    def container_status(self, container_id: str) -> Optional[str]:
+        """Get the state of a container ("running", "exited", ...), or None if it does not exist."""
+        try:
+            return self.inspect_container(container_id)["State"]["Status"]
+        except DockerAPIError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def image_exists(self, image: str) -> bool:
+        """Check whether an image reference is present in the local image store."""
+        try:
+            self._json("GET", f"/images/{quote(image, safe='')}/json")
+        except DockerAPIError as e:
+            if e.status == 404:
+                return False
+            raise
+        return True
+
+    def kill(self, container_id: str, signal: str = "SIGHUP") -> None:
+        """Send a signal to the main process of a container."""
+        self._json("POST", f"/containers/{quote(container_id)}/kill", {"signal": signal})
+
+    def remove_container(self, container_id: str, force: bool = False) -> None:
+        """Remove a container, killing it first if force is set."""
+        self._json("DELETE", f"/containers/{quote(container_id)}", {"force": "1" if force else "0"})
+
+    def exec(self, container_id: str, cmd: List[str]) -> Tuple[int, bytes, bytes]:
+        """Run a command inside a running container.
+
+        Returns:
+            The exit code, stdout and stderr of the command
+        """
+        exec_id = self._json(
+            "POST",
+            f"/containers/{quote(container_id)}/exec",
+            body={"AttachStdout": True, "AttachStderr": True, "Cmd": cmd},
+        )["Id"]
+
+        status, data = self._request("POST", f"/exec/{exec_id}/start", body={"Detach": False, "Tty": False})
+        if status >= 400:
+            raise DockerAPIError(status, data.decode(errors="replace"))
+
+        stdout, stderr = self._demultiplex(data)
+        exit_code = self._json("GET", f"/exec/{exec_id}/json")["ExitCode"]
+        return exit_code, stdout, stderr
+
+    @staticmethod
+    def _demultiplex(data: bytes) -> Tuple[bytes, bytes]:
+        """Split a multiplexed attach stream into stdout and stderr."""
+        streams = {1: bytearray(), 2: bytearray()}
+        offset = 0
+        while offset + 8 <= len(data):
+            stream_type, size = struct.unpack(">BxxxL", data[offset : offset + 8])
+            offset += 8
+            streams.get(stream_type, streams[1]).extend(data[offset : offset + size])
+            offset += size
+        return bytes(streams[1]), bytes(streams[2])
+
+    def close(self) -> None:
+        """Close the pooled connection."""
+        with self._lock:
+            self._reset()
+
+
+@lru_cache()
+def get_docker_client(socket_path: Optional[str] = None) -> DockerClient:
+    """Get the shared Docker client for a socket, so all managers reuse one connection.
+
+    Without a socket path, a unix:// DOCKER_HOST is honoured before the default socket.
+    """
+    if socket_path is None:
+        docker_host = os.environ.get("DOCKER_HOST", "")
+        socket_path = docker_host[len("unix://") :] if docker_host.startswith("unix://") else DEFAULT_SOCKET_PATH
+    return DockerClient(socket_path)
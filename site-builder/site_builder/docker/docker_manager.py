@@ -1,6 +1,7 @@
 """Module to manage Docker installation and setup."""
 
 import logging
+import os
 import shutil
 import subprocess
 from functools import cached_property
@@ -8,6 +9,16 @@ from functools import cached_property
 import requests
 
 from ..pkgs import PKGsManager
+from ..utils import instrumentation
+
+# Directories where the docker CLI looks for the compose plugin
+COMPOSE_PLUGIN_DIRS = [
+    "~/.docker/cli-plugins",
+    "/usr/local/lib/docker/cli-plugins",
+    "/usr/local/libexec/docker/cli-plugins",
+    "/usr/lib/docker/cli-plugins",
+    "/usr/libexec/docker/cli-plugins",
+]
 
 
 class DockerManager:
@@ -26,9 +37,17 @@ class DockerManager:
         return shutil.which("docker") is not None and self._has_compose_plugin()
 
     def _has_compose_plugin(self) -> bool:
-        """Check if docker compose plugin is available."""
+        """Check if docker compose plugin is available.
+
+        The plugin directories are checked first so the common case does not start a
+        docker CLI process; `docker compose version` is only run as a fallback.
+        """
+        for plugin_dir in COMPOSE_PLUGIN_DIRS:
+            if os.access(os.path.join(os.path.expanduser(plugin_dir), "docker-compose"), os.X_OK):
+                return True
+
         try:
-            result = subprocess.run(["docker", "compose", "version"], capture_output=True, check=True)
+            result = instrumentation.run(["docker", "compose", "version"], capture_output=True, check=True)
             return result.returncode == 0
         except (subprocess.CalledProcessError, FileNotFoundError):
             return False
@@ -65,7 +84,7 @@ class DockerManager:
 
         # Add Docker repository to sources
         # Get architecture and version codename
-        arch_result = subprocess.run(["dpkg", "--print-architecture"], capture_output=True, text=True, check=True)
+        arch_result = instrumentation.run(["dpkg", "--print-architecture"], capture_output=True, text=True, check=True)
         architecture = arch_result.stdout.strip()
 
         # Get version codename from os-release
@@ -97,8 +116,8 @@ class DockerManager:
         )
 
         # Enable and start Docker service
-        subprocess.run(["systemctl", "enable", "docker"], check=True)
-        subprocess.run(["systemctl", "start", "docker"], check=True)
+        instrumentation.run(["systemctl", "enable", "docker"], check=True)
+        instrumentation.run(["systemctl", "start", "docker"], check=True)
 
         self.logger.info("Docker installed and started successfully")
 
@@ -119,7 +138,7 @@ class DockerManager:
         )
 
         # Enable and start Docker service
-        subprocess.run(["systemctl", "enable", "docker"], check=True)
-        subprocess.run(["systemctl", "start", "docker"], check=True)
+        instrumentation.run(["systemctl", "enable", "docker"], check=True)
+        instrumentation.run(["systemctl", "start", "docker"], check=True)
 
         self.logger.info("Docker installed and started successfully")
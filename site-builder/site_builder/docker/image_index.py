@@ -0,0 +1,156 @@
+"""Content-addressed image tags for site runtimes and an index of the images already built."""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..utils import atomic_write, content_hash, hash_directory
+
+logger = logging.getLogger(__name__)
+
+# Length of the context hash prefix used in image tags
+TAG_HASH_LENGTH = 12
+
+
+def _tree_signature(path: Path) -> Optional[List[List[Any]]]:
+    """Get a stat-only signature (relative path, mode, size, mtime) of every entry in a directory tree."""
+    if not path.is_dir():
+        return None
+    signature = []
+    for root, directories, files in os.walk(path):
+        directories.sort()
+        for name in sorted(files + directories):
+            entry_path = os.path.join(root, name)
+            stat = os.lstat(entry_path)
+            signature.append([os.path.relpath(entry_path, path), stat.st_mode, stat.st_size, stat.st_mtime_ns])
+    return signature
+
+
+class ImageIndex:
+    """Resolves runtime image tags from a hash of their build context and tracks built images.
+
+    A runtime image is tagged `<RUNTIME_VERSION>-<hash>` (or just `<hash>` when the Dockerfile
+    does not declare a version), where the hash covers every file of the build context and of
+    the named build contexts it copies from, so any edit yields a new tag and identical
+    contexts share one tag. Context hashes are cached in the index together with a stat
+    signature of the tree, so contexts are only read again when a file changed. The index also
+    records the images that were built, which lets the build step skip images that already exist.
+    """
+
+    def __init__(self, index_path: Path):
+        """
+        Initialize the image index.
+
+        Args:
+            index_path: Path to the JSON index file
+        """
+        self.index_path = index_path
+        self._contexts: Dict[str, Dict[str, Any]] = {}
+        self._images: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        """Load the index file, starting empty if it is missing or unreadable."""
+        if not self.index_path.is_file():
+            return
+        try:
+            with self.index_path.open("r") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable image index %s: %s", self.index_path, e)
+            return
+        self._contexts = data.get("contexts", {})
+        self._images = data.get("images", {})
+
+    def context_hash(self, context: Path) -> str:
+        """Get the content hash of a build context, rereading it only if its files changed."""
+        key = Path(context).as_posix()
+        signature = _tree_signature(Path(context))
+        with self._lock:
+            cached = self._contexts.get(key)
+            if cached and cached["signature"] == signature:
+                return cached["hash"]
+
+        context_hash = hash_directory(Path(context))
+        with self._lock:
+            self._contexts[key] = {"signature": signature, "hash": context_hash}
+            self._dirty = True
+        return context_hash
+
+    def image_tag(self, runtime: Dict[str, Any]) -> str:
+        """Get the content-addressed image tag of a runtime, covering its named build contexts too."""
+        context_hash = self.context_hash(runtime["context"])
+        build_contexts = runtime.get("build_contexts") or {}
+        if build_contexts:
+            parts = [context_hash] + [
+                f"{name}={self.context_hash(path)}" for name, path in sorted(build_contexts.items())
+            ]
+            context_hash = content_hash("\0".join(parts))
+        context_hash = context_hash[:TAG_HASH_LENGTH]
+        version = runtime.get("version")
+        return f"{version}-{context_hash}" if version and version != "latest" else context_hash
+
+    def tag_sites(self, sites: List[Dict[str, Any]]) -> None:
+        """Set the image tag of every site runtime, hashing each distinct build context once."""
+        tags: Dict[Any, str] = {}
+        contexts = set()
+        for site in sites:
+            runtime = site["runtime"]
+            build_contexts = runtime.get("build_contexts") or {}
+            key = (
+                Path(runtime["context"]).as_posix(),
+                runtime.get("version"),
+                tuple(sorted((name, Path(path).as_posix()) for name, path in build_contexts.items())),
+            )
+            if key not in tags:
+                tags[key] = self.image_tag(runtime)
+                contexts.add(key[0])
+                contexts.update(path for _, path in key[2])
+            runtime["tag"] = tags[key]
+
+        # Forget the cached hashes of contexts no site uses anymore
+        with self._lock:
+            for context in set(self._contexts) - contexts:
+                del self._contexts[context]
+                self._dirty = True
+
+    @staticmethod
+    def image_name(runtime: Dict[str, Any]) -> str:
+        """Get the full image reference of a tagged runtime."""
+        return f"{runtime['name']}:{runtime['tag']}"
+
+    def is_built(self, image: str) -> bool:
+        """Check whether an image was recorded as built."""
+        with self._lock:
+            return image in self._images
+
+    def record(self, image: str, context: Path) -> None:
+        """Record an image that was just built or found in the local image store."""
+        with self._lock:
+            self._images[image] = {
+                "context": Path(context).as_posix(),
+                "built": datetime.now(timezone.utc).isoformat(),
+            }
+            self._dirty = True
+
+    def forget(self, image: str) -> None:
+        """Drop an image that is no longer present in the local image store."""
+        with self._lock:
+            if self._images.pop(image, None) is not None:
+                self._dirty = True
+
+    def save(self) -> None:
+        """Write the index atomically if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            data = {"contexts": self._contexts, "images": self._images}
+            atomic_write(self.index_path, json.dumps(data, indent=2, sort_keys=True))
+            self._dirty = False
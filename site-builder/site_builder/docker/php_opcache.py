@@ -0,0 +1,41 @@
+"""OPcache maintenance of the PHP site containers."""
+
+import logging
+
+from ..utils import instrumentation
+from .docker_client import DockerAPIError, get_docker_client
+
+logger = logging.getLogger(__name__)
+
+# Helper installed by the PHP runtimes, resetting the cache of the PHP-FPM workers over FastCGI
+OPCACHE_RESET_COMMAND = ["sh", "/usr/local/bin/opcache-reset.sh"]
+
+
+def reset_opcache(container_name: str) -> bool:
+    """Reset the OPcache of a running PHP site container without restarting it.
+
+    The reset runs inside PHP-FPM, since resetting it from the PHP CLI would only clear
+    the cache of the CLI process. Preloaded scripts stay cached until the container restarts.
+
+    Returns:
+        True if the cache was reset
+    """
+    docker_client = get_docker_client()
+    if docker_client.available:
+        try:
+            exit_code, _, stderr = docker_client.exec(container_name, OPCACHE_RESET_COMMAND)
+        except DockerAPIError as e:
+            logger.error("Failed to reset OPcache in %s: %s", container_name, e)
+            return False
+        error = stderr.decode(errors="replace")
+    else:
+        result = instrumentation.run(
+            ["docker", "exec", container_name] + OPCACHE_RESET_COMMAND, capture_output=True, text=True
+        )
+        exit_code, error = result.returncode, result.stderr
+
+    if exit_code != 0:
+        logger.error("Failed to reset OPcache in %s: %s", container_name, error.strip())
+        return False
+    logger.info("OPcache reset in %s", container_name)
+    return True
@@ -3,9 +3,11 @@
 from .nginx_docker import NginxDockerManager
 from .nginx_manager import NginxManager
 from .nginx_native import NginxNativeManager
+from .proxy_cache import purge_site_cache
 
 __all__ = [
     "NginxManager",
     "NginxDockerManager",
     "NginxNativeManager",
+    "purge_site_cache",
 ]
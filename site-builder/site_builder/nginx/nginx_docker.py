@@ -1,13 +1,15 @@
 """Docker-based Nginx service management."""
 
 import logging
+import os
 import subprocess
 from functools import cached_property
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional
 
-from ..docker import DockerManager
-from .nginx_manager import NginxManager
+from ..docker import DockerAPIError, DockerClient, DockerManager, compose_project_name, get_docker_client
+from ..utils import instrumentation, write_if_changed
+from .nginx_manager import MAIN_CONFIG_NAME, NginxManager
 
 
 class NginxDockerManager(NginxManager):
@@ -36,6 +38,15 @@ class NginxDockerManager(NginxManager):
         logger = logging.getLogger(__name__)
         return logger
 
+    @cached_property
+    def docker_client(self) -> DockerClient:
+        """Docker Engine API client shared with the other managers."""
+        return get_docker_client()
+
+    def _container_id(self) -> Optional[str]:
+        """Get the ID of the running nginx container through the Docker API."""
+        return self.docker_client.find_compose_container(compose_project_name(self.docker_compose_path), "nginx")
+
     def _is_docker_installed(self) -> bool:
         """Check if Docker is installed on the system."""
         docker_manager = DockerManager()
@@ -53,7 +64,7 @@ class NginxDockerManager(NginxManager):
     def start(self) -> None:
         """Start the Nginx Docker service."""
         try:
-            subprocess.run(
+            instrumentation.run(
                 ["docker", "compose", "-f", str(self.docker_compose_path), "up", "-d", "nginx"],
                 check=True,
                 cwd=self.docker_compose_path.parent,
@@ -66,7 +77,7 @@ class NginxDockerManager(NginxManager):
     def stop(self) -> None:
         """Stop the Nginx Docker service."""
         try:
-            subprocess.run(
+            instrumentation.run(
                 ["docker", "compose", "-f", str(self.docker_compose_path), "stop", "nginx"],
                 check=True,
                 cwd=self.docker_compose_path.parent,
@@ -78,9 +89,25 @@ class NginxDockerManager(NginxManager):
 
     def reload(self) -> None:
         """Reload Nginx configuration without downtime using SIGHUP."""
+        if self.docker_client.available:
+            try:
+                container_id = self._container_id()
+                if not container_id:
+                    self.logger.error("Nginx container not found")
+                    return
+
+                # Send SIGHUP to nginx master process (PID 1 in the container)
+                self.docker_client.kill(container_id, "SIGHUP")
+            except (OSError, DockerAPIError) as e:
+                # A container that is restarting (409) loads the new configuration when it comes back
+                self.logger.error("Failed to reload Nginx configuration: %s", e)
+                return
+            self.logger.info("Nginx configuration reloaded successfully")
+            return
+
         try:
             # Get the nginx container ID
-            result = subprocess.run(
+            result = instrumentation.run(
                 ["docker", "compose", "-f", str(self.docker_compose_path), "ps", "-q", "nginx"],
                 capture_output=True,
                 text=True,
@@ -94,7 +121,7 @@ class NginxDockerManager(NginxManager):
                 return
 
             # Send SIGHUP to nginx master process
-            subprocess.run(["docker", "exec", container_id, "nginx", "-s", "reload"], check=True)
+            instrumentation.run(["docker", "exec", container_id, "nginx", "-s", "reload"], check=True)
             self.logger.info("Nginx configuration reloaded successfully")
         except subprocess.CalledProcessError as e:
             self.logger.error("Failed to reload Nginx configuration: %s", e)
@@ -102,8 +129,11 @@ class NginxDockerManager(NginxManager):
 
     def is_running(self) -> bool:
         """Check if Nginx Docker service is running."""
+        if self.docker_client.available:
+            return self._container_id() is not None
+
         try:
-            result = subprocess.run(
+            result = instrumentation.run(
                 ["docker", "compose", "-f", str(self.docker_compose_path), "ps", "-q", "nginx"],
                 capture_output=True,
                 text=True,
@@ -114,36 +144,60 @@ class NginxDockerManager(NginxManager):
         except subprocess.CalledProcessError:
             return False
 
-    def generate_site_config(self, site: Dict[str, Any], config_generator) -> None:
-        """Generate configuration for a single site."""
+    def proxy_path(self, path: Path) -> Optional[str]:
+        """Get the path under which the proxy sees a host path, through the web path mounted at /var/www."""
+        try:
+            relative_path = path.relative_to(self.template_vars["WEB_PATH"])
+        except ValueError:
+            self.logger.warning("%s is outside the web path mounted in the proxy, proxying its files", path)
+            return None
+        return (Path("/var/www") / relative_path).as_posix()
+
+    def generate_site_config(self, site: Dict[str, Any], config_generator) -> str:
+        """Generate configuration for a single site, writing it only if its content changed."""
         site_config_path = self.sites_available_path / site["name"]
-        with site_config_path.open("w") as fp:
-            site_template_vars = self.template_vars.copy()
-            site_template_vars.update(site)
-            config = config_generator.render_nginx_config(site, site_template_vars)
-            fp.write(config)
-
-        self.logger.info("Generated nginx config for %s", site["name"])
-
-    def generate_main_config(self, sites: List[Dict[str, Any]], config_generator) -> None:
-        """Generate main Nginx configuration and update docker-compose.yml."""
-        # Update docker-compose.yml to include nginx service
-        pass
-
-    def enable_site(self, site_name: str) -> None:
-        """Enable a site configuration by creating a symlink."""
+        site_template_vars = self.template_vars.copy()
+        site_template_vars.update(site)
+        site_template_vars["SITE_ROOT"] = self.static_root(site)
+        config = config_generator.render_nginx_config(site, site_template_vars)
+        status = write_if_changed(site_config_path, config)
+
+        if status != "unchanged":
+            self.logger.info("Generated nginx config for %s (%s)", site["name"], status)
+        return status
+
+    def generate_main_config(self, sites: List[Dict[str, Any]], config_generator) -> str:
+        """Generate the shared configuration included before the sites, writing it only if its content changed."""
+        main_config_path = self.sites_available_path / MAIN_CONFIG_NAME
+        config = config_generator.render_nginx_main_config(sites, self.template_vars)
+        status = write_if_changed(main_config_path, config)
+        if self.enable_site(MAIN_CONFIG_NAME) and status == "unchanged":
+            status = "added"
+
+        if status != "unchanged":
+            self.logger.info("Generated shared nginx config (%s)", status)
+        return status
+
+    def enable_site(self, site_name: str) -> bool:
+        """Enable a site configuration by creating a symlink, leaving a correct symlink untouched."""
         available_path = self.sites_available_path / site_name
         enabled_path = self.sites_enabled_path / site_name
 
         if not available_path.exists():
             self.logger.error("Site configuration not found: %s", available_path)
-            return
+            return False
 
-        if enabled_path.exists():
-            enabled_path.unlink()
+        if enabled_path.is_symlink() and os.readlink(enabled_path) == str(available_path):
+            return False
 
-        enabled_path.symlink_to(available_path)
+        # Swap the symlink in atomically so nginx never sees the site missing
+        tmp_path = enabled_path.with_name(f".{site_name}.tmp")
+        if tmp_path.is_symlink():
+            tmp_path.unlink()
+        tmp_path.symlink_to(available_path)
+        os.replace(tmp_path, enabled_path)
         self.logger.info("Enabled site: %s", site_name)
+        return True
 
     def disable_site(self, site_name: str) -> None:
         """Disable a site configuration by removing the symlink."""
@@ -152,9 +206,13 @@ class NginxDockerManager(NginxManager):
             enabled_path.unlink()
             self.logger.info("Disabled site: %s", site_name)
 
-    def cleanup_sites(self) -> None:
-        """Clean up existing site configurations."""
+    def cleanup_sites(self, keep: Optional[Iterable[str]] = None) -> int:
+        """Disable enabled sites that are not in keep, returning the number of sites disabled."""
+        keep = set(keep or ())
+        removed = 0
         for site_enabled in self.sites_enabled_path.glob("*"):
-            if site_enabled.is_symlink():
+            if site_enabled.is_symlink() and site_enabled.name not in keep:
                 site_enabled.unlink()
-        self.logger.info("Cleaned up existing site configurations")
+                removed += 1
+                self.logger.info("Disabled site: %s", site_enabled.name)
+        return removed
@@ -1,8 +1,14 @@
 """Abstract base class for Nginx management."""
 
+import configparser
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from ..utils import instrumentation
+
+# Name of the shared configuration file, sorted before the site configurations so its zones are defined first
+MAIN_CONFIG_NAME = "000-site-builder"
 
 
 class NginxManager(ABC):
@@ -46,18 +52,26 @@ class NginxManager(ABC):
         pass
 
     @abstractmethod
-    def generate_site_config(self, site: Dict[str, Any], config_generator) -> None:
-        """Generate configuration for a single site."""
+    def generate_site_config(self, site: Dict[str, Any], config_generator) -> str:
+        """Generate configuration for a single site.
+
+        Returns:
+            "added", "changed" or "unchanged" depending on the effect on the config file
+        """
         pass
 
     @abstractmethod
-    def generate_main_config(self, sites: List[Dict[str, Any]], config_generator) -> None:
-        """Generate main Nginx configuration."""
+    def generate_main_config(self, sites: List[Dict[str, Any]], config_generator) -> str:
+        """Generate the shared Nginx configuration, such as the proxy cache zone, and enable it.
+
+        Returns:
+            "added", "changed" or "unchanged" depending on the effect on the config file
+        """
         pass
 
     @abstractmethod
-    def enable_site(self, site_name: str) -> None:
-        """Enable a site configuration."""
+    def enable_site(self, site_name: str) -> bool:
+        """Enable a site configuration, returning True if the enabled set changed."""
         pass
 
     @abstractmethod
@@ -66,6 +80,50 @@ class NginxManager(ABC):
         pass
 
     @abstractmethod
-    def cleanup_sites(self) -> None:
-        """Clean up existing site configurations."""
+    def cleanup_sites(self, keep: Optional[Iterable[str]] = None) -> int:
+        """Disable enabled sites that are not in keep, returning the number of sites disabled."""
+        pass
+
+    @abstractmethod
+    def proxy_path(self, path: Path) -> Optional[str]:
+        """Get the path under which the proxy sees a host path, or None if it cannot read it."""
         pass
+
+    def static_root(self, site: Dict[str, Any]) -> Optional[str]:
+        """Get the directory the proxy serves the static files of a site from, or None to proxy them."""
+        enabled = site["settings"]["static"]["enabled"].strip().lower()
+        if enabled == "auto":
+            serve_static = "php" in site["runtime"]["name"]
+        else:
+            serve_static = configparser.ConfigParser.BOOLEAN_STATES.get(enabled, False)
+        return self.proxy_path(Path(site["web_root"])) if serve_static else None
+
+    def sync_sites(
+        self, sites: List[Dict[str, Any]], config_generator, names: Optional[Set[str]] = None
+    ) -> Dict[str, int]:
+        """Bring the site configurations in line with the discovered sites.
+
+        Rendered configurations are only written when their content changed, enabled sites
+        are reconciled instead of being recreated, and sites that disappeared are disabled.
+
+        Args:
+            sites: All discovered sites
+            config_generator: Generator rendering the site configurations
+            names: Names of the only sites to render again, the others count as unchanged (all if None)
+
+        Returns:
+            Number of sites added, changed, removed and left unchanged
+        """
+        summary = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        for site in sites:
+            if names is not None and site["name"] not in names:
+                summary["unchanged"] += 1
+                continue
+            with instrumentation.site_timer("nginx", site["name"]):
+                status = self.generate_site_config(site, config_generator)
+                if self.enable_site(site["name"]) and status == "unchanged":
+                    status = "added"
+            summary[status] += 1
+
+        summary["removed"] = self.cleanup_sites(keep=[MAIN_CONFIG_NAME] + [site["name"] for site in sites])
+        return summary
@@ -1,14 +1,16 @@
 """Native Nginx service management."""
 
 import logging
+import os
 import shutil
 import subprocess
 from functools import cached_property
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 from ..pkgs import PKGsManager
-from .nginx_manager import NginxManager
+from ..utils import instrumentation, write_if_changed
+from .nginx_manager import MAIN_CONFIG_NAME, NginxManager
 
 
 class NginxNativeManager(NginxManager):
@@ -51,7 +53,7 @@ class NginxNativeManager(NginxManager):
 
         # Enable nginx service
         try:
-            subprocess.run(["systemctl", "enable", "nginx"], check=True)
+            instrumentation.run(["systemctl", "enable", "nginx"], check=True)
         except subprocess.CalledProcessError:
             self.logger.warning("Could not enable nginx service via systemctl")
 
@@ -68,12 +70,12 @@ class NginxNativeManager(NginxManager):
         """Start the native Nginx service."""
         try:
             # Try systemctl first
-            subprocess.run(["systemctl", "start", "nginx"], check=True)
+            instrumentation.run(["systemctl", "start", "nginx"], check=True)
             self.logger.info("Nginx service started via systemctl")
         except subprocess.CalledProcessError:
             try:
                 # Fallback to service command
-                subprocess.run(["service", "nginx", "start"], check=True)
+                instrumentation.run(["service", "nginx", "start"], check=True)
                 self.logger.info("Nginx service started via service command")
             except subprocess.CalledProcessError as e:
                 self.logger.error("Failed to start Nginx service: %s", e)
@@ -83,12 +85,12 @@ class NginxNativeManager(NginxManager):
         """Stop the native Nginx service."""
         try:
             # Try systemctl first
-            subprocess.run(["systemctl", "stop", "nginx"], check=True)
+            instrumentation.run(["systemctl", "stop", "nginx"], check=True)
             self.logger.info("Nginx service stopped via systemctl")
         except subprocess.CalledProcessError:
             try:
                 # Fallback to service command
-                subprocess.run(["service", "nginx", "stop"], check=True)
+                instrumentation.run(["service", "nginx", "stop"], check=True)
                 self.logger.info("Nginx service stopped via service command")
             except subprocess.CalledProcessError as e:
                 self.logger.error("Failed to stop Nginx service: %s", e)
@@ -98,11 +100,11 @@ class NginxNativeManager(NginxManager):
         """Reload Nginx configuration without downtime using SIGHUP."""
         try:
             # First, test configuration
-            subprocess.run(["nginx", "-t"], check=True)
+            instrumentation.run(["nginx", "-t"], check=True)
 
             # Try systemctl reload first
             try:
-                subprocess.run(["systemctl", "reload", "nginx"], check=True)
+                instrumentation.run(["systemctl", "reload", "nginx"], check=True)
                 self.logger.info("Nginx configuration reloaded via systemctl")
                 return
             except subprocess.CalledProcessError:
@@ -110,7 +112,7 @@ class NginxNativeManager(NginxManager):
 
             # Fallback to service command
             try:
-                subprocess.run(["service", "nginx", "reload"], check=True)
+                instrumentation.run(["service", "nginx", "reload"], check=True)
                 self.logger.info("Nginx configuration reloaded via service command")
                 return
             except subprocess.CalledProcessError:
@@ -119,7 +121,7 @@ class NginxNativeManager(NginxManager):
             # Fallback to SIGHUP signal
             nginx_pid = self._get_nginx_master_pid()
             if nginx_pid:
-                subprocess.run(["kill", "-HUP", str(nginx_pid)], check=True)
+                instrumentation.run(["kill", "-HUP", str(nginx_pid)], check=True)
                 self.logger.info("Nginx configuration reloaded via SIGHUP signal")
             else:
                 raise RuntimeError("Could not find nginx master process")
@@ -132,7 +134,7 @@ class NginxNativeManager(NginxManager):
         """Check if native Nginx service is running."""
         try:
             # Try systemctl first
-            result = subprocess.run(["systemctl", "is-active", "nginx"], capture_output=True, text=True)
+            result = instrumentation.run(["systemctl", "is-active", "nginx"], capture_output=True, text=True)
             if result.returncode == 0 and result.stdout.strip() == "active":
                 return True
         except subprocess.CalledProcessError:
@@ -141,37 +143,55 @@ class NginxNativeManager(NginxManager):
         # Fallback to checking process
         return self._get_nginx_master_pid() is not None
 
-    def generate_site_config(self, site: Dict[str, Any], config_generator) -> None:
-        """Generate configuration for a single site."""
+    def proxy_path(self, path: Path) -> Optional[str]:
+        """Get the path under which the proxy sees a host path; native nginx reads the host paths directly."""
+        return path.as_posix()
+
+    def generate_site_config(self, site: Dict[str, Any], config_generator) -> str:
+        """Generate configuration for a single site, writing it only if its content changed."""
         site_config_path = self.nginx_config_path / site["name"]
-        with site_config_path.open("w") as fp:
-            site_template_vars = self.template_vars.copy()
-            site_template_vars.update(site)
-            config = config_generator.render_nginx_config(site, site_template_vars)
-            fp.write(config)
-
-        self.logger.info("Generated nginx config for %s", site["name"])
-
-    def generate_main_config(self, sites: List[Dict[str, Any]], config_generator) -> None:
-        """Generate main Nginx configuration (no additional main config needed for native)."""
-        # For native nginx, individual site configs are sufficient
-        # The main nginx.conf is managed by the system
-        pass
-
-    def enable_site(self, site_name: str) -> None:
-        """Enable a site configuration by creating a symlink."""
+        site_template_vars = self.template_vars.copy()
+        site_template_vars.update(site)
+        site_template_vars["SITE_ROOT"] = self.static_root(site)
+        config = config_generator.render_nginx_config(site, site_template_vars)
+        status = write_if_changed(site_config_path, config)
+
+        if status != "unchanged":
+            self.logger.info("Generated nginx config for %s (%s)", site["name"], status)
+        return status
+
+    def generate_main_config(self, sites: List[Dict[str, Any]], config_generator) -> str:
+        """Generate the shared configuration included before the sites, writing it only if its content changed."""
+        main_config_path = self.nginx_config_path / MAIN_CONFIG_NAME
+        config = config_generator.render_nginx_main_config(sites, self.template_vars)
+        status = write_if_changed(main_config_path, config)
+        if self.enable_site(MAIN_CONFIG_NAME) and status == "unchanged":
+            status = "added"
+
+        if status != "unchanged":
+            self.logger.info("Generated shared nginx config (%s)", status)
+        return status
+
+    def enable_site(self, site_name: str) -> bool:
+        """Enable a site configuration by creating a symlink, leaving a correct symlink untouched."""
         available_path = self.nginx_config_path / site_name
         enabled_path = self.nginx_enabled_path / site_name
 
         if not available_path.exists():
             self.logger.error("Site configuration not found: %s", available_path)
-            return
+            return False
 
-        if enabled_path.exists():
-            enabled_path.unlink()
+        if enabled_path.is_symlink() and os.readlink(enabled_path) == str(available_path):
+            return False
 
-        enabled_path.symlink_to(available_path)
+        # Swap the symlink in atomically so nginx never sees the site missing
+        tmp_path = enabled_path.with_name(f".{site_name}.tmp")
+        if tmp_path.is_symlink():
+            tmp_path.unlink()
+        tmp_path.symlink_to(available_path)
+        os.replace(tmp_path, enabled_path)
         self.logger.info("Enabled site: %s", site_name)
+        return True
 
     def disable_site(self, site_name: str) -> None:
         """Disable a site configuration by removing the symlink."""
@@ -180,18 +200,22 @@ class NginxNativeManager(NginxManager):
             enabled_path.unlink()
             self.logger.info("Disabled site: %s", site_name)
 
-    def cleanup_sites(self) -> None:
-        """Clean up existing site configurations."""
+    def cleanup_sites(self, keep: Optional[Iterable[str]] = None) -> int:
+        """Disable enabled sites that are not in keep, returning the number of sites disabled."""
+        keep = set(keep or ())
+        removed = 0
         for site_enabled in self.nginx_enabled_path.glob("*"):
-            if site_enabled.is_symlink():
+            if site_enabled.is_symlink() and site_enabled.name not in keep:
                 site_enabled.unlink()
-        self.logger.info("Cleaned up existing site configurations")
+                removed += 1
+                self.logger.info("Disabled site: %s", site_enabled.name)
+        return removed
 
     def _get_nginx_master_pid(self) -> Optional[int]:
         """Get the PID of the nginx master process."""
         try:
             # Use ps command to find nginx master process
-            result = subprocess.run(["ps", "aux"], capture_output=True, text=True, check=True)
+            result = instrumentation.run(["ps", "aux"], capture_output=True, text=True, check=True)
 
             for line in result.stdout.split("\n"):
                 if "nginx: master process" in line:
@@ -0,0 +1,42 @@
+"""Maintenance of the proxy cache shared by the sites."""
+
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# The cache key is stored in the header of every cache file, well within the first block
+HEADER_SIZE = 4096
+
+
+def cache_key_prefix(site_name: str) -> bytes:
+    """Get the start of the cache keys of a site, as rendered by nginx.conf.tpl."""
+    return f"\nKEY: {site_name}|".encode()
+
+
+def purge_site_cache(cache_path: Path, site_name: str) -> int:
+    """Remove the cached responses of a single site from the shared proxy cache.
+
+    Cache files are matched by the key stored in their header, so the other sites sharing
+    the zone keep their entries. Nginx treats a removed file as a cache miss.
+
+    Returns:
+        The number of cache files removed
+    """
+    prefix = cache_key_prefix(site_name)
+    removed = 0
+    for directory, _, files in os.walk(cache_path):
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                with open(path, "rb") as fp:
+                    if prefix not in fp.read(HEADER_SIZE):
+                        continue
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                # Evicted or refreshed by nginx meanwhile
+                continue
+    logger.info("Purged %d cached responses of %s from %s", removed, site_name, cache_path)
+    return removed
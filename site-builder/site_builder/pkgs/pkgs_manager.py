@@ -6,6 +6,8 @@ import subprocess
 from functools import cached_property
 from typing import Optional
 
+from ..utils import instrumentation
+
 
 class PKGsManager:
     def __init__(self):
@@ -26,17 +28,17 @@ class PKGsManager:
 
     def _update_package_list(self) -> None:
         if self.is_debian_based:
-            subprocess.run(["apt-get", "update"], check=True)
+            instrumentation.run(["apt-get", "update"], check=True)
         elif self.is_redhat_based:
-            subprocess.run(["dnf", "makecache"], check=True)
+            instrumentation.run(["dnf", "makecache"], check=True)
         else:
             raise EnvironmentError("Unsupported package manager. Please update packages manually.")
 
     def _install_packages(self, packages: list) -> None:
         if self.is_debian_based:
-            subprocess.run(["apt-get", "install", "-y"] + packages, check=True)
+            instrumentation.run(["apt-get", "install", "-y"] + packages, check=True)
         elif self.is_redhat_based:
-            subprocess.run(["dnf", "install", "-y"] + packages, check=True)
+            instrumentation.run(["dnf", "install", "-y"] + packages, check=True)
         else:
             raise EnvironmentError("Unsupported package manager. Please install packages manually.")
 
@@ -71,12 +73,14 @@ class PKGsManager:
         sources_list_path = f"/etc/apt/sources.list.d/{repo_name}.list"
         self.logger.info("Adding APT repository to %s", sources_list_path)
 
-        subprocess.run(["tee", sources_list_path], input=repo_line, text=True, check=True, stdout=subprocess.DEVNULL)
+        instrumentation.run(
+            ["tee", sources_list_path], input=repo_line, text=True, check=True, stdout=subprocess.DEVNULL
+        )
 
     def _add_dnf_repository(self, repo_url: str) -> None:
         """Add a DNF repository on RedHat-based systems."""
         self.logger.info("Adding DNF repository: %s", repo_url)
-        subprocess.run(["dnf", "config-manager", "--add-repo", repo_url], check=True)
+        instrumentation.run(["dnf", "config-manager", "--add-repo", repo_url], check=True)
 
     def setup_apt_gpg_key(self, gpg_key_content: bytes, key_path: str) -> None:
         """Set up a GPG key for APT repositories on Debian-based systems."""
@@ -84,13 +88,13 @@ class PKGsManager:
             raise EnvironmentError("GPG key setup is only supported on Debian-based systems")
 
         # Create keyring directory if it doesn't exist
-        subprocess.run(["install", "-m", "0755", "-d", "/etc/apt/keyrings"], check=True)
+        instrumentation.run(["install", "-m", "0755", "-d", "/etc/apt/keyrings"], check=True)
 
         # Write the GPG key
         with open(key_path, "wb") as f:
             f.write(gpg_key_content)
 
         # Set proper permissions
-        subprocess.run(["chmod", "a+r", key_path], check=True)
+        instrumentation.run(["chmod", "a+r", key_path], check=True)
 
         self.logger.info("GPG key installed at %s", key_path)
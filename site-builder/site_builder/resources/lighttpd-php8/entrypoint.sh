@@ -6,8 +6,24 @@ set -eu
 : "${SSL_CERT:=/var/ssl/www/client.pem}"
 : "${SSL_KEY:=/var/ssl/www/client.key}"
 : "${SSL_ROOT_CA:=/var/ssl/root/ca.crt}"
+: "${PHP_FPM_STATUS_PATH:=/fpm-status}"
+: "${PHP_FPM_PING_PATH:=/fpm-ping}"
+: "${PHP_FPM_STATUS_ALLOW:=127.0.0.1}"
+: "${UPSTREAM_MODE:=tcp}"
+: "${APP_SOCKET_DIR:=/run/app}"
 
-export PHP_FPM_PORT SSL_CERT SSL_KEY SSL_ROOT_CA
+# PHP-FPM listens on a unix socket in the shared tmpfs, or on loopback TCP
+if [ "$UPSTREAM_MODE" = "socket" ]; then
+  mkdir -p "$APP_SOCKET_DIR"
+  PHP_FPM_LISTEN="$APP_SOCKET_DIR/php-fpm.sock"
+  PHP_FPM_BACKEND="\"socket\" => \"$PHP_FPM_LISTEN\""
+else
+  PHP_FPM_LISTEN="127.0.0.1:$PHP_FPM_PORT"
+  PHP_FPM_BACKEND="\"host\" => \"127.0.0.1\", \"port\" => $PHP_FPM_PORT"
+fi
+
+export PHP_FPM_PORT SSL_CERT SSL_KEY SSL_ROOT_CA PHP_FPM_STATUS_PATH PHP_FPM_PING_PATH PHP_FPM_STATUS_ALLOW \
+  PHP_FPM_LISTEN PHP_FPM_BACKEND
 
 # Quick sanity checks
 if [ ! -f "$SSL_CERT" ] || [ ! -f "$SSL_KEY" ] || [ ! -f "$SSL_ROOT_CA" ]; then
@@ -20,10 +36,48 @@ fi
 
 # Render lighttpd config from template using env vars
 echo "Rendering Lighttpd config..."
-envsubst '$PHP_FPM_PORT $SSL_CERT $SSL_KEY $SSL_ROOT_CA' \
+envsubst '$PHP_FPM_BACKEND $SSL_CERT $SSL_KEY $SSL_ROOT_CA $PHP_FPM_STATUS_PATH $PHP_FPM_PING_PATH $PHP_FPM_STATUS_ALLOW' \
   < /etc/lighttpd/templates/lighttpd.conf \
   > /etc/lighttpd/lighttpd.conf
 
+# Render the OPcache settings; production mode checks scripts for changes every PHP_OPCACHE_REVALIDATE_FREQ
+# seconds (-1 for never, resetting the cache with opcache-reset.sh), development on every request
+: "${PHP_MODE:=production}"
+: "${PHP_OPCACHE_MEMORY:=128}"
+: "${PHP_OPCACHE_INTERNED_STRINGS:=16}"
+: "${PHP_OPCACHE_MAX_FILES:=20000}"
+: "${PHP_OPCACHE_REVALIDATE_FREQ:=2}"
+: "${PHP_OPCACHE_JIT:=off}"
+: "${PHP_OPCACHE_PRELOAD:=}"
+
+PHP_OPCACHE_VALIDATE_TIMESTAMPS=1
+if [ "$PHP_MODE" = "development" ]; then
+  PHP_OPCACHE_REVALIDATE_FREQ=0
+elif [ "$PHP_OPCACHE_REVALIDATE_FREQ" -lt 0 ]; then
+  PHP_OPCACHE_VALIDATE_TIMESTAMPS=0
+  PHP_OPCACHE_REVALIDATE_FREQ=0
+fi
+case "$PHP_OPCACHE_JIT" in
+  off | disable) : "${PHP_OPCACHE_JIT_BUFFER_SIZE:=0}" ;;
+  *) : "${PHP_OPCACHE_JIT_BUFFER_SIZE:=64M}" ;;
+esac
+if [ -n "$PHP_OPCACHE_PRELOAD" ] && [ ! -f "$PHP_OPCACHE_PRELOAD" ]; then
+  # PHP-FPM refuses to start with a missing preload script
+  echo "WARNING: preload script $PHP_OPCACHE_PRELOAD not found, preloading disabled"
+  PHP_OPCACHE_PRELOAD=""
+fi
+
+export PHP_OPCACHE_MEMORY PHP_OPCACHE_INTERNED_STRINGS PHP_OPCACHE_MAX_FILES PHP_OPCACHE_VALIDATE_TIMESTAMPS \
+  PHP_OPCACHE_REVALIDATE_FREQ PHP_OPCACHE_JIT PHP_OPCACHE_JIT_BUFFER_SIZE PHP_OPCACHE_PRELOAD
+
+echo "Rendering OPcache config ($PHP_MODE)..."
+envsubst '$PHP_OPCACHE_MEMORY $PHP_OPCACHE_INTERNED_STRINGS $PHP_OPCACHE_MAX_FILES $PHP_OPCACHE_VALIDATE_TIMESTAMPS $PHP_OPCACHE_REVALIDATE_FREQ $PHP_OPCACHE_JIT $PHP_OPCACHE_JIT_BUFFER_SIZE $PHP_OPCACHE_PRELOAD' \
+  < /etc/php83/templates/opcache.ini \
+  > /etc/php83/conf.d/99-opcache.ini
+
+# Size the PHP-FPM pool to the container's CPU and memory limits
+sh /usr/local/bin/fpm-pool.sh
+
 # Start PHP-FPM (background)
 echo "Starting PHP-FPM..."
 php-fpm83 -D
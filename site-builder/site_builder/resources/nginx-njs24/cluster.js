@@ -0,0 +1,115 @@
+// Cluster supervisor running the app in several worker processes sharing its listening socket.
+// Usage: node cluster.js MAIN_FILE
+//
+// NODE_WORKERS          number of workers (default: 1)
+// NODE_MAX_REQUESTS     recycle a worker after this many requests (0 = never)
+// NODE_MAX_MEMORY       recycle a worker whose resident memory exceeds this many MiB (0 = never)
+// NODE_GRACEFUL_TIMEOUT seconds a recycled worker may take to finish its requests (default: 30)
+//
+// A worker is recycled by starting its replacement first and disconnecting it once the replacement
+// listens, so the app keeps serving. Workers that die are restarted.
+"use strict";
+
+const cluster = require("node:cluster");
+const path = require("node:path");
+const { pathToFileURL } = require("node:url");
+
+const workers = Math.max(1, parseInt(process.env.NODE_WORKERS || "1", 10) || 1);
+const maxRequests = parseInt(process.env.NODE_MAX_REQUESTS || "0", 10) || 0;
+const maxMemory = (parseInt(process.env.NODE_MAX_MEMORY || "0", 10) || 0) * 1024 * 1024;
+const gracefulTimeout = (parseInt(process.env.NODE_GRACEFUL_TIMEOUT || "30", 10) || 30) * 1000;
+
+if (cluster.isPrimary) {
+  const mainFile = process.argv[2];
+  if (!mainFile) {
+    console.error("Usage: node cluster.js MAIN_FILE");
+    process.exit(1);
+  }
+  cluster.setupPrimary({ args: [mainFile] });
+
+  // The primary creates the listening socket, again whenever a worker starts after all of them died,
+  // so its umask lets the nginx workers connect to a unix socket. The workers get the original umask back.
+  const umask = process.umask(0o111);
+  const fork = () => cluster.fork({ CLUSTER_UMASK: String(umask) });
+
+  let stopping = false;
+  const recycling = new Set();
+
+  const recycle = (worker, reason) => {
+    if (stopping || recycling.has(worker.id)) {
+      return;
+    }
+    recycling.add(worker.id);
+    console.log(`Recycling worker ${worker.process.pid} (${reason})`);
+    const replacement = fork();
+    replacement.once("listening", () => {
+      worker.disconnect();
+      setTimeout(() => worker.kill(), gracefulTimeout).unref();
+    });
+  };
+
+  cluster.on("message", (worker, message) => {
+    if (message && message.cmd === "recycle") {
+      recycle(worker, message.reason);
+    }
+  });
+
+  cluster.on("exit", (worker, code, signal) => {
+    if (recycling.delete(worker.id) || stopping) {
+      return;
+    }
+    console.error(`Worker ${worker.process.pid} died (${signal || code}), restarting`);
+    setTimeout(fork, 1000);
+  });
+
+  const stop = () => {
+    stopping = true;
+    for (const worker of Object.values(cluster.workers)) {
+      worker.disconnect();
+    }
+    setTimeout(() => process.exit(0), gracefulTimeout).unref();
+  };
+  process.on("SIGTERM", stop);
+  process.on("SIGINT", stop);
+
+  console.log(`Starting ${workers} Node.js workers for ${mainFile}`);
+  for (let i = 0; i < workers; i++) {
+    fork();
+  }
+} else {
+  process.umask(parseInt(process.env.CLUSTER_UMASK, 10));
+
+  let requests = 0;
+  let recycleRequested = false;
+  const requestRecycle = (reason) => {
+    if (!recycleRequested) {
+      recycleRequested = true;
+      process.send({ cmd: "recycle", reason });
+    }
+  };
+
+  if (maxRequests > 0) {
+    // Counts the requests of every HTTP server of the app without touching its code
+    require("node:diagnostics_channel").subscribe("http.server.request.start", () => {
+      requests += 1;
+      if (requests >= maxRequests) {
+        requestRecycle(`${requests} requests`);
+      }
+    });
+  }
+
+  if (maxMemory > 0) {
+    setInterval(() => {
+      const rss = process.memoryUsage.rss();
+      if (rss > maxMemory) {
+        requestRecycle(`${Math.round(rss / 1048576)}M resident memory`);
+      }
+    }, 10000).unref();
+  }
+
+  // Loads both CommonJS and ES module apps
+  import(pathToFileURL(path.resolve(process.argv[2])).href).catch((err) => {
+    console.error(err);
+    process.exit(1);
+  });
+}
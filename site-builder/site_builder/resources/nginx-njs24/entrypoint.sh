@@ -4,6 +4,12 @@ set -eu
 # Default environment variables
 : "${NODE_PORT:=3000}"
 : "${NODE_ENV:=production}"
+: "${UPSTREAM_MODE:=tcp}"
+: "${APP_SOCKET_DIR:=/run/app}"
+: "${NODE_SOCKET_WAIT:=10}"
+: "${NODE_WORKERS:=${APP_WORKERS:-auto}}"
+: "${NODE_MAX_REQUESTS:=${APP_MAX_REQUESTS:-0}}"
+: "${NODE_MAX_MEMORY:=${APP_MAX_MEMORY:-0}}"
 : "${SSL_CERT:=/var/ssl/www/client.pem}"
 : "${SSL_KEY:=/var/ssl/www/client.key}"
 : "${SSL_ROOT_CA:=/var/ssl/root/ca.crt}"
@@ -19,12 +25,6 @@ if [ ! -f "${SSL_CERT}" ] || [ ! -f "${SSL_KEY}" ] || [ ! -f "${SSL_ROOT_CA}" ];
   exit 1
 fi
 
-# Render nginx config from template using env vars
-echo "Rendering Nginx config..."
-envsubst '\$NODE_PORT \$SSL_CERT \$SSL_KEY \$SSL_ROOT_CA' \
-  < /etc/nginx/templates/nginx.conf \
-  > /etc/nginx/nginx.conf
-
 # Change to app directory
 cd /var/www
 
@@ -39,23 +39,34 @@ if [ ! -f "index.ts" ]; then
   exit 1
 fi
 
-# Handle Node.js dependencies
-echo "Installing Node.js dependencies..."
-
-# Configure npm to use .node_modules instead of node_modules
-npm config set modules-folder .node_modules
-
-# Check if .node_modules exists and is populated
-if [ -d "/var/www/.node_modules" ] && [ "$(ls -A /var/www/.node_modules 2>/dev/null)" ]; then
-    echo "Using existing .node_modules in /var/www/.node_modules"
-    # Still run npm install in case package.json changed
-    npm install --production=false || echo "Warning: npm install encountered issues, continuing..."
-else
-    echo "Installing dependencies to /var/www/.node_modules"
-    npm install --production=false || {
+# Handle Node.js dependencies, installed only when package.json, package-lock.json (or the Node.js
+# version) changed since the last successful install; npm reuses the shared cache in npm_config_cache
+deps_hash() {
+    { node --version; cat package.json; cat package-lock.json 2>/dev/null || true; } | sha256sum | cut -d' ' -f1
+}
+deps_stamp=node_modules/.site-builder-deps.sha256
+mkdir -p node_modules
+
+if [ "$(cat "${deps_stamp}" 2>/dev/null || true)" = "$(deps_hash)" ]; then
+    echo "Node.js dependencies unchanged, skipping install"
+elif [ -f package-lock.json ]; then
+    echo "Installing Node.js dependencies with npm ci..."
+    npm ci --include=dev || {
         echo "ERROR: Failed to install npm dependencies"
         exit 1
     }
+    deps_hash > "${deps_stamp}"
+else
+    echo "Installing Node.js dependencies..."
+    if npm install --include=dev; then
+        # Hashed after the install, which writes package-lock.json
+        deps_hash > "${deps_stamp}"
+    elif [ -f "${deps_stamp}" ]; then
+        echo "Warning: npm install encountered issues, continuing..."
+    else
+        echo "ERROR: Failed to install npm dependencies"
+        exit 1
+    fi
 fi
 
 # Check if TypeScript config exists, create a basic one if not
@@ -79,16 +90,31 @@ if [ ! -f "tsconfig.json" ]; then
     "sourceMap": true
   },
   "include": ["*.ts", "src/**/*"],
-  "exclude": [".node_modules", "dist"]
+  "exclude": ["node_modules", "dist"]
 }
 EOF
 fi
 
-# Compile TypeScript
-echo "Compiling TypeScript..."
-if ! tsc; then
-    echo "ERROR: TypeScript compilation failed"
-    exit 1
+# Compile TypeScript, unless the sources, tsconfig.json and dependencies are unchanged since the
+# last successful compilation (the stamp is dropped with node_modules on every reinstall)
+tsc_hash=$( {
+    tsc --version
+    cat tsconfig.json
+    find . -path ./node_modules -prune -o -path ./dist -prune -o -path './.*' -prune \
+        -o -type f \( -name '*.ts' -o -name '*.tsx' -o -name '*.mts' -o -name '*.cts' \) -print |
+        sort | xargs -r sha256sum
+} | sha256sum | cut -d' ' -f1)
+tsc_stamp=node_modules/.site-builder-tsc.sha256
+
+if [ "$(cat "${tsc_stamp}" 2>/dev/null || true)" = "${tsc_hash}" ] && { [ -f "dist/index.js" ] || [ -f "index.js" ]; }; then
+    echo "TypeScript output up to date, skipping compilation"
+else
+    echo "Compiling TypeScript..."
+    if ! tsc; then
+        echo "ERROR: TypeScript compilation failed"
+        exit 1
+    fi
+    echo "${tsc_hash}" > "${tsc_stamp}"
 fi
 
 # Determine the main entry point
@@ -101,9 +127,24 @@ else
     exit 1
 fi
 
+# In socket mode the app is asked to listen on NODE_SOCKET, in the tmpfs shared with nginx
+if [ "${UPSTREAM_MODE}" = "socket" ]; then
+    mkdir -p "${APP_SOCKET_DIR}"
+    NODE_SOCKET="${APP_SOCKET_DIR}/node.sock"
+    rm -f "${NODE_SOCKET}"
+    export NODE_SOCKET
+fi
+
+# One worker per CPU of the container's quota, recycled after NODE_MAX_REQUESTS requests or
+# past NODE_MAX_MEMORY MiB by the cluster supervisor
+if [ "${NODE_WORKERS}" = "auto" ] || [ "${NODE_WORKERS}" = "0" ]; then
+    NODE_WORKERS=$(sh /usr/local/bin/cpu-count.sh)
+fi
+export NODE_WORKERS NODE_MAX_REQUESTS NODE_MAX_MEMORY
+
 # Start Node.js application (background)
 echo "Starting Node.js application on port ${NODE_PORT}..."
-NODE_ENV="${NODE_ENV}" node "${MAIN_FILE}" &
+NODE_ENV="${NODE_ENV}" node /usr/local/lib/site-builder/cluster.js "${MAIN_FILE}" &
 
 # Wait a moment for Node.js to start
 sleep 2
@@ -114,6 +155,28 @@ if ! pgrep -f "node.*${MAIN_FILE}" > /dev/null; then
     exit 1
 fi
 
+# Apps listening on NODE_SOCKET are reached over it, the others keep being reached on NODE_PORT
+NODE_UPSTREAM="127.0.0.1:${NODE_PORT}"
+if [ -n "${NODE_SOCKET:-}" ]; then
+    waited=0
+    while [ ! -S "${NODE_SOCKET}" ] && [ "${waited}" -lt "${NODE_SOCKET_WAIT}" ]; do
+        sleep 1
+        waited=$((waited + 1))
+    done
+    if [ -S "${NODE_SOCKET}" ]; then
+        NODE_UPSTREAM="unix:${NODE_SOCKET}"
+    else
+        echo "WARNING: the application does not listen on ${NODE_SOCKET}, using port ${NODE_PORT}"
+    fi
+fi
+export NODE_UPSTREAM
+
+# Render nginx config from template using env vars
+echo "Rendering Nginx config (upstream ${NODE_UPSTREAM})..."
+envsubst '\$NODE_UPSTREAM \$SSL_CERT \$SSL_KEY \$SSL_ROOT_CA' \
+  < /etc/nginx/templates/nginx.conf \
+  > /etc/nginx/nginx.conf
+
 # Start Nginx (foreground)
 echo "Starting Nginx..."
 nginx -g 'daemon off;'
@@ -4,13 +4,41 @@ set -eu
 # Default environment variables
 : "${UVICORN_HOST:=127.0.0.1}"
 : "${UVICORN_PORT:=8000}"
-: "${UVICORN_WORKERS:=1}"
+: "${UVICORN_WORKERS:=${APP_WORKERS:-auto}}"
+: "${UVICORN_MAX_REQUESTS:=${APP_MAX_REQUESTS:-0}}"
+: "${UVICORN_MAX_MEMORY:=${APP_MAX_MEMORY:-0}}"
 : "${UVICORN_LOG_LEVEL:=warning}"
+: "${UPSTREAM_MODE:=tcp}"
+: "${APP_SOCKET_DIR:=/run/app}"
 : "${SSL_CERT:=/var/ssl/www/client.pem}"
 : "${SSL_KEY:=/var/ssl/www/client.key}"
 : "${SSL_ROOT_CA:=/var/ssl/root/ca.crt}"
 
-export UVICORN_HOST UVICORN_PORT UVICORN_WORKERS UVICORN_LOG_LEVEL SSL_CERT SSL_KEY SSL_ROOT_CA
+# Nginx reaches uvicorn over a unix socket in the shared tmpfs, or over loopback TCP;
+# the uvicorn bind options are kept in the positional parameters since sh has no arrays
+if [ "${UPSTREAM_MODE}" = "socket" ]; then
+  mkdir -p "${APP_SOCKET_DIR}"
+  UVICORN_SOCKET="${APP_SOCKET_DIR}/uvicorn.sock"
+  UVICORN_UPSTREAM="unix:${UVICORN_SOCKET}"
+  set -- --uds "${UVICORN_SOCKET}"
+else
+  UVICORN_UPSTREAM="127.0.0.1:${UVICORN_PORT}"
+  set -- --host "${UVICORN_HOST}" --port "${UVICORN_PORT}"
+fi
+
+# One worker per CPU of the container's quota, and at least two so that one keeps serving while
+# another is recycled
+if [ "${UVICORN_WORKERS}" = "auto" ] || [ "${UVICORN_WORKERS}" = "0" ]; then
+  cpus=$(sh /usr/local/bin/cpu-count.sh)
+  UVICORN_WORKERS=$(( cpus > 2 ? cpus : 2 ))
+fi
+
+# Workers exit gracefully after a number of requests, and the supervisor replaces them
+if [ "${UVICORN_MAX_REQUESTS}" -gt 0 ]; then
+  set -- "$@" --limit-max-requests "${UVICORN_MAX_REQUESTS}"
+fi
+
+export UVICORN_HOST UVICORN_PORT UVICORN_WORKERS UVICORN_LOG_LEVEL UVICORN_UPSTREAM SSL_CERT SSL_KEY SSL_ROOT_CA
 
 # Quick sanity checks
 if [ ! -f "${SSL_CERT}" ] || [ ! -f "${SSL_KEY}" ] || [ ! -f "${SSL_ROOT_CA}" ]; then
@@ -23,12 +51,12 @@ fi
 
 # Render nginx config from template using env vars
 echo "Rendering Nginx config..."
-envsubst '\$UVICORN_PORT \$SSL_CERT \$SSL_KEY \$SSL_ROOT_CA' \
+envsubst '\$UVICORN_UPSTREAM \$SSL_CERT \$SSL_KEY \$SSL_ROOT_CA' \
   < /etc/nginx/templates/nginx.conf \
   > /etc/nginx/nginx.conf
 
 # Start Uvicorn (background)
-echo "Starting Uvicorn on ${UVICORN_HOST}:${UVICORN_PORT}..."
+echo "Starting Uvicorn on ${UVICORN_UPSTREAM}..."
 cd /var/www
 # Expecting /var/www/index.py that exposes FastAPI instance as 'app'
 if [ ! -f "index.py" ]; then
@@ -36,9 +64,6 @@ if [ ! -f "index.py" ]; then
   exit 1
 fi
 
-# Check if there are requirements.txt and install dependencies
-echo "Installing Python dependencies from requirements.txt..."
-
 # As /var/www/.venv might be mounted from outside, we create venv in /var/www/.venv
 # and install dependencies there
 if [ -d "/var/www/.venv" ]; then
@@ -49,20 +74,43 @@ else
     python3 -m venv /var/www/.venv
     . /var/www/.venv/bin/activate
     python3 -m pip install --upgrade pip
+fi
+
+# Install dependencies only when requirements.txt (or the Python version the venv is tied to)
+# changed since the last successful install; pip reuses the shared wheel cache in PIP_CACHE_DIR
+deps_hash=$( { python3 --version; cat requirements.txt 2>/dev/null || echo "fastapi uvicorn[standard]"; } | sha256sum | cut -d' ' -f1)
+deps_stamp=/var/www/.venv/.requirements.sha256
+
+if [ "$(cat "${deps_stamp}" 2>/dev/null || true)" = "${deps_hash}" ]; then
+    echo "Python dependencies unchanged, skipping install"
+else
+    echo "Installing Python dependencies..."
     if [ -f "requirements.txt" ]; then
-        python3 -m pip install -r requirements.txt || true
+        python3 -m pip install -r requirements.txt && echo "${deps_hash}" > "${deps_stamp}" || true
     else
         echo "No requirements.txt found. Installing FastAPI and Uvicorn by default."
-        python3 -m pip install fastapi uvicorn[standard] || true
+        python3 -m pip install fastapi uvicorn[standard] && echo "${deps_hash}" > "${deps_stamp}" || true
     fi
 fi
 
-# Start Uvicorn with specified parameters
-uvicorn index:app \
-  --host "${UVICORN_HOST}" \
-  --port "${UVICORN_PORT}" \
-  --workers "${UVICORN_WORKERS}" \
-  --log-level "${UVICORN_LOG_LEVEL}" &
+# Start Uvicorn with specified parameters, restarting it if it exits (a single worker reaching its
+# request limit or memory ceiling exits instead of being replaced)
+echo "Starting ${UVICORN_WORKERS} Uvicorn workers..."
+while :; do
+  uvicorn index:app \
+    "$@" \
+    --workers "${UVICORN_WORKERS}" \
+    --log-level "${UVICORN_LOG_LEVEL}" &
+  echo $! > /run/uvicorn.pid
+  wait $! || true
+  echo "Uvicorn exited, restarting..."
+  sleep 1
+done &
+
+# Recycle workers growing past the memory ceiling
+if [ "${UVICORN_MAX_MEMORY}" -gt 0 ]; then
+  sh /usr/local/bin/worker-watchdog.sh /run/uvicorn.pid "${UVICORN_MAX_MEMORY}" &
+fi
 
 # Start Nginx (foreground)
 echo "Starting Nginx..."
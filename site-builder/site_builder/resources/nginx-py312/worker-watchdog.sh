@@ -0,0 +1,38 @@
+#!/bin/sh
+# Gracefully recycle uvicorn workers whose resident memory exceeds a ceiling.
+# Usage: worker-watchdog.sh PID_FILE MAX_MEMORY_MB [INTERVAL]
+#
+# The workers are the children of the uvicorn process whose PID is in PID_FILE. A worker over
+# the ceiling gets SIGTERM, so it finishes its in-flight requests before exiting, and the uvicorn
+# supervisor starts a replacement. A single worker has no children and is recycled itself, to be
+# restarted by the entrypoint.
+set -eu
+
+pid_file=$1
+max_memory_kb=$(( $2 * 1024 ))
+interval=${3:-10}
+
+rss_kb() {
+  awk '/^VmRSS:/ { print $2 }' "/proc/$1/status" 2>/dev/null || true
+}
+
+while sleep "$interval"; do
+  master=$(cat "$pid_file" 2>/dev/null || true)
+  [ -n "$master" ] || continue
+
+  workers=""
+  for stat in /proc/[0-9]*/stat; do
+    # Field 4 of /proc/PID/stat is the parent PID (the command in field 2 holds no spaces here)
+    set -- $(cat "$stat" 2>/dev/null || true)
+    [ "$#" -ge 4 ] && [ "$4" = "$master" ] && workers="$workers $1"
+  done
+  [ -n "$workers" ] || workers=$master
+
+  for worker in $workers; do
+    rss=$(rss_kb "$worker")
+    if [ -n "$rss" ] && [ "$rss" -gt "$max_memory_kb" ]; then
+      echo "Recycling uvicorn worker $worker using $(( rss / 1024 ))M (ceiling $(( max_memory_kb / 1024 ))M)"
+      kill -TERM "$worker" 2>/dev/null || true
+    fi
+  done
+done
@@ -0,0 +1,18 @@
+#!/bin/sh
+# Print the number of CPUs the container may use: cgroup v2 cpu.max, cgroup v1 CFS quota, then the CPU count
+set -eu
+
+cpus=$(nproc 2>/dev/null || echo 1)
+quota=""
+period=""
+if [ -r /sys/fs/cgroup/cpu.max ]; then
+  read -r quota period < /sys/fs/cgroup/cpu.max
+elif [ -r /sys/fs/cgroup/cpu/cpu.cfs_quota_us ] && [ -r /sys/fs/cgroup/cpu/cpu.cfs_period_us ]; then
+  quota=$(cat /sys/fs/cgroup/cpu/cpu.cfs_quota_us)
+  period=$(cat /sys/fs/cgroup/cpu/cpu.cfs_period_us)
+fi
+if [ -n "$quota" ] && [ "$quota" != "max" ] && [ "$quota" -gt 0 ] 2>/dev/null && [ "$period" -gt 0 ]; then
+  limited=$(( (quota + period - 1) / period ))
+  [ "$limited" -lt "$cpus" ] && cpus=$limited
+fi
+echo "$cpus"
@@ -0,0 +1,83 @@
+#!/bin/sh
+# Generate the PHP-FPM pool config sized to the container's cgroup CPU and memory limits.
+# Run by entrypoint.sh before starting PHP-FPM; every computed setting can be overridden with its PHP_FPM_* variable.
+set -eu
+
+: "${PHP_FPM_PORT:=9000}"
+: "${PHP_FPM_LISTEN:=127.0.0.1:${PHP_FPM_PORT}}"
+: "${PHP_FPM_POOL_CONF:=/etc/php83/php-fpm.d/www.conf}"
+: "${PHP_FPM_PM:=dynamic}"
+: "${PHP_FPM_MEMORY_PER_WORKER:=64}"
+: "${PHP_FPM_RESERVED_MEMORY:=64}"
+: "${PHP_FPM_CHILDREN_PER_CPU:=8}"
+: "${PHP_FPM_MAX_REQUESTS:=500}"
+: "${PHP_FPM_IDLE_TIMEOUT:=10s}"
+: "${PHP_FPM_STATUS_PATH:=/fpm-status}"
+: "${PHP_FPM_PING_PATH:=/fpm-ping}"
+
+# Memory available to the container in MiB: cgroup v2 memory.max, cgroup v1 limit, then the host memory
+memory_limit() {
+  memory=$(awk '/^MemTotal:/ { print int($2 / 1024) }' /proc/meminfo)
+  limit=""
+  if [ -r /sys/fs/cgroup/memory.max ]; then
+    limit=$(cat /sys/fs/cgroup/memory.max)
+  elif [ -r /sys/fs/cgroup/memory/memory.limit_in_bytes ]; then
+    limit=$(cat /sys/fs/cgroup/memory/memory.limit_in_bytes)
+  fi
+  if [ -n "$limit" ] && [ "$limit" != "max" ]; then
+    # cgroup v1 reports no limit as a huge number, so compare in awk before converting
+    memory=$(awk -v limit="$limit" -v memory="$memory" 'BEGIN { limit /= 1048576; print (limit < memory) ? int(limit) : memory }')
+  fi
+  echo "$memory"
+}
+
+min() { [ "$1" -lt "$2" ] && echo "$1" || echo "$2"; }
+max() { [ "$1" -gt "$2" ] && echo "$1" || echo "$2"; }
+
+FPM_CPUS=$(sh /usr/local/bin/cpu-count.sh)
+FPM_MEMORY=$(memory_limit)
+
+# Workers are bound by memory, and by CPU since most of them only wait on the database
+by_memory=$(( (FPM_MEMORY - PHP_FPM_RESERVED_MEMORY) / PHP_FPM_MEMORY_PER_WORKER ))
+by_cpu=$(( FPM_CPUS * PHP_FPM_CHILDREN_PER_CPU ))
+: "${PHP_FPM_MAX_CHILDREN:=$(max 2 "$(min "$by_memory" "$by_cpu")")}"
+: "${PHP_FPM_START_SERVERS:=$(min "$PHP_FPM_MAX_CHILDREN" "$(max 2 "$FPM_CPUS")")}"
+: "${PHP_FPM_MIN_SPARE_SERVERS:=$(min "$PHP_FPM_START_SERVERS" "$(max 1 $(( FPM_CPUS / 2 )))")}"
+: "${PHP_FPM_MAX_SPARE_SERVERS:=$(min "$PHP_FPM_MAX_CHILDREN" "$(max "$PHP_FPM_START_SERVERS" $(( FPM_CPUS * 2 )))")}"
+
+case "$PHP_FPM_PM" in
+  static | dynamic | ondemand) ;;
+  *)
+    echo "WARNING: unknown PHP_FPM_PM=${PHP_FPM_PM}, using dynamic"
+    PHP_FPM_PM=dynamic
+    ;;
+esac
+
+echo "PHP-FPM pool: pm=${PHP_FPM_PM} max_children=${PHP_FPM_MAX_CHILDREN} (cpus=${FPM_CPUS}, memory=${FPM_MEMORY}M)"
+
+{
+  echo "[www]"
+  echo "user = www-data"
+  echo "group = www-data"
+  echo "listen = ${PHP_FPM_LISTEN}"
+  case "$PHP_FPM_LISTEN" in
+    /*)
+      echo "listen.owner = www-data"
+      echo "listen.group = www-data"
+      echo "listen.mode = 0660"
+      ;;
+  esac
+  echo "pm = ${PHP_FPM_PM}"
+  echo "pm.max_children = ${PHP_FPM_MAX_CHILDREN}"
+  if [ "$PHP_FPM_PM" = "dynamic" ]; then
+    echo "pm.start_servers = ${PHP_FPM_START_SERVERS}"
+    echo "pm.min_spare_servers = ${PHP_FPM_MIN_SPARE_SERVERS}"
+    echo "pm.max_spare_servers = ${PHP_FPM_MAX_SPARE_SERVERS}"
+  elif [ "$PHP_FPM_PM" = "ondemand" ]; then
+    echo "pm.process_idle_timeout = ${PHP_FPM_IDLE_TIMEOUT}"
+  fi
+  echo "pm.max_requests = ${PHP_FPM_MAX_REQUESTS}"
+  echo "pm.status_path = ${PHP_FPM_STATUS_PATH}"
+  echo "ping.path = ${PHP_FPM_PING_PATH}"
+  echo "catch_workers_output = yes"
+} > "$PHP_FPM_POOL_CONF"
@@ -0,0 +1,4 @@
+<?php
+// Run inside PHP-FPM by opcache-reset.sh, since the PHP CLI has a cache of its own
+header('Content-Type: text/plain');
+echo function_exists('opcache_reset') && opcache_reset() ? "OPcache reset\n" : "OPcache disabled\n";
@@ -0,0 +1,21 @@
+#!/bin/sh
+# Reset the OPcache of the PHP-FPM workers through their FastCGI port, used by "site-builder opcache reset"
+set -eu
+
+# Connect wherever the generated pool listens, a unix socket or a loopback port
+listen=$(sed -n 's/^listen = //p' "${PHP_FPM_POOL_CONF:-/etc/php83/php-fpm.d/www.conf}")
+
+output=$(SCRIPT_NAME=/opcache-reset.php \
+  SCRIPT_FILENAME=/usr/local/share/site-builder/opcache-reset.php \
+  REQUEST_METHOD=GET \
+  cgi-fcgi -bind -connect "$listen")
+
+case "$output" in
+  *"OPcache reset"*)
+    echo "OPcache reset"
+    ;;
+  *)
+    echo "$output" >&2
+    exit 1
+    ;;
+esac
@@ -1,5 +1,7 @@
+from .certificate_inventory import CertificateInventory
 from .ssl_certificate_manager import SSLCertificateManager
 
 __all__ = [
+    "CertificateInventory",
     "SSLCertificateManager",
 ]
@@ -0,0 +1,180 @@
+"""On-disk inventory of issued certificates, so certificates are only parsed when they change."""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+
+from ..utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+def _mtime(path: Path) -> Optional[int]:
+    """Get the modification time of a file in nanoseconds, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def public_key_fingerprint(public_key) -> str:
+    """Get the SHA-256 fingerprint of a public key's SubjectPublicKeyInfo encoding."""
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return hashlib.sha256(der).hexdigest()
+
+
+class CertificateInventory:
+    """Index of certificate metadata (serial, subject, SANs, expiry, key fingerprint, file mtimes).
+
+    Entries are keyed by the certificate path relative to the inventory directory. A
+    certificate is parsed again only when its mtime differs from the recorded one, and the
+    private key is only read to verify it still matches the certificate when its mtime
+    changed.
+    """
+
+    def __init__(self, inventory_path: Path):
+        """
+        Initialize the certificate inventory.
+
+        Args:
+            inventory_path: Path to the JSON inventory file
+        """
+        self.inventory_path = inventory_path
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    @property
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        """Get the inventory entries, loading them from disk on first use."""
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            return self._entries
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Load the inventory file, starting empty if it is missing or unreadable."""
+        if not self.inventory_path.is_file():
+            return {}
+        try:
+            with self.inventory_path.open("r") as fp:
+                return json.load(fp).get("certificates", {})
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable certificate inventory %s: %s", self.inventory_path, e)
+            return {}
+
+    def _key(self, cert_path: Path) -> str:
+        """Get the inventory key of a certificate path."""
+        try:
+            return cert_path.relative_to(self.inventory_path.parent).as_posix()
+        except ValueError:
+            return cert_path.as_posix()
+
+    def record(self, cert_path: Path, certificate: x509.Certificate, key_path: Optional[Path] = None) -> Dict[str, Any]:
+        """Record a certificate that was just written or parsed."""
+        try:
+            sans = certificate.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+            dns_names = sans.get_values_for_type(x509.DNSName)
+        except x509.ExtensionNotFound:
+            dns_names = []
+
+        entry = {
+            "serial": format(certificate.serial_number, "x"),
+            "subject": certificate.subject.rfc4514_string(),
+            "sans": dns_names,
+            "not_after": certificate.not_valid_after_utc.isoformat(),
+            "key_fingerprint": public_key_fingerprint(certificate.public_key()),
+            "crt_mtime": _mtime(cert_path),
+            "key_mtime": _mtime(key_path) if key_path else None,
+            "csr_mtime": _mtime(cert_path.with_suffix(".csr")),
+        }
+        with self._lock:
+            self.entries[self._key(cert_path)] = entry
+            self._dirty = True
+        return entry
+
+    def get(self, cert_path: Path, key_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+        """Get the entry for a certificate, parsing it only if the file changed since it was indexed.
+
+        If key_path is given and the key changed since it was last verified, the key is checked
+        against the certificate. None is returned when the certificate is missing, unreadable
+        or no longer matches its key.
+        """
+        crt_mtime = _mtime(cert_path)
+        if crt_mtime is None:
+            return None
+
+        entry = self.entries.get(self._key(cert_path))
+        if entry is None or entry.get("crt_mtime") != crt_mtime:
+            try:
+                with cert_path.open("rb") as cert_file:
+                    certificate = x509.load_pem_x509_certificate(cert_file.read())
+            except (OSError, ValueError):
+                return None
+            entry = self.record(cert_path, certificate)
+
+        if key_path is not None:
+            key_mtime = _mtime(key_path)
+            if key_mtime is None:
+                return None
+            if key_mtime != entry.get("key_mtime"):
+                try:
+                    with key_path.open("rb") as key_file:
+                        private_key = serialization.load_pem_private_key(key_file.read(), password=None)
+                except (OSError, ValueError, TypeError):
+                    return None
+                if public_key_fingerprint(private_key.public_key()) != entry["key_fingerprint"]:
+                    return None
+                with self._lock:
+                    entry["key_mtime"] = key_mtime
+                    self._dirty = True
+
+        return entry
+
+    def prune(self, keep_paths: Iterable[Path]) -> int:
+        """Drop the entries of every certificate not in keep_paths, returning the number dropped."""
+        keep = {self._key(Path(path)) for path in keep_paths}
+        with self._lock:
+            stale = [key for key in self.entries if key not in keep]
+            for key in stale:
+                del self.entries[key]
+            if stale:
+                self._dirty = True
+        return len(stale)
+
+    def certificates(self, expiring_within: Optional[int] = None) -> List[Dict[str, Any]]:
+        """List the indexed certificates, soonest expiry first.
+
+        Args:
+            expiring_within: Only list certificates expiring within this many days
+        """
+        threshold = None
+        if expiring_within is not None:
+            threshold = datetime.now(timezone.utc) + timedelta(days=expiring_within)
+        certificates = [
+            dict(entry, path=path)
+            for path, entry in self.entries.items()
+            if threshold is None or datetime.fromisoformat(entry["not_after"]) <= threshold
+        ]
+        certificates.sort(key=lambda entry: entry["not_after"])
+        return certificates
+
+    def save(self) -> None:
+        """Write the inventory atomically if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self.inventory_path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(self.inventory_path, json.dumps({"certificates": self.entries}, indent=2, sort_keys=True))
+            self._dirty = False
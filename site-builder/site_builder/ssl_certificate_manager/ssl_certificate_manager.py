@@ -1,9 +1,12 @@
 """SSL certificate manager using Python cryptography library."""
 
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from functools import cached_property
 from pathlib import Path
+from typing import Any, Dict, List
 
 from cryptography import x509
 from cryptography.hazmat.primitives import serialization
@@ -11,6 +14,9 @@ from cryptography.hazmat.primitives.asymmetric import ed25519
 from cryptography.x509 import oid
 from cryptography.x509.oid import NameOID
 
+from ..utils import atomic_write, instrumentation
+from .certificate_inventory import CertificateInventory
+
 
 class SSLCertificateManager:
     """Manages SSL certificate generation and renewal using Python cryptography library."""
@@ -34,6 +40,9 @@ class SSLCertificateManager:
         self.organisation = organisation
         self._ca_key = None
         self._ca_cert = None
+        # Workers issuing certificates in parallel load (or generate) the CA once, on first use
+        self._ca_lock = threading.Lock()
+        self.inventory = CertificateInventory(proxy_ssl_path / "inventory.json")
 
     @cached_property
     def logger(self) -> logging.Logger:
@@ -143,8 +152,9 @@ class SSLCertificateManager:
 
     def _sign_certificate(self, csr: x509.CertificateSigningRequest, subdomain: str) -> x509.Certificate:
         """Sign a certificate using the CA."""
-        ca_key = self._load_ca_key()
-        ca_cert = self._load_ca_cert()
+        with self._ca_lock:
+            ca_key = self._load_ca_key()
+            ca_cert = self._load_ca_cert()
 
         # Create the certificate
         certificate = (
@@ -192,19 +202,19 @@ class SSLCertificateManager:
 
         return certificate
 
-    def _certificate_needs_renewal(self, cert_path: Path, days_before_expiry: int = 30) -> bool:
-        """Check if a certificate needs renewal based on expiration date."""
-        if not cert_path.exists():
-            return True
+    def _certificate_needs_renewal(self, cert_path: Path, days_before_expiry: int = 30, key_path: Path = None) -> bool:
+        """Check if a certificate needs renewal based on the expiration date recorded in the inventory.
+
+        The certificate is only parsed when it changed since it was indexed. If key_path is
+        given, a certificate that no longer matches its private key also needs renewal.
+        """
+        entry = self.inventory.get(cert_path, key_path)
+        if entry is None:
+            return True  # Missing, unreadable or mismatched certificates need renewal
 
-        try:
-            with cert_path.open("rb") as cert_file:
-                cert = x509.load_pem_x509_certificate(cert_file.read())
-                expiry_date = cert.not_valid_after_utc
-                renewal_threshold = datetime.now(timezone.utc) + timedelta(days=days_before_expiry)
-                return expiry_date <= renewal_threshold
-        except Exception:
-            return True  # If we can't read the cert, assume it needs renewal
+        expiry_date = datetime.fromisoformat(entry["not_after"])
+        renewal_threshold = datetime.now(timezone.utc) + timedelta(days=days_before_expiry)
+        return expiry_date <= renewal_threshold
 
     def generate_certificates(
         self,
@@ -214,8 +224,16 @@ class SSLCertificateManager:
         renew_csrs: bool = False,
         renew_crts: bool = False,
         auto_renew_days: int = 30,
-    ) -> None:
-        """Generate SSL certificates for a domain/subdomain pair."""
+    ) -> str:
+        """Generate SSL certificates for a domain/subdomain pair.
+
+        Renewal decisions come from the certificate inventory, so when nothing has to be
+        renewed no key, CSR or certificate is read from disk. The inventory is updated but
+        not saved; call inventory.save() (generate_certificates_bulk does it for you).
+
+        Returns:
+            "issued" for a first certificate, "renewed" if an existing one was replaced, "skipped" otherwise
+        """
         proxy_ssl_folder = (self.proxy_ssl_path / domain) / subdomain
         if not proxy_ssl_folder.is_dir():
             proxy_ssl_folder.mkdir(parents=True, exist_ok=True)
@@ -226,68 +244,139 @@ class SSLCertificateManager:
         proxy_ssl_crt = proxy_ssl_folder / "client.crt"
         proxy_ssl_pem = proxy_ssl_folder / "client.pem"
 
-        # Generate private key
-        private_key = None
-        if not proxy_ssl_key.is_file() or renew_keys:
+        had_certificate = proxy_ssl_crt.is_file()
+        new_key = not proxy_ssl_key.is_file() or renew_keys
+        new_csr = new_key or renew_csrs or not proxy_ssl_csr.is_file()
+        needs_cert_renewal = (
+            not had_certificate
+            or new_key
+            or renew_csrs
+            or renew_crts
+            or self._certificate_needs_renewal(proxy_ssl_crt, auto_renew_days, proxy_ssl_key)
+        )
+        needs_pem = needs_cert_renewal or not proxy_ssl_pem.is_file()
+
+        if not (new_csr or needs_pem):
+            # Everything is in place and the inventory says the certificate is still valid
+            return "skipped"
+
+        # Generate or load the private key
+        if new_key:
             private_key = self._generate_private_key()
 
             # Write private key to file
-            with proxy_ssl_key.open("wb") as key_file:
-                key_file.write(
-                    private_key.private_bytes(
-                        encoding=serialization.Encoding.PEM,
-                        format=serialization.PrivateFormat.PKCS8,
-                        encryption_algorithm=serialization.NoEncryption(),
-                    )
-                )
+            atomic_write(
+                proxy_ssl_key,
+                private_key.private_bytes(
+                    encoding=serialization.Encoding.PEM,
+                    format=serialization.PrivateFormat.PKCS8,
+                    encryption_algorithm=serialization.NoEncryption(),
+                ),
+            )
         else:
-            # Load existing private key
             with proxy_ssl_key.open("rb") as key_file:
                 private_key = serialization.load_pem_private_key(key_file.read(), password=None)
                 if not isinstance(private_key, ed25519.Ed25519PrivateKey):
                     raise TypeError("Existing private key is not an Ed25519 key")
 
-        # Generate certificate signing request
+        # Generate or load the certificate signing request
         csr = None
-        if not proxy_ssl_csr.is_file() or renew_keys or renew_csrs:
+        if new_csr:
             csr = self._create_csr(private_key, subdomain)
 
             # Write CSR to file
-            with proxy_ssl_csr.open("wb") as csr_file:
-                csr_file.write(csr.public_bytes(serialization.Encoding.PEM))
-        else:
-            # Load existing CSR
-            with proxy_ssl_csr.open("rb") as csr_file:
-                csr = x509.load_pem_x509_csr(csr_file.read())
-
-        # Generate certificate
-        needs_cert_renewal = (
-            not proxy_ssl_crt.is_file()
-            or renew_keys
-            or renew_csrs
-            or renew_crts
-            or self._certificate_needs_renewal(proxy_ssl_crt, auto_renew_days)
-        )
+            atomic_write(proxy_ssl_csr, csr.public_bytes(serialization.Encoding.PEM))
 
+        certificate_bytes = None
         if needs_cert_renewal:
+            if csr is None:
+                with proxy_ssl_csr.open("rb") as csr_file:
+                    csr = x509.load_pem_x509_csr(csr_file.read())
+
             certificate = self._sign_certificate(csr, subdomain)
+            certificate_bytes = certificate.public_bytes(serialization.Encoding.PEM)
 
-            # Write certificate to file
-            with proxy_ssl_crt.open("wb") as cert_file:
-                cert_file.write(certificate.public_bytes(serialization.Encoding.PEM))
+            # Write certificate to file and index it
+            atomic_write(proxy_ssl_crt, certificate_bytes)
+            self.inventory.record(proxy_ssl_crt, certificate, proxy_ssl_key)
+        elif needs_pem:
+            with proxy_ssl_crt.open("rb") as cert_file:
+                certificate_bytes = cert_file.read()
 
         # Generate PEM file (combined key + certificate)
-        if not proxy_ssl_pem.is_file() or renew_keys or renew_csrs or renew_crts or needs_cert_renewal:
-            with proxy_ssl_pem.open("wb") as pem_file:
-                # Write private key
-                pem_file.write(
-                    private_key.private_bytes(
-                        encoding=serialization.Encoding.PEM,
-                        format=serialization.PrivateFormat.PKCS8,
-                        encryption_algorithm=serialization.NoEncryption(),
-                    )
+        if needs_pem:
+            atomic_write(
+                proxy_ssl_pem,
+                private_key.private_bytes(
+                    encoding=serialization.Encoding.PEM,
+                    format=serialization.PrivateFormat.PKCS8,
+                    encryption_algorithm=serialization.NoEncryption(),
                 )
+                + certificate_bytes,
+            )
+
+        if not needs_cert_renewal:
+            return "skipped"
+        return "renewed" if had_certificate else "issued"
+
+    def prune_certificates(self, sites: List[Dict[str, Any]]) -> int:
+        """Drop the inventory entries of certificates no current site uses and save the inventory.
+
+        Args:
+            sites: Every current site, each with "domain" and "name" keys
+
+        Returns:
+            The number of entries dropped
+        """
+        removed = self.inventory.prune(
+            self.proxy_ssl_path / site["domain"] / site["name"] / "client.crt" for site in sites
+        )
+        self.inventory.save()
+        if removed:
+            self.logger.info("Dropped %d certificates of removed sites from the inventory", removed)
+        return removed
+
+    def generate_certificates_bulk(
+        self,
+        sites: List[Dict[str, Any]],
+        workers: int = 4,
+        renew_keys: bool = False,
+        renew_csrs: bool = False,
+        renew_crts: bool = False,
+        auto_renew_days: int = 30,
+    ) -> Dict[str, str]:
+        """Generate SSL certificates for many sites in parallel.
+
+        The CA key and certificate are loaded once, by the first worker that has to sign a
+        certificate, and shared by all workers; a run that skips every site never reads them.
+        A failure for one site is logged and reported without stopping the others.
+
+        Args:
+            sites: Discovered sites, each with "domain" and "name" keys
+            workers: Number of worker threads
+
+        Returns:
+            Mapping of site name to "issued", "renewed", "skipped" or "failed"
+        """
+
+        def issue(site: Dict[str, Any]) -> str:
+            try:
+                with instrumentation.site_timer("certificates", site["name"]):
+                    return self.generate_certificates(
+                        domain=site["domain"],
+                        subdomain=site["name"],
+                        renew_keys=renew_keys,
+                        renew_csrs=renew_csrs,
+                        renew_crts=renew_crts,
+                        auto_renew_days=auto_renew_days,
+                    )
+            except Exception as e:
+                self.logger.error("Failed to generate certificates for %s: %s", site["name"], e)
+                return "failed"
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = list(executor.map(issue, sites))
+
+        self.inventory.save()
 
-                # Write certificate
-                with proxy_ssl_crt.open("rb") as cert_file:
-                    pem_file.write(cert_file.read())
+        return {site["name"]: status for site, status in zip(sites, results)}
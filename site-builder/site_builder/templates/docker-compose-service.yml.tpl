@@ -0,0 +1,76 @@
+    {{ replica.service }}:
+        build:
+            context: {{ site.runtime.context }}
+            dockerfile: Dockerfile
+{% if site.runtime.build_contexts %}
+            additional_contexts:
+{% for name, path in site.runtime.build_contexts | dictsort %}
+                {{ name }}: {{ path }}
+{% endfor %}
+{% endif %}
+        image: {{ site.runtime.name }}:{{ site.runtime.tag }}
+        container_name: {{ replica.container_name }}
+{% if site.settings.scaling.cpus %}
+        cpus: {{ site.settings.scaling.cpus }}
+{% endif %}
+{% if site.settings.scaling.memory %}
+        mem_limit: {{ site.settings.scaling.memory }}
+{% endif %}
+        environment:
+            UPSTREAM_MODE: "{{ "socket" if site.settings.app.socket else "tcp" }}"
+{% if "php" not in site.runtime.name %}
+            APP_WORKERS: "{{ site.settings.app.workers or "auto" }}"
+            APP_MAX_REQUESTS: "{{ site.settings.app.max_requests }}"
+            APP_MAX_MEMORY: "{{ site.settings.app.max_memory }}"
+            PIP_CACHE_DIR: "/var/cache/site-builder/pip"
+            npm_config_cache: "/var/cache/site-builder/npm"
+{% endif %}
+{% if "php" in site.runtime.name %}
+            PHP_FPM_PM: "{{ site.settings.php.pm }}"
+            PHP_FPM_MEMORY_PER_WORKER: "{{ site.settings.php.memory_per_worker }}"
+{% if site.settings.php.max_children %}
+            PHP_FPM_MAX_CHILDREN: "{{ site.settings.php.max_children }}"
+{% endif %}
+            PHP_FPM_STATUS_PATH: "{{ site.settings.php.status_path }}"
+            PHP_FPM_PING_PATH: "{{ site.settings.php.ping_path }}"
+            PHP_FPM_STATUS_ALLOW: "{{ PROXY_ADDRESS if ENABLE_PROXY else NETWORK_GATEWAY }}"
+            PHP_MODE: "{{ site.settings.php.mode }}"
+            PHP_OPCACHE_REVALIDATE_FREQ: "{{ site.settings.php.revalidate_freq }}"
+            PHP_OPCACHE_MEMORY: "{{ site.settings.php.opcache_memory }}"
+            PHP_OPCACHE_MAX_FILES: "{{ site.settings.php.opcache_max_files }}"
+            PHP_OPCACHE_JIT: "{{ site.settings.php.jit }}"
+{% if site.settings.php.preload %}
+            PHP_OPCACHE_PRELOAD: "/var/www/{{ site.settings.php.preload.lstrip("/") }}"
+{% endif %}
+{% endif %}
+{% if site.settings.app.socket %}
+        tmpfs:
+            - /run/app
+{% endif %}
+        networks:
+            nginx-proxy:
+                ipv4_address: {{ replica.address }}
+        volumes:
+            - type: bind
+              source: "{{ PROXY_SSL_PATH }}/{{ site.domain }}/{{ site.name }}"
+              target: "/var/ssl/www"
+            - type: bind
+              source: "{{ ROOT_CA_CRT }}"
+              target: "/var/ssl/root/ca.crt"
+            - type: bind
+              source: "{{ site.web_root }}"
+              target: "/var/www"
+{% if "php" not in site.runtime.name %}
+            - type: bind
+              source: "{{ DEPENDENCY_CACHE_PATH }}"
+              target: "/var/cache/site-builder"
+{% endif %}
+{% if ENABLE_DATABASE %}
+        depends_on:
+            - mariadb
+{% else %}
+            - type: bind
+              source: "/var/run/mysqld/mysqld.sock"
+              target: "/var/run/mysqld/mysqld.sock"
+{% endif %}
+        restart: unless-stopped
@@ -8,7 +8,7 @@ services:
             - "443:443"
         networks:
             nginx-proxy:
-                ipv4_address: {{ IP_PREFIX }}.1
+                ipv4_address: {{ PROXY_ADDRESS }}
         volumes:
             - type: bind
               source: "/etc/site-builder/nginx/sites-enabled"
@@ -19,13 +19,18 @@ services:
               target: "/var/ssl"
               read_only: true
             - type: bind
-              source: "/mnt/www"
+              source: "{{ WEB_PATH }}"
               target: "/var/www"
               read_only: true
+            - type: bind
+              source: "{{ PROXY_CACHE_PATH }}"
+              target: "{{ PROXY_CACHE_PATH }}"
         restart: unless-stopped
         depends_on:
 {% for site in sites %}
-            - web-{{ site.slug }}
+{% for replica in site.replicas %}
+            - {{ replica.service }}
+{% endfor %}
 {% endfor %}
 {% endif %}
 {% if ENABLE_DATABASE %}
@@ -38,7 +43,7 @@ services:
             - MYSQL_COLLATION_SERVER=utf8mb4_unicode_ci
         networks:
             nginx-proxy:
-                ipv4_address: {{ IP_PREFIX }}.254
+                ipv4_address: {{ DATABASE_ADDRESS }}
         volumes:
             - type: bind
               source: "/etc/site-builder/mysql/my.cnf"
@@ -59,39 +64,14 @@ services:
 {% endif %}
 
 {% for site in sites %}
-    web-{{ site.slug }}:
-        build:
-            context: {{ site.runtime.context }}
-            dockerfile: Dockerfile
-        image: {{ site.runtime.name }}:{{ site.runtime.version }}
-        container_name: site-{{ site.slug }}
-        networks:
-            nginx-proxy:
-                ipv4_address: {{ IP_PREFIX }}.{{ site.ip_suffix }}
-        volumes:
-            - type: bind
-              source: "{{ PROXY_SSL_PATH }}/{{ site.domain }}/{{ site.name }}"
-              target: "/var/ssl/www"
-            - type: bind
-              source: "{{ ROOT_CA_CRT }}"
-              target: "/var/ssl/root/ca.crt"
-            - type: bind
-              source: "{{ site.web_root }}"
-              target: "/var/www"
-{% if ENABLE_DATABASE %}
-        depends_on:
-            - mariadb
-{% else %}
-            - type: bind
-              source: "/var/run/mysqld/mysqld.sock"
-              target: "/var/run/mysqld/mysqld.sock"
-{% endif %}
-        restart: unless-stopped
+{% for replica in site.replicas %}
+{% include "docker-compose-service.yml.tpl" %}
+{% endfor %}
 {% endfor %}
 
 networks:
     nginx-proxy:
         ipam:
             config:
-                - subnet: {{ IP_PREFIX }}.0/24
-                  gateway: {{ IP_PREFIX }}.1
+                - subnet: {{ NETWORK_SUBNET }}
+                  gateway: {{ NETWORK_GATEWAY }}
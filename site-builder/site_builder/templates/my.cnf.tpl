@@ -22,21 +22,25 @@ collation-server = utf8mb4_unicode_ci
 # InnoDB settings
 innodb_buffer_pool_size = {{ DB_INNODB_BUFFER_POOL_SIZE | default('256M') }}
 innodb_log_file_size = {{ DB_INNODB_LOG_FILE_SIZE | default('64M') }}
+innodb_io_capacity = {{ DB_INNODB_IO_CAPACITY | default('200') }}
+innodb_io_capacity_max = {{ DB_INNODB_IO_CAPACITY_MAX | default('2000') }}
 innodb_file_per_table = 1
 innodb_flush_log_at_trx_commit = 1
 innodb_flush_method = O_DIRECT
 
 # Query cache
-query_cache_type = 1
-query_cache_size = {{ DB_QUERY_CACHE_SIZE | default('16M') }}
+query_cache_type = {{ DB_QUERY_CACHE_TYPE | default('0') }}
+query_cache_size = {{ DB_QUERY_CACHE_SIZE | default('0') }}
 
 # Connection settings
 max_connections = {{ DB_MAX_CONNECTIONS | default('100') }}
+thread_cache_size = {{ DB_THREAD_CACHE_SIZE | default('16') }}
+table_open_cache = {{ DB_TABLE_OPEN_CACHE | default('2000') }}
 connect_timeout = 60
 wait_timeout = 28800
 
 # Logging
-general_log = {{ DB_GENERAL_LOG | default('1') }}
+general_log = {{ DB_GENERAL_LOG | default('0') }}
 general_log_file = /var/log/mysql/mysql.log
 log_error = /var/log/mysql/error.log
 slow_query_log = {{ DB_SLOW_QUERY_LOG | default('1') }}
@@ -0,0 +1,4 @@
+# Shared proxy settings generated by site-builder, included once before the site configurations
+{% if sites | selectattr("settings.cache.enabled") | list %}
+proxy_cache_path {{ PROXY_CACHE_PATH }} levels=1:2 keys_zone=site_builder:{{ PROXY_CACHE_KEYS_SIZE }} max_size={{ PROXY_CACHE_MAX_SIZE }} inactive=60m use_temp_path=off;
+{% endif %}
@@ -1,3 +1,70 @@
+{% macro proxy_to_upstream() %}
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        proxy_pass https://web-{{ site.slug }};
+        {% if site.settings.cache.enabled %}
+
+        proxy_cache site_builder;
+        proxy_cache_key "{{ site.name }}|$scheme$host$request_uri";
+        proxy_cache_valid 200 301 302 {{ site.settings.cache.valid }};
+        {% if site.settings.cache.lock %}
+        proxy_cache_lock on;
+        proxy_cache_lock_timeout {{ site.settings.cache.lock_timeout }};
+        {% endif %}
+        {% if site.settings.cache.use_stale %}
+        proxy_cache_use_stale error timeout updating http_500 http_502 http_503 http_504;
+        proxy_cache_background_update on;
+        {% endif %}
+        proxy_cache_bypass $http_authorization{% if site.settings.cache.bypass_cookies %} $http_cookie{% endif %};
+        proxy_no_cache $http_authorization{% if site.settings.cache.bypass_cookies %} $http_cookie{% endif %};
+        add_header X-Cache-Status $upstream_cache_status always;
+        {% endif %}
+
+        proxy_ssl_certificate         {{ PROXY_SSL_PATH }}/{{ site.domain }}/{{ site.name }}/client.crt;
+        proxy_ssl_certificate_key     {{ PROXY_SSL_PATH }}/{{ site.domain }}/{{ site.name }}/client.key;
+        proxy_ssl_protocols           TLSv1 TLSv1.1 TLSv1.2;
+        proxy_ssl_ciphers             HIGH:!aNULL:!MD5;
+        proxy_ssl_trusted_certificate {{ ROOT_CA_CRT }};
+        proxy_ssl_name                {{ site.name }};
+
+        proxy_ssl_verify        on;
+        proxy_ssl_verify_depth  2;
+        proxy_ssl_session_reuse on;
+{% endmacro %}
+{% macro serve_static() %}
+        root {{ SITE_ROOT }};
+        try_files $uri @upstream;
+
+        sendfile on;
+        tcp_nopush on;
+        gzip_static on;
+        gzip_vary on;
+        open_file_cache max=10000 inactive=60s;
+        open_file_cache_valid 60s;
+        open_file_cache_min_uses 2;
+        open_file_cache_errors on;
+        expires {{ site.settings.static.expires }};
+        access_log off;
+{% endmacro %}
+
+upstream web-{{ site.slug }} {
+    {% if site.replicas | length > 1 %}
+    least_conn;
+    {% endif %}
+    {% for replica in site.replicas %}
+    server {{ replica.address }}:443 max_fails={{ site.settings.upstream.max_fails }} fail_timeout={{ site.settings.upstream.fail_timeout }};
+    {% endfor %}
+    {% if site.settings.upstream.keepalive %}
+    keepalive {{ site.settings.upstream.keepalive }};
+    keepalive_requests {{ site.settings.upstream.keepalive_requests }};
+    keepalive_timeout {{ site.settings.upstream.keepalive_timeout }};
+    {% endif %}
+}
+
 {% if site.use_ssl %}
 server {
     listen 80;
@@ -30,22 +97,31 @@ server {
     access_log /var/log/nginx/{{ site.name }}-access.log;
     error_log /var/log/nginx/{{ site.name }}-error.log;
 
-    location / {
-        proxy_set_header Host $host;
-        proxy_set_header X-Real-IP $remote_addr;
-        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
-        proxy_set_header X-Forwarded-Proto $scheme;
-        proxy_pass https://{{ IP_PREFIX }}.{{ site.ip_suffix }};
-
-        proxy_ssl_certificate         {{ PROXY_SSL_PATH }}/{{ site.domain }}/{{ site.name }}/client.crt;
-        proxy_ssl_certificate_key     {{ PROXY_SSL_PATH }}/{{ site.domain }}/{{ site.name }}/client.key;
-        proxy_ssl_protocols           TLSv1 TLSv1.1 TLSv1.2;
-        proxy_ssl_ciphers             HIGH:!aNULL:!MD5;
-        proxy_ssl_trusted_certificate {{ ROOT_CA_CRT }};
-        proxy_ssl_name                {{ site.name }};
+    location ~ /\.site\.ini$ {
+        deny all;
+    }
 
-        proxy_ssl_verify        on;
-        proxy_ssl_verify_depth  2;
-        proxy_ssl_session_reuse on;
+    {% if "php" in site.runtime.name %}
+    # The PHP-FPM pool status is scraped from the proxy, never served to visitors
+    location ~ ^({{ site.settings.php.status_path | regex_escape }}|{{ site.settings.php.ping_path | regex_escape }})$ {
+        deny all;
     }
+
+    {% endif %}
+
+    {% if SITE_ROOT %}
+    location ~* \.({{ site.settings.static.extensions.split() | map("regex_escape") | join("|") }})$ {
+{{ serve_static() }}    }
+
+    {% if site.settings.static.directory.strip("/") %}
+    location ^~ /{{ site.settings.static.directory.strip("/") }}/ {
+{{ serve_static() }}    }
+
+    {% endif %}
+    location @upstream {
+{{ proxy_to_upstream() }}    }
+
+    {% endif %}
+    location / {
+{{ proxy_to_upstream() }}    }
 }
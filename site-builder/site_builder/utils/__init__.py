@@ -0,0 +1,12 @@
+"""Shared helper functions for the site-builder package."""
+
+from . import instrumentation
+from .files import atomic_write, content_hash, hash_directory, write_if_changed
+
+__all__ = [
+    "atomic_write",
+    "content_hash",
+    "hash_directory",
+    "instrumentation",
+    "write_if_changed",
+]
@@ -0,0 +1,93 @@
+"""File helpers for atomic and change-aware writes."""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Union
+
+from . import instrumentation
+
+
+def content_hash(content: Union[str, bytes]) -> str:
+    """Get the SHA-256 hex digest of a string or bytes content."""
+    if isinstance(content, str):
+        content = content.encode()
+    return hashlib.sha256(content).hexdigest()
+
+
+def hash_directory(path: Path) -> str:
+    """Get a SHA-256 hex digest of a directory tree's file names, modes and contents.
+
+    Entries are visited in sorted order so the digest only depends on the tree content.
+    Symlinks are hashed by their target rather than followed. A missing directory
+    hashes like an empty one.
+    """
+    digest = hashlib.sha256()
+    for root, directories, files in os.walk(path):
+        directories.sort()
+        for name in sorted(files + [d for d in directories if os.path.islink(os.path.join(root, d))]):
+            file_path = os.path.join(root, name)
+            relative_path = os.path.relpath(file_path, path)
+            stat = os.lstat(file_path)
+            digest.update(f"{relative_path}\0{stat.st_mode:o}\0".encode())
+            if os.path.islink(file_path):
+                digest.update(os.readlink(file_path).encode())
+            else:
+                with open(file_path, "rb") as fp:
+                    for chunk in iter(lambda: fp.read(1 << 16), b""):
+                        digest.update(chunk)
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def atomic_write(path: Path, content: Union[str, bytes], mode: int = 0o666) -> None:
+    """Write a file atomically using a temporary file in the same directory and a rename.
+
+    Readers never observe a partially written file: they either see the old content or
+    the new one. The file permissions are derived from mode and the process umask.
+
+    Args:
+        path: Destination file path
+        content: File content, text is encoded as UTF-8
+        mode: Permission bits for the new file (default: 0o666, filtered by the umask)
+    """
+    if isinstance(content, str):
+        content = content.encode()
+
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(content)
+        os.replace(tmp_path, path)
+        instrumentation.record_write(len(content))
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_if_changed(path: Path, content: Union[str, bytes], mode: int = 0o666) -> str:
+    """Atomically write a file only if its content hash differs from the existing file.
+
+    Returns:
+        "added" if the file did not exist, "changed" if it was rewritten, "unchanged" otherwise
+    """
+    if isinstance(content, str):
+        content = content.encode()
+
+    try:
+        with path.open("rb") as fp:
+            existing = fp.read()
+    except FileNotFoundError:
+        atomic_write(path, content, mode)
+        return "added"
+
+    if content_hash(existing) == content_hash(content):
+        return "unchanged"
+
+    atomic_write(path, content, mode)
+    return "changed"
@@ -0,0 +1,215 @@
+"""Structured timing of site-builder runs: phases, sites, subprocesses and bytes written.
+
+Code marks its phases and per-site work with phase() and site_timer(), and runs commands
+with run(); the timings are only recorded while a RunReport is active, so instrumented
+code pays nothing in normal use.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger("site-builder")
+
+# Number of slowest sites listed per phase in the report summary
+SLOWEST_SITES = 10
+
+# docker commands whose subcommand is reported too, e.g. "docker compose up"
+DOCKER_MANAGEMENT_COMMANDS = {"compose", "container", "image", "network"}
+
+_active: Optional["RunReport"] = None
+
+
+class RunReport:
+    """Collects the timings of one run and writes them as a JSON report."""
+
+    def __init__(self) -> None:
+        self.started = datetime.now(timezone.utc)
+        self._start = time.monotonic()
+        self.phases: List[Dict[str, Any]] = []
+        self.sites: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self.subprocesses: Dict[str, Dict[str, float]] = defaultdict(lambda: {"count": 0, "duration": 0.0})
+        self.writes = {"files": 0, "bytes": 0}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def active(self) -> Iterator["RunReport"]:
+        """Make this the report receiving the timings."""
+        global _active
+        previous = _active
+        _active = self
+        try:
+            yield self
+        finally:
+            _active = previous
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a phase of the run."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append(
+                    {
+                        "name": name,
+                        "start": round(started - self._start, 6),
+                        "duration": round(time.monotonic() - started, 6),
+                    }
+                )
+
+    @contextmanager
+    def site_timer(self, phase: str, site_name: str) -> Iterator[None]:
+        """Time the work of a phase for a single site; repeated work for the same site adds up."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - started
+            with self._lock:
+                self.sites[phase][site_name] = self.sites[phase].get(site_name, 0.0) + duration
+
+    def record_subprocess(self, args: Any, duration: float) -> None:
+        """Record a finished subprocess under its program name, with the subcommand for docker."""
+        if isinstance(args, (str, bytes, os.PathLike)):
+            argv = os.fsdecode(args).split() or ["?"]
+        else:
+            argv = [os.fsdecode(arg) for arg in args]
+        program = os.path.basename(argv[0])
+        if program == "docker":
+            # docker build, docker compose up and docker exec are worth telling apart
+            words = []
+            options = iter(argv[1:])
+            for arg in options:
+                if arg in ("-f", "--file", "-p", "--project-name"):
+                    next(options, None)
+                elif not arg.startswith("-"):
+                    words.append(arg)
+                    if arg not in DOCKER_MANAGEMENT_COMMANDS:
+                        break
+            program = " ".join([program] + words)
+        with self._lock:
+            entry = self.subprocesses[program]
+            entry["count"] += 1
+            entry["duration"] += duration
+
+    def record_write(self, size: int) -> None:
+        """Record a file written with atomic_write (generated configuration, state and certificates)."""
+        with self._lock:
+            self.writes["files"] += 1
+            self.writes["bytes"] += size
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the report, with the slowest sites of every phase listed first."""
+        with self._lock:
+            sites = {
+                phase: {
+                    "count": len(timings),
+                    "total": round(sum(timings.values()), 6),
+                    "slowest": [
+                        {"site": name, "duration": round(duration, 6)}
+                        for name, duration in sorted(timings.items(), key=lambda item: item[1], reverse=True)[
+                            :SLOWEST_SITES
+                        ]
+                    ],
+                    "timings": {name: round(duration, 6) for name, duration in sorted(timings.items())},
+                }
+                for phase, timings in self.sites.items()
+            }
+            return {
+                "started": self.started.isoformat(),
+                "duration": round(time.monotonic() - self._start, 6),
+                "phases": list(self.phases),
+                "sites": sites,
+                "subprocesses": {
+                    program: {"count": entry["count"], "duration": round(entry["duration"], 6)}
+                    for program, entry in sorted(self.subprocesses.items())
+                },
+                "writes": dict(self.writes),
+            }
+
+    def write(self, path: Path) -> None:
+        """Write the report as JSON."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with tmp_path.open("w") as fp:
+            json.dump(self.to_dict(), fp, indent=2)
+        os.replace(tmp_path, path)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a phase of the run in the active report, if any."""
+    report = _active
+    if report is None:
+        yield
+        return
+    with report.phase(name):
+        yield
+
+
+@contextmanager
+def site_timer(phase_name: str, site_name: str) -> Iterator[None]:
+    """Time the work of a phase for a single site in the active report, if any."""
+    report = _active
+    if report is None:
+        yield
+        return
+    with report.site_timer(phase_name, site_name):
+        yield
+
+
+def run(args: Any, **kwargs: Any) -> "subprocess.CompletedProcess[Any]":
+    """Run a command with subprocess.run, recording its duration in the active report, if any.
+
+    Commands that exit with an error or time out are recorded too.
+    """
+    report = _active
+    if report is None:
+        return subprocess.run(args, **kwargs)
+    started = time.monotonic()
+    try:
+        return subprocess.run(args, **kwargs)
+    finally:
+        report.record_subprocess(args, time.monotonic() - started)
+
+
+def record_write(size: int) -> None:
+    """Record a file written in the active report, if any."""
+    report = _active
+    if report is not None:
+        report.record_write(size)
+
+
+@contextmanager
+def profiled(stats_path: Optional[Path]) -> Iterator[None]:
+    """Run the body under cProfile, dumping the stats to stats_path and logging the costliest calls.
+
+    Does nothing if stats_path is None. The stats can be explored with python -m pstats.
+    """
+    if stats_path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        stats_path.parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(stats_path))
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(20)
+        logger.info("Profile written to %s\n%s", stats_path, summary.getvalue())
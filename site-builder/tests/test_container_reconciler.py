@@ -0,0 +1,138 @@
+"""Tests for the container reconciler, with the compose and docker calls stubbed."""
+
+import subprocess
+
+import pytest
+
+from site_builder.docker.container_reconciler import ContainerReconciler
+from site_builder.docker.docker_client import DockerAPIError
+from site_builder.docker.image_index import ImageIndex
+
+
+class FakeConfigGenerator:
+    """Renders a service block from the fields that make up its definition."""
+
+    def render_compose_service(self, site, replica, template_vars):
+        return f"{replica['service']} {site['runtime']['name']}:{site['runtime']['tag']} {site.get('env', '')}"
+
+
+class FakeDockerClient:
+    """Docker API client listing the services that have a container."""
+
+    def __init__(self, services):
+        self.available = True
+        self.services = services
+
+    def list_containers(self, labels=None, all=False):
+        return [{"Id": service, "Labels": {"com.docker.compose.service": service}} for service in self.services]
+
+
+class UnavailableDockerClient:
+    available = False
+
+
+def make_site(name, replicas=1, env=""):
+    services = [f"web-{name}"] + [f"web-{name}-r{index}" for index in range(1, replicas)]
+    return {
+        "name": name,
+        "runtime": {"name": "nginx-php8", "tag": "8.3-abc"},
+        "replicas": [{"service": service} for service in services],
+        "env": env,
+    }
+
+
+@pytest.fixture
+def reconciler(tmp_path):
+    reconciler = ContainerReconciler(
+        tmp_path / "docker-compose.yml", tmp_path / "services.json", ImageIndex(tmp_path / "images.json")
+    )
+    reconciler.docker_client = UnavailableDockerClient()
+    reconciler.started = []
+    reconciler.removed = []
+    reconciler.failures = {}
+    reconciler._timed_ensure_image = lambda image, runtime: True
+
+    def up(service):
+        if service in reconciler.failures:
+            raise reconciler.failures[service]
+        reconciler.started.append(service)
+
+    def remove(service):
+        if service in reconciler.failures:
+            raise reconciler.failures[service]
+        reconciler.removed.append(service)
+
+    reconciler._up = up
+    reconciler._remove = remove
+    return reconciler
+
+
+def reconcile(reconciler, sites):
+    reconciler.started.clear()
+    reconciler.removed.clear()
+    return reconciler.reconcile(sites, FakeConfigGenerator(), {})
+
+
+def test_only_changed_services_are_restarted(reconciler):
+    sites = [make_site("a"), make_site("b", replicas=2)]
+
+    assert reconcile(reconciler, sites) == {"web-a": "started", "web-b": "started", "web-b-r1": "started"}
+    assert sorted(reconciler.started) == ["web-a", "web-b", "web-b-r1"]
+
+    assert set(reconcile(reconciler, sites).values()) == {"unchanged"}
+    assert reconciler.started == []
+
+    sites[0]["env"] = "DEBUG=1"
+    results = reconcile(reconciler, sites)
+
+    assert reconciler.started == ["web-a"]
+    assert results == {"web-a": "started", "web-b": "unchanged", "web-b-r1": "unchanged"}
+
+
+def test_services_without_a_container_are_started_again(reconciler):
+    sites = [make_site("a"), make_site("b")]
+    reconcile(reconciler, sites)
+    reconciler.docker_client = FakeDockerClient({"web-a"})
+
+    assert reconcile(reconciler, sites) == {"web-a": "unchanged", "web-b": "started"}
+
+
+def test_removed_services_are_removed_and_retried_until_they_are_gone(reconciler):
+    reconcile(reconciler, [make_site("a"), make_site("b"), make_site("c")])
+    reconciler.failures["web-c"] = DockerAPIError(409, "removal already in progress")
+
+    results = reconcile(reconciler, [make_site("a")])
+
+    assert results == {"web-a": "unchanged", "web-b": "removed", "web-c": "failed"}
+    assert reconciler.removed == ["web-b"]
+
+    del reconciler.failures["web-c"]
+
+    assert reconcile(reconciler, [make_site("a")]) == {"web-a": "unchanged", "web-c": "removed"}
+    assert reconcile(reconciler, [make_site("a")]) == {"web-a": "unchanged"}
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        subprocess.CalledProcessError(1, ["docker", "compose"], stderr="no such image"),
+        FileNotFoundError("docker"),
+        DockerAPIError(500, "server error"),
+    ],
+)
+def test_failed_services_are_retried_without_losing_the_started_ones(reconciler, error):
+    sites = [make_site("a"), make_site("b")]
+    reconciler.failures["web-b"] = error
+
+    assert reconcile(reconciler, sites) == {"web-a": "started", "web-b": "failed"}
+
+    del reconciler.failures["web-b"]
+
+    assert reconcile(reconciler, sites) == {"web-a": "unchanged", "web-b": "started"}
+
+
+def test_services_of_images_that_failed_to_build_are_not_started(reconciler):
+    reconciler._timed_ensure_image = lambda image, runtime: False
+
+    assert reconcile(reconciler, [make_site("a")]) == {"web-a": "failed"}
+    assert reconciler.started == []
@@ -0,0 +1,39 @@
+"""Tests for the mapping of watcher events to the domains the daemon reconciles."""
+
+import pytest
+
+from site_builder.core.daemon import Daemon
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    web_path = tmp_path / "www"
+    (web_path / "example.com" / "www.example.com").mkdir(parents=True)
+    return Daemon(None, web_path, polling=True)
+
+
+def test_changes_map_to_their_domain(daemon):
+    web_path = daemon.web_path
+    changed = {
+        str(web_path / "example.com"),
+        str(web_path / "example.com" / ".cert"),
+        str(web_path / "example.com" / "www.example.com" / "assets" / "css"),
+        str(web_path / "other.org" / "www.other.org"),
+    }
+
+    assert daemon._changed_domains(changed) == {"example.com", "other.org"}
+
+
+def test_domain_names_starting_with_dots_stay_inside_the_web_path(daemon):
+    assert daemon._changed_domains({str(daemon.web_path / "..example.com")}) == {"..example.com"}
+
+
+def test_no_changes_reconcile_no_domain(daemon):
+    assert daemon._changed_domains(set()) == set()
+
+
+@pytest.mark.parametrize("path", ["", "..", "../www-old/example.com", "/etc/site-builder"])
+def test_changes_of_the_web_path_itself_or_outside_it_reconcile_everything(daemon, path):
+    changed = {str(daemon.web_path / "example.com"), str(daemon.web_path / path)}
+
+    assert daemon._changed_domains(changed) is None
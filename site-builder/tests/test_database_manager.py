@@ -0,0 +1,27 @@
+"""Tests for the database names of sites."""
+
+import re
+
+from site_builder.database.database_manager import MAX_NAME_LENGTH, DatabaseManager
+
+
+def test_slugs_are_sanitized():
+    assert DatabaseManager.site_database_name({"slug": "www-Example-com"}) == "www_example_com"
+
+
+def test_short_names_are_kept_as_they_are():
+    slug = "a" * MAX_NAME_LENGTH
+
+    assert DatabaseManager.site_database_name({"slug": slug}) == slug
+
+
+def test_long_names_are_truncated_with_a_hash_suffix():
+    prefix = "shop-" + "x" * 70
+    first = DatabaseManager.site_database_name({"slug": prefix + "-one"})
+    second = DatabaseManager.site_database_name({"slug": prefix + "-two"})
+
+    assert len(first) == MAX_NAME_LENGTH
+    assert len(second) == MAX_NAME_LENGTH
+    assert first != second
+    assert re.fullmatch(r"[a-z0-9_]+_[0-9a-f]{8}", first)
+    assert DatabaseManager.site_database_name({"slug": prefix + "-one"}) == first
@@ -0,0 +1,129 @@
+"""Tests for the discovery manifest and the incremental site discovery built on it."""
+
+import json
+import os
+
+from site_builder.core.discovery_manifest import DiscoveryManifest, path_signature
+from site_builder.core.site_discovery import discover_sites
+
+
+def make_site(web_path, domain, name, index="index.php"):
+    site_path = web_path / domain / name
+    site_path.mkdir(parents=True)
+    (site_path / index).write_text("")
+    return site_path
+
+
+def bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_path_signature(tmp_path):
+    path = tmp_path / "file"
+
+    assert path_signature(path) is None
+    path.write_text("one")
+    signature = path_signature(path)
+    assert signature == path_signature(path)
+    path.write_text("three")
+    assert path_signature(path) != signature
+
+
+def test_sites_are_only_returned_for_matching_signatures(tmp_path):
+    manifest = DiscoveryManifest(tmp_path / "discovery.json")
+    manifest.set_domain(
+        "/www/example.com", [1, 2, 3], {"/www/example.com/www.example.com": {"signature": [4], "site": {"name": "a"}}}
+    )
+    manifest.save()
+
+    manifest = DiscoveryManifest(tmp_path / "discovery.json")
+
+    assert manifest.get_domain("/www/example.com")["signature"] == [1, 2, 3]
+    assert manifest.get_site("/www/example.com", "/www/example.com/www.example.com", [4]) == {"name": "a"}
+    assert manifest.get_site("/www/example.com", "/www/example.com/www.example.com", [5]) is None
+    assert manifest.get_site("/www/other.org", "/www/other.org/www.other.org", [4]) is None
+    assert (manifest.hits, manifest.misses) == (1, 2)
+
+
+def test_incompatible_or_ignored_manifests_start_empty(tmp_path):
+    manifest_path = tmp_path / "discovery.json"
+    manifest_path.write_text(json.dumps({"version": DiscoveryManifest.VERSION - 1, "domains": {"/www/a.org": {}}}))
+
+    assert DiscoveryManifest(manifest_path).get_domain("/www/a.org") is None
+
+    manifest_path.write_text(json.dumps({"version": DiscoveryManifest.VERSION, "domains": {"/www/a.org": {}}}))
+
+    assert DiscoveryManifest(manifest_path).get_domain("/www/a.org") == {}
+    assert DiscoveryManifest(manifest_path, full_rescan=True).get_domain("/www/a.org") is None
+
+    manifest_path.write_text("{not json")
+
+    assert DiscoveryManifest(manifest_path).get_domain("/www/a.org") is None
+
+
+def test_save_keeps_only_the_domains_of_the_last_run(tmp_path):
+    manifest = DiscoveryManifest(tmp_path / "discovery.json")
+    manifest.set_domain("/www/a.org", [1], {})
+    manifest.save()
+    manifest.set_domain("/www/b.org", [2], {})
+    manifest.save()
+
+    assert manifest.get_domain("/www/a.org") is None
+    assert DiscoveryManifest(tmp_path / "discovery.json").get_domain("/www/b.org") == {"signature": [2], "sites": {}}
+
+
+def test_unchanged_sites_are_reused_and_changed_ones_rescanned(tmp_path):
+    web_path = tmp_path / "www"
+    site_path = make_site(web_path, "example.com", "www.example.com")
+    make_site(web_path, "example.com", "api.example.com", index="index.py")
+    manifest = DiscoveryManifest(tmp_path / "discovery.json")
+
+    first = discover_sites(web_path, manifest=manifest)
+    second = discover_sites(web_path, manifest=manifest)
+
+    assert [site["name"] for site in first] == ["api.example.com", "www.example.com"]
+    assert second == first
+    assert os.path.isfile(tmp_path / "discovery.json")
+
+    # A new settings file changes the signature of its site only
+    (site_path / ".site.ini").write_text("[scaling]\nreplicas = 2\n")
+    bump_mtime(site_path)
+    manifest = DiscoveryManifest(tmp_path / "discovery.json")
+    third = discover_sites(web_path, manifest=manifest)
+
+    assert third[1]["settings"]["scaling"]["replicas"] == 2
+    assert len(third[1]["replicas"]) == 2
+    assert third[0] == first[0]
+
+
+def test_certificates_invalidate_the_sites_of_their_domain(tmp_path):
+    web_path = tmp_path / "www"
+    make_site(web_path, "example.com", "www.example.com")
+    manifest = DiscoveryManifest(tmp_path / "discovery.json")
+
+    assert discover_sites(web_path, manifest=manifest)[0]["use_ssl"] is False
+
+    cert_path = web_path / "example.com" / ".cert"
+    cert_path.mkdir()
+    (cert_path / "www.example.com.crt").write_text("")
+    (cert_path / "www.example.com.key").write_text("")
+
+    assert discover_sites(web_path, manifest=manifest)[0]["use_ssl"] is True
+
+
+def test_only_the_given_domains_are_checked(tmp_path):
+    web_path = tmp_path / "www"
+    make_site(web_path, "example.com", "www.example.com")
+    other_path = make_site(web_path, "other.org", "www.other.org")
+    manifest = DiscoveryManifest(tmp_path / "discovery.json")
+    discover_sites(web_path, manifest=manifest)
+
+    (other_path / ".site.ini").write_text("[scaling]\nreplicas = 2\n")
+    bump_mtime(other_path)
+
+    sites = discover_sites(web_path, manifest=manifest, domains={"example.com"})
+    assert [len(site["replicas"]) for site in sites] == [1, 1]
+
+    sites = discover_sites(web_path, manifest=manifest, domains={"other.org"})
+    assert [len(site["replicas"]) for site in sites] == [1, 2]
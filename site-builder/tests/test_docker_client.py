@@ -0,0 +1,219 @@
+"""Tests for the Docker Engine API client, against a fake daemon on a unix socket."""
+
+import json
+import socketserver
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler
+from subprocess import CompletedProcess
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from site_builder.docker import docker_client, php_opcache
+from site_builder.docker.docker_client import DockerAPIError, DockerClient, get_docker_client
+from site_builder.nginx.nginx_docker import NginxDockerManager
+
+CONTAINER = {"Id": "abc123", "State": {"Status": "running"}}
+
+
+def frame(stream_type, data):
+    return struct.pack(">BxxxL", stream_type, len(data)) + data
+
+
+class FakeDockerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=b""):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        self.server.requests.append((self.command, url.path, parse_qs(url.query), body))
+
+        route = (self.command, url.path[len("/v1.41") :])
+        if route == ("GET", "/_ping"):
+            self.reply(200, b"OK")
+        elif route == ("GET", "/containers/json"):
+            self.reply(200, [{"Id": self.server.nginx_container}])
+        elif route == ("GET", "/containers/abc123/json"):
+            self.reply(200, CONTAINER)
+        elif route[0] == "GET" and route[1].startswith("/containers/"):
+            self.reply(404, {"message": "No such container"})
+        elif route == ("POST", "/containers/abc123/exec"):
+            self.reply(201, {"Id": "exec1"})
+        elif route == ("POST", "/exec/exec1/start"):
+            self.reply(200, frame(1, b"out ") + frame(2, b"err") + frame(1, b"put"))
+        elif route == ("GET", "/exec/exec1/json"):
+            self.reply(200, {"ExitCode": 3})
+        elif route == ("POST", "/containers/abc123/kill"):
+            self.reply(204)
+        elif route == ("POST", "/containers/restarting/kill"):
+            self.reply(409, {"message": "Container restarting is restarting, wait until the container is running"})
+        else:
+            self.reply(500, {"message": "unexpected request"})
+
+    do_GET = do_POST = do_DELETE = handle_request
+
+
+class FakeDockerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        super().__init__(str(socket_path), FakeDockerHandler)
+        self.connections = 0
+        self.requests = []
+        self.nginx_container = "abc123"
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = FakeDockerServer(tmp_path / "docker.sock")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    client = DockerClient(server.server_address, timeout=5)
+    yield client
+    client.close()
+
+
+def test_ping_makes_the_client_available(client):
+    assert client.ping() is True
+    assert client.available is True
+
+
+def test_inspect_and_status(client):
+    assert client.inspect_container("abc123") == CONTAINER
+    assert client.container_status("abc123") == "running"
+    assert client.container_status("missing") is None
+    with pytest.raises(DockerAPIError) as excinfo:
+        client.inspect_container("missing")
+    assert excinfo.value.status == 404
+    assert excinfo.value.message == "No such container"
+
+
+def test_exec_demultiplexes_the_output_streams(client, server):
+    assert client.exec("abc123", ["php", "-v"]) == (3, b"out put", b"err")
+    assert server.requests[0][3]["Cmd"] == ["php", "-v"]
+    assert server.requests[1][3] == {"Detach": False, "Tty": False}
+
+
+def test_kill_sends_the_signal(client, server):
+    client.kill("abc123", "SIGUSR2")
+
+    assert server.requests[-1][:3] == ("POST", "/v1.41/containers/abc123/kill", {"signal": ["SIGUSR2"]})
+
+
+def test_requests_share_one_connection(client, server):
+    client.ping()
+    client.inspect_container("abc123")
+    client.exec("abc123", ["true"])
+    client.kill("abc123")
+
+    assert len(server.requests) == 6
+    assert server.connections == 1
+
+
+def test_connection_is_reopened_after_close(client, server):
+    client.ping()
+    client.close()
+    client.ping()
+
+    assert server.connections == 2
+
+
+def test_missing_socket_is_not_available(tmp_path):
+    assert DockerClient(str(tmp_path / "missing.sock")).available is False
+
+
+def test_opcache_reset_falls_back_to_the_docker_cli(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOCKER_HOST", f"unix://{tmp_path / 'missing.sock'}")
+    get_docker_client.cache_clear()
+    calls = []
+
+    def run(args, **kwargs):
+        calls.append(args)
+        return CompletedProcess(args, 0, "", "")
+
+    monkeypatch.setattr(php_opcache.instrumentation, "run", run)
+    try:
+        assert php_opcache.reset_opcache("site") is True
+    finally:
+        get_docker_client.cache_clear()
+
+    assert calls == [["docker", "exec", "site"] + php_opcache.OPCACHE_RESET_COMMAND]
+
+
+def test_opcache_reset_uses_the_api_when_available(server, monkeypatch):
+    monkeypatch.setenv("DOCKER_HOST", f"unix://{server.server_address}")
+    get_docker_client.cache_clear()
+    monkeypatch.setattr(php_opcache.instrumentation, "run", None)
+    try:
+        # The fake exec exits with 3, so the reset is reported as failed without touching the CLI
+        assert php_opcache.reset_opcache("abc123") is False
+    finally:
+        get_docker_client().close()
+        get_docker_client.cache_clear()
+
+    assert ("POST", "/v1.41/containers/abc123/exec") in [request[:2] for request in server.requests]
+
+
+def test_nginx_reload_sends_sighup_and_logs_api_errors(client, server, tmp_path, caplog):
+    manager = NginxDockerManager(tmp_path / "nginx", {}, tmp_path / "docker-compose.yml")
+    manager.docker_client = client
+
+    manager.reload()
+
+    assert server.requests[-1][:3] == ("POST", "/v1.41/containers/abc123/kill", {"signal": ["SIGHUP"]})
+
+    server.nginx_container = "restarting"
+    manager.reload()
+
+    assert "Failed to reload Nginx configuration: Docker API error 409" in caplog.text
+
+
+def test_availability_is_checked_again_after_a_failure_or_its_ttl(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(docker_client.time, "monotonic", lambda: clock[0])
+    socket_path = tmp_path / "docker.sock"
+    client = DockerClient(str(socket_path), timeout=5)
+
+    assert client.available is False
+
+    server = FakeDockerServer(socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        # Still the cached outcome until the TTL expires
+        assert client.available is False
+        clock[0] += DockerClient.AVAILABILITY_TTL
+        assert client.available is True
+    finally:
+        server.shutdown()
+        server.server_close()
+        client.close()
+    socket_path.unlink()
+
+    with pytest.raises(OSError):
+        client.ping()
+    assert client.available is False
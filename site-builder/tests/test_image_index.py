@@ -0,0 +1,110 @@
+"""Tests for the content-addressed runtime image tags and the index of built images."""
+
+import os
+import re
+
+import pytest
+
+from site_builder.docker import image_index as image_index_module
+from site_builder.docker.image_index import TAG_HASH_LENGTH, ImageIndex
+
+
+@pytest.fixture
+def contexts(tmp_path):
+    context = tmp_path / "nginx-php8"
+    context.mkdir()
+    (context / "Dockerfile").write_text("FROM php:8.3-fpm\nCOPY --from=shared fpm-pool.sh /usr/local/bin/\n")
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    (shared / "fpm-pool.sh").write_text("#!/bin/sh\n")
+    return context, shared
+
+
+def runtime(context, shared=None, version="8.3"):
+    runtime = {"name": "nginx-php8", "version": version, "context": context}
+    if shared is not None:
+        runtime["build_contexts"] = {"shared": shared}
+    return runtime
+
+
+def touch(path, content):
+    path.write_text(content)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_tags_are_the_version_and_a_hash_of_the_context(tmp_path, contexts):
+    context, _ = contexts
+    index = ImageIndex(tmp_path / "images.json")
+
+    tag = index.image_tag(runtime(context))
+
+    assert re.fullmatch(rf"8\.3-[0-9a-f]{{{TAG_HASH_LENGTH}}}", tag)
+    assert index.image_tag(runtime(context, version="latest")) == tag.split("-", 1)[1]
+
+
+def test_tags_are_stable_across_runs(tmp_path, contexts):
+    context, shared = contexts
+    index = ImageIndex(tmp_path / "images.json")
+    tag = index.image_tag(runtime(context, shared))
+    index.save()
+
+    assert ImageIndex(tmp_path / "images.json").image_tag(runtime(context, shared)) == tag
+
+
+def test_tags_change_with_the_context_and_the_shared_context(tmp_path, contexts):
+    context, shared = contexts
+    index = ImageIndex(tmp_path / "images.json")
+    without_shared = index.image_tag(runtime(context))
+    tag = index.image_tag(runtime(context, shared))
+
+    assert tag != without_shared
+
+    touch(shared / "fpm-pool.sh", "#!/bin/sh\nexit 0\n")
+    shared_changed = index.image_tag(runtime(context, shared))
+
+    assert shared_changed != tag
+    assert index.image_tag(runtime(context)) == without_shared
+
+    touch(context / "Dockerfile", "FROM php:8.4-fpm\n")
+
+    assert index.image_tag(runtime(context, shared)) not in (tag, shared_changed)
+
+
+def test_unchanged_contexts_are_not_read_again(tmp_path, contexts, monkeypatch):
+    context, shared = contexts
+    index = ImageIndex(tmp_path / "images.json")
+    index.image_tag(runtime(context, shared))
+    index.save()
+    hashed = []
+    hash_directory = image_index_module.hash_directory
+    monkeypatch.setattr(image_index_module, "hash_directory", lambda path: hashed.append(path) or hash_directory(path))
+
+    ImageIndex(tmp_path / "images.json").image_tag(runtime(context, shared))
+
+    assert hashed == []
+
+
+def test_sites_sharing_a_runtime_share_its_tag(tmp_path, contexts):
+    context, shared = contexts
+    sites = [{"runtime": runtime(context, shared)}, {"runtime": runtime(context, shared)}]
+    ImageIndex(tmp_path / "images.json").tag_sites(sites)
+
+    assert sites[0]["runtime"]["tag"] == sites[1]["runtime"]["tag"]
+    assert ImageIndex.image_name(sites[0]["runtime"]) == f"nginx-php8:{sites[0]['runtime']['tag']}"
+
+
+def test_built_images_are_recorded_and_forgotten(tmp_path, contexts):
+    context, _ = contexts
+    index = ImageIndex(tmp_path / "images.json")
+    index.record("nginx-php8:8.3-abc", context)
+    index.save()
+
+    index = ImageIndex(tmp_path / "images.json")
+    assert index.is_built("nginx-php8:8.3-abc")
+    assert not index.is_built("nginx-php8:8.3-def")
+
+    index.forget("nginx-php8:8.3-abc")
+    index.save()
+
+    assert not ImageIndex(tmp_path / "images.json").is_built("nginx-php8:8.3-abc")
@@ -0,0 +1,98 @@
+"""Tests for the allocation of container addresses."""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from site_builder.core.ip_allocator import IPAllocator
+
+
+def make_site(name, replicas=1):
+    slug = name.replace(".", "-")
+    return {
+        "name": name,
+        "replicas": [{"service": f"web-{slug}" + (f"-r{index + 1}" if index else "")} for index in range(replicas)],
+    }
+
+
+def addresses(sites):
+    return {replica["service"]: replica["address"] for site in sites for replica in site["replicas"]}
+
+
+def test_reserved_addresses():
+    allocator = IPAllocator("10.20.0.0/24")
+
+    assert allocator.template_vars() == {
+        "NETWORK_SUBNET": "10.20.0.0/24",
+        "NETWORK_GATEWAY": "10.20.0.1",
+        "PROXY_ADDRESS": "10.20.0.253",
+        "DATABASE_ADDRESS": "10.20.0.254",
+    }
+
+
+def test_too_small_network_is_rejected():
+    with pytest.raises(ValueError):
+        IPAllocator("10.20.0.0/30")
+
+
+def test_replicas_get_the_lowest_addresses_in_name_order():
+    sites = [make_site("b.example.com"), make_site("a.example.com", replicas=2)]
+
+    IPAllocator("10.20.0.0/24").allocate(sites)
+
+    assert addresses(sites) == {
+        "web-a-example-com": "10.20.0.2",
+        "web-a-example-com-r2": "10.20.0.3",
+        "web-b-example-com": "10.20.0.4",
+    }
+
+
+def test_addresses_survive_adding_and_removing_sites(tmp_path):
+    state_file = tmp_path / "addresses.json"
+    IPAllocator("10.20.0.0/24", state_file=state_file).allocate(
+        [make_site("a.example.com"), make_site("c.example.com")]
+    )
+
+    sites = [make_site("b.example.com"), make_site("c.example.com")]
+    IPAllocator("10.20.0.0/24", state_file=state_file).allocate(sites)
+
+    # c keeps its address, and the address of the removed a stays reserved during the grace period
+    assert addresses(sites) == {"web-c-example-com": "10.20.0.3", "web-b-example-com": "10.20.0.4"}
+    allocations = json.loads(state_file.read_text())["allocations"]
+    assert allocations["web-a-example-com"]["address"] == "10.20.0.2"
+    assert allocations["web-a-example-com"]["released"] is not None
+
+
+def test_addresses_of_removed_services_are_reused_after_the_grace_period(tmp_path):
+    state_file = tmp_path / "addresses.json"
+    released = (datetime.now(timezone.utc) - timedelta(days=8)).isoformat()
+    state_file.write_text(
+        json.dumps({"allocations": {"web-old-example-com": {"address": "10.20.0.2", "released": released}}})
+    )
+
+    sites = [make_site("new.example.com")]
+    IPAllocator("10.20.0.0/24", state_file=state_file, grace_days=7).allocate(sites)
+
+    assert addresses(sites) == {"web-new-example-com": "10.20.0.2"}
+    assert "web-old-example-com" not in json.loads(state_file.read_text())["allocations"]
+
+
+def test_addresses_outside_the_network_are_reallocated(tmp_path):
+    state_file = tmp_path / "addresses.json"
+    state_file.write_text(
+        json.dumps({"allocations": {"web-a-example-com": {"address": "10.99.0.7", "released": None}}})
+    )
+
+    sites = [make_site("a.example.com")]
+    IPAllocator("10.20.0.0/24", state_file=state_file).allocate(sites)
+
+    assert addresses(sites) == {"web-a-example-com": "10.20.0.2"}
+
+
+def test_running_out_of_addresses_raises():
+    # A /29 has 8 addresses: network, gateway, 3 usable from first_host 2, proxy, database, broadcast
+    sites = [make_site(f"site{index}.example.com") for index in range(4)]
+
+    with pytest.raises(ValueError, match="no address left"):
+        IPAllocator("10.20.0.0/29").allocate(sites)
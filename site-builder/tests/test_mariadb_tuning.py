@@ -0,0 +1,58 @@
+"""Tests for the MariaDB settings derived from the host resources."""
+
+from site_builder.database.mariadb_tuning import MIB, compute_tuning
+
+GIB = 1024 * MIB
+
+
+def test_small_host_uses_the_minimums():
+    tuning = compute_tuning(memory=1 * GIB, cpu_count=2, rotational=False, site_count=1)
+
+    assert tuning["DB_INNODB_BUFFER_POOL_SIZE"] == "256M"
+    assert tuning["DB_INNODB_LOG_FILE_SIZE"] == "64M"
+    assert tuning["DB_MAX_CONNECTIONS"] == "100"
+    assert tuning["DB_THREAD_CACHE_SIZE"] == "25"
+    assert tuning["DB_TABLE_OPEN_CACHE"] == "2000"
+    assert tuning["DB_INNODB_IO_CAPACITY"] == "2000"
+    assert tuning["DB_INNODB_IO_CAPACITY_MAX"] == "4000"
+
+
+def test_buffer_pool_is_a_multiple_of_the_chunk_size():
+    tuning = compute_tuning(memory=3 * GIB + 100 * MIB, cpu_count=4, rotational=False, site_count=1)
+
+    assert tuning["DB_INNODB_BUFFER_POOL_SIZE"] == "768M"
+
+
+def test_buffer_pool_never_drops_below_one_chunk():
+    tuning = compute_tuning(memory=256 * MIB, cpu_count=1, rotational=False, site_count=1)
+
+    assert tuning["DB_INNODB_BUFFER_POOL_SIZE"] == "128M"
+    assert tuning["DB_INNODB_LOG_FILE_SIZE"] == "48M"
+
+
+def test_connections_and_table_cache_scale_with_sites_up_to_their_caps():
+    tuning = compute_tuning(memory=64 * GIB, cpu_count=16, rotational=False, site_count=100)
+
+    assert tuning["DB_MAX_CONNECTIONS"] == "1050"
+    assert tuning["DB_THREAD_CACHE_SIZE"] == "256"
+    assert tuning["DB_TABLE_OPEN_CACHE"] == "6400"
+    assert tuning["DB_INNODB_LOG_FILE_SIZE"] == "2048M"
+
+    tuning = compute_tuning(memory=64 * GIB, cpu_count=16, rotational=False, site_count=1000)
+
+    assert tuning["DB_MAX_CONNECTIONS"] == "2000"
+    assert tuning["DB_TABLE_OPEN_CACHE"] == "16384"
+
+
+def test_io_capacity_depends_on_the_disk():
+    assert compute_tuning(memory=8 * GIB, cpu_count=8, rotational=True, site_count=1)["DB_INNODB_IO_CAPACITY"] == "200"
+    assert (
+        compute_tuning(memory=8 * GIB, cpu_count=8, rotational=False, site_count=1)["DB_INNODB_IO_CAPACITY"] == "4000"
+    )
+
+
+def test_query_cache_is_disabled():
+    tuning = compute_tuning(memory=8 * GIB, cpu_count=8, rotational=False, site_count=10)
+
+    assert tuning["DB_QUERY_CACHE_TYPE"] == "0"
+    assert tuning["DB_QUERY_CACHE_SIZE"] == "0"
@@ -0,0 +1,51 @@
+"""Tests for the nginx configuration rendered for a site."""
+
+import copy
+from pathlib import Path
+
+from site_builder.config_generator import ConfigGenerator
+from site_builder.core.site_settings import DEFAULT_SETTINGS
+
+TEMPLATE_PATH = Path(__file__).parent.parent / "site_builder" / "templates"
+
+
+def render_site(site_root=None, **settings):
+    site_settings = copy.deepcopy(DEFAULT_SETTINGS)
+    for section, values in settings.items():
+        site_settings[section].update(values)
+    site = {
+        "name": "www.example.com",
+        "domain": "example.com",
+        "slug": "www-example-com",
+        "use_ssl": False,
+        "runtime": {"name": "nginx-php8"},
+        "replicas": [{"address": "172.20.0.2"}],
+        "settings": site_settings,
+    }
+    template_vars = {"SITE_ROOT": site_root, "PROXY_SSL_PATH": "/etc/nginx/ssl", "ROOT_CA_CRT": "/etc/nginx/ca.crt"}
+    return ConfigGenerator(TEMPLATE_PATH).render_nginx_config(site, template_vars)
+
+
+def test_static_files_are_proxied_without_a_site_root():
+    config = render_site()
+
+    assert "try_files" not in config
+    assert "location @upstream" not in config
+
+
+def test_static_files_are_served_from_the_site_root():
+    config = render_site(
+        "/mnt/www/example.com/www.example.com", static={"extensions": "css c++", "directory": "/assets/"}
+    )
+
+    assert "location ~* \\.(css|c\\+\\+)$ {" in config
+    assert "location ^~ /assets/ {" in config
+    assert config.count("try_files $uri @upstream;") == 2
+    assert "root /mnt/www/example.com/www.example.com;" in config
+    assert "location @upstream {" in config
+
+
+def test_fpm_endpoints_are_denied_by_their_exact_path():
+    config = render_site(php={"status_path": "/fpm.status", "ping_path": "/fpm-ping"})
+
+    assert "location ~ ^(/fpm\\.status|/fpm\\-ping)$ {" in config
@@ -0,0 +1,92 @@
+"""Tests for the pre-compression of static assets."""
+
+import gzip
+import os
+
+import pytest
+
+from site_builder.core.precompress import Precompressor
+
+CSS = b"body { color: black; }\n" * 200
+
+
+@pytest.fixture
+def web_root(tmp_path):
+    web_root = tmp_path / "www"
+    web_root.mkdir()
+    return web_root
+
+
+@pytest.fixture
+def precompressor(tmp_path):
+    return Precompressor(tmp_path / "precompress.json", use_brotli=False, workers=2)
+
+
+def run(precompressor, web_root):
+    return precompressor.precompress_sites([{"web_root": str(web_root)}])
+
+
+def test_assets_are_compressed_once(precompressor, web_root):
+    asset = web_root / "style.css"
+    asset.write_bytes(CSS)
+    (web_root / "small.css").write_bytes(b"a{}")
+    (web_root / "logo.png").write_bytes(CSS)
+
+    assert run(precompressor, web_root) == {"compressed": 1, "unchanged": 0, "failed": 0, "removed": 0}
+
+    sibling = web_root / "style.css.gz"
+    assert gzip.decompress(sibling.read_bytes()) == CSS
+    assert os.stat(sibling).st_mtime_ns == os.stat(asset).st_mtime_ns
+    assert sorted(os.listdir(web_root)) == ["logo.png", "small.css", "style.css", "style.css.gz"]
+    assert run(precompressor, web_root)["unchanged"] == 1
+
+
+def test_assets_that_do_not_compress_well_get_no_sibling(precompressor, web_root):
+    (web_root / "random.js").write_bytes(os.urandom(4096))
+
+    assert run(precompressor, web_root)["compressed"] == 0
+    assert not (web_root / "random.js.gz").exists()
+    assert run(precompressor, web_root)["unchanged"] == 1
+
+
+def test_foreign_siblings_are_never_overwritten_or_removed(precompressor, web_root):
+    asset = web_root / "app.js"
+    asset.write_bytes(CSS)
+    sibling = web_root / "app.js.gz"
+    sibling.write_bytes(b"shipped by the build tool")
+
+    assert run(precompressor, web_root)["compressed"] == 0
+    assert sibling.read_bytes() == b"shipped by the build tool"
+
+    asset.unlink()
+
+    assert run(precompressor, web_root)["removed"] == 0
+    assert sibling.read_bytes() == b"shipped by the build tool"
+
+
+def test_orphaned_siblings_are_removed_unless_replaced(precompressor, web_root):
+    (web_root / "a.css").write_bytes(CSS)
+    (web_root / "b.css").write_bytes(CSS)
+    run(precompressor, web_root)
+
+    (web_root / "a.css").unlink()
+    (web_root / "b.css").unlink()
+    # A file put in place of the sibling since it was written is not ours anymore
+    (web_root / "b.css.gz").write_bytes(b"replaced")
+
+    assert run(precompressor, web_root)["removed"] == 1
+    assert not (web_root / "a.css.gz").exists()
+    assert (web_root / "b.css.gz").read_bytes() == b"replaced"
+
+
+def test_changed_assets_are_compressed_again(precompressor, web_root):
+    asset = web_root / "style.css"
+    asset.write_bytes(CSS)
+    run(precompressor, web_root)
+
+    asset.write_bytes(CSS * 2)
+    stat = os.stat(asset)
+    os.utime(asset, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert run(precompressor, web_root)["compressed"] == 1
+    assert gzip.decompress((web_root / "style.css.gz").read_bytes()) == CSS * 2
@@ -0,0 +1,66 @@
+"""Tests for the proxy micro-cache and the purge of a single site's cache entries."""
+
+import copy
+from pathlib import Path
+
+from site_builder.config_generator import ConfigGenerator
+from site_builder.core.site_settings import DEFAULT_SETTINGS
+from site_builder.nginx.proxy_cache import purge_site_cache
+
+TEMPLATE_PATH = Path(__file__).parent.parent / "site_builder" / "templates"
+
+
+def write_cache_file(cache_path, name, key):
+    """Write a cache file laid out like nginx does, with the key in its header."""
+    path = cache_path / name[-1] / name[-3:-1] / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\x05\x00\x00\x00binary header" + f"\nKEY: {key}\n".encode() + b"HTTP/1.1 200 OK\r\n\r\nbody")
+    return path
+
+
+def render_site(cache_enabled):
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    settings["cache"]["enabled"] = cache_enabled
+    site = {
+        "name": "www.example.com",
+        "domain": "example.com",
+        "slug": "www-example-com",
+        "use_ssl": False,
+        "runtime": {"name": "nginx-php8"},
+        "replicas": [{"address": "172.20.0.2"}],
+        "settings": settings,
+    }
+    template_vars = {"SITE_ROOT": None, "PROXY_SSL_PATH": "/etc/nginx/ssl", "ROOT_CA_CRT": "/etc/nginx/ca.crt"}
+    return ConfigGenerator(TEMPLATE_PATH).render_nginx_config(site, template_vars)
+
+
+def test_cache_is_only_configured_for_sites_that_enable_it():
+    assert "proxy_cache " not in render_site(cache_enabled=False)
+
+    config = render_site(cache_enabled=True)
+    assert "proxy_cache site_builder;" in config
+    assert 'proxy_cache_key "www.example.com|$scheme$host$request_uri";' in config
+    assert "proxy_cache_valid 200 301 302 1m;" in config
+    assert "proxy_cache_bypass $http_authorization $http_cookie;" in config
+
+
+def test_purge_removes_only_the_entries_of_the_site(tmp_path):
+    own = [
+        write_cache_file(tmp_path, "a1b2c3", "www.example.com|https www.example.com/"),
+        write_cache_file(tmp_path, "d4e5f6", "www.example.com|httpswww.example.com/about"),
+    ]
+    # The name of this site starts with the purged one, but its keys do not start with "www.example.com|"
+    other = [
+        write_cache_file(tmp_path, "0a0b0c", "www.example.com.au|httpswww.example.com.au/"),
+        write_cache_file(tmp_path, "1a1b1c", "shop.example.com|httpsshop.example.com/www.example.com|"),
+    ]
+
+    assert purge_site_cache(tmp_path, "www.example.com") == 2
+
+    assert not any(path.exists() for path in own)
+    assert all(path.exists() for path in other)
+    assert purge_site_cache(tmp_path, "www.example.com") == 0
+
+
+def test_purge_of_a_missing_cache_directory_removes_nothing(tmp_path):
+    assert purge_site_cache(tmp_path / "missing", "www.example.com") == 0
@@ -0,0 +1,95 @@
+"""Tests for the per-site .site.ini settings."""
+
+from site_builder.core.site_settings import DEFAULT_SETTINGS, SETTINGS_FILE, load_site_settings
+
+
+def test_defaults_without_a_settings_file(tmp_path):
+    assert load_site_settings(tmp_path) == DEFAULT_SETTINGS
+
+
+def test_known_listing_without_the_file_skips_reading_it(tmp_path):
+    (tmp_path / SETTINGS_FILE).write_text("[scaling]\nreplicas = 3\n")
+
+    assert load_site_settings(tmp_path, files=set())["scaling"]["replicas"] == 1
+
+
+def test_values_are_converted_to_the_type_of_their_default(tmp_path):
+    (tmp_path / SETTINGS_FILE).write_text(
+        "[scaling]\nreplicas = 3\ncpus = 1.5\n\n[cache]\nenabled = yes\nvalid = 5m\n\n[php]\nrevalidate_freq = -1\n"
+    )
+
+    settings = load_site_settings(tmp_path, files={SETTINGS_FILE})
+
+    assert settings["scaling"]["replicas"] == 3
+    assert settings["scaling"]["cpus"] == "1.5"
+    assert settings["cache"]["enabled"] is True
+    assert settings["cache"]["valid"] == "5m"
+    assert settings["php"]["revalidate_freq"] == -1
+    # Options the file does not set keep their default
+    assert settings["cache"]["lock"] is DEFAULT_SETTINGS["cache"]["lock"]
+
+
+def test_unknown_and_invalid_entries_are_ignored(tmp_path):
+    (tmp_path / SETTINGS_FILE).write_text(
+        "[nonsense]\nfoo = bar\n\n[scaling]\nreplicas = many\nunknown = 1\n\n[app]\nworkers = 4\n"
+    )
+
+    settings = load_site_settings(tmp_path)
+
+    assert "nonsense" not in settings
+    assert "unknown" not in settings["scaling"]
+    assert settings["scaling"]["replicas"] == 1
+    assert settings["app"]["workers"] == 4
+
+
+def test_unreadable_file_falls_back_to_the_defaults(tmp_path):
+    (tmp_path / SETTINGS_FILE).write_text("replicas = 3\n")
+
+    assert load_site_settings(tmp_path) == DEFAULT_SETTINGS
+
+
+def test_defaults_are_not_shared_between_sites(tmp_path):
+    settings = load_site_settings(tmp_path)
+    settings["scaling"]["replicas"] = 5
+
+    assert DEFAULT_SETTINGS["scaling"]["replicas"] == 1
+
+
+def test_strings_rendered_into_the_proxy_configuration_are_validated(tmp_path):
+    (tmp_path / SETTINGS_FILE).write_text(
+        "[upstream]\nkeepalive_timeout = 1m30s\nfail_timeout = 10s;\n\n"
+        "[cache]\nvalid = 1 m\nlock_timeout = 500ms\n\n[static]\nexpires = max\n"
+    )
+
+    settings = load_site_settings(tmp_path)
+
+    assert settings["upstream"]["keepalive_timeout"] == "1m30s"
+    assert settings["upstream"]["fail_timeout"] == DEFAULT_SETTINGS["upstream"]["fail_timeout"]
+    assert settings["cache"]["valid"] == DEFAULT_SETTINGS["cache"]["valid"]
+    assert settings["cache"]["lock_timeout"] == "500ms"
+    assert settings["static"]["expires"] == "max"
+
+
+def test_static_extensions_and_directory_are_validated(tmp_path):
+    (tmp_path / SETTINGS_FILE).write_text("[static]\nextensions = css js|php\ndirectory = assets/build/\n")
+
+    settings = load_site_settings(tmp_path)
+
+    assert settings["static"]["extensions"] == DEFAULT_SETTINGS["static"]["extensions"]
+    assert settings["static"]["directory"] == "assets/build/"
+
+    (tmp_path / SETTINGS_FILE).write_text("[static]\nextensions = css  webp\ndirectory = assets/ {\n")
+
+    settings = load_site_settings(tmp_path)
+
+    assert settings["static"]["extensions"] == "css  webp"
+    assert settings["static"]["directory"] == ""
+
+
+def test_fpm_endpoint_paths_are_validated(tmp_path):
+    (tmp_path / SETTINGS_FILE).write_text("[php]\nstatus_path = /status.php\nping_path = /(ping|.*)\n")
+
+    settings = load_site_settings(tmp_path)
+
+    assert settings["php"]["status_path"] == "/status.php"
+    assert settings["php"]["ping_path"] == DEFAULT_SETTINGS["php"]["ping_path"]
@@ -0,0 +1,59 @@
+"""Tests for the proxy client certificates and their inventory."""
+
+import pytest
+from cryptography import x509
+
+from site_builder.ssl_certificate_manager import SSLCertificateManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return SSLCertificateManager(tmp_path, tmp_path / "ca.crt", tmp_path / "ca.key", "secret")
+
+
+def site(domain, name):
+    return {"domain": domain, "name": name}
+
+
+def test_certificates_of_removed_sites_are_dropped_from_the_inventory(manager, tmp_path):
+    sites = [site("example.com", "www.example.com"), site("example.com", "api.example.com")]
+    assert manager.generate_certificates_bulk(sites, workers=2) == {
+        "www.example.com": "issued",
+        "api.example.com": "issued",
+    }
+    assert len(manager.inventory.certificates()) == 2
+
+    assert manager.prune_certificates(sites[:1]) == 1
+
+    reloaded = SSLCertificateManager(tmp_path, tmp_path / "ca.crt", tmp_path / "ca.key", "secret")
+    assert [entry["path"] for entry in reloaded.inventory.certificates()] == ["example.com/www.example.com/client.crt"]
+    assert reloaded.prune_certificates(sites[:1]) == 0
+
+
+def test_the_ca_is_only_loaded_when_a_certificate_is_signed(manager, tmp_path, monkeypatch):
+    sites = [site("example.com", "www.example.com"), site("other.org", "www.other.org")]
+    manager.generate_certificates_bulk(sites, workers=2)
+
+    manager = SSLCertificateManager(tmp_path, tmp_path / "ca.crt", tmp_path / "ca.key", "secret")
+    loads = []
+    load_ca_key = manager._load_ca_key
+    monkeypatch.setattr(manager, "_load_ca_key", lambda: loads.append("key") or load_ca_key())
+
+    assert set(manager.generate_certificates_bulk(sites, workers=2).values()) == {"skipped"}
+    assert loads == []
+
+    (tmp_path / "other.org" / "www.other.org" / "client.crt").unlink()
+
+    assert manager.generate_certificates_bulk(sites, workers=2)["www.other.org"] == "issued"
+    assert loads == ["key"]
+
+
+def test_parallel_workers_share_one_generated_ca(manager, tmp_path):
+    sites = [site("example.com", f"site{index}.example.com") for index in range(8)]
+
+    assert set(manager.generate_certificates_bulk(sites, workers=8).values()) == {"issued"}
+
+    ca_cert = x509.load_pem_x509_certificate((tmp_path / "ca.crt").read_bytes())
+    for index in range(8):
+        path = tmp_path / "example.com" / f"site{index}.example.com" / "client.crt"
+        x509.load_pem_x509_certificate(path.read_bytes()).verify_directly_issued_by(ca_cert)